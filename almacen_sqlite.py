@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+Almacén SQLite opcional para la programación.
+
+Guarda cada evento en su propia fila (el dict completo en 'datos', tal cual)
+con columnas indexadas de día, segundo de la hora, máscara de horas en las que
+suena (las 24 en los horarios), periodicidad y activo, para consultar y editar
+parrillas grandes sin volver a serializar todo el JSON.
+Importa y exporta sin pérdidas los formatos de events_db.json (lista) y
+ccpcadena.json ({"events": [...], "playlist": ..., "audio_config": ...}).
+
+Uso: python almacen_sqlite.py importar ccpcadena.json eventos.db
+     python almacen_sqlite.py exportar eventos.db ccpcadena.json
+"""
+import json
+import sqlite3
+import sys
+from persistencia import guardar_atomico
+from reglas import TODAS_LAS_HORAS, hora_a_segundos
+
+EXTENSIONES = ('.db', '.sqlite', '.sqlite3')
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS eventos (
+    id INTEGER PRIMARY KEY,
+    pos INTEGER NOT NULL,
+    nombre TEXT,
+    segundo INTEGER,
+    seg_hora INTEGER,
+    periodicidad TEXT,
+    horas INTEGER,
+    tipo TEXT,
+    activo INTEGER,
+    datos TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS evento_dia (
+    id INTEGER NOT NULL REFERENCES eventos(id) ON DELETE CASCADE,
+    dia INTEGER NOT NULL,
+    segundo INTEGER,
+    PRIMARY KEY (id, dia)
+);
+CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT);
+CREATE INDEX IF NOT EXISTS idx_eventos_pos ON eventos(pos);
+CREATE INDEX IF NOT EXISTS idx_eventos_segundo ON eventos(segundo);
+CREATE INDEX IF NOT EXISTS idx_eventos_per ON eventos(periodicidad, activo);
+CREATE INDEX IF NOT EXISTS idx_dia_segundo ON evento_dia(dia, segundo);
+"""
+
+def es_almacen(path):
+    return path.lower().endswith(EXTENSIONES)
+
+def leer_documento(path):
+    """(eventos, envoltorio) de un JSON. El envoltorio es el resto del documento (playlist,
+    audio_config...) en su orden original, con 'events' vacío; None si el archivo es una lista."""
+    with open(path, 'r', encoding='utf-8') as f: data = json.load(f)
+    if not isinstance(data, dict): return data, None
+    return data.get('events', []), {k: (None if k == 'events' else v) for k, v in data.items()}
+
+# Columnas que se añadieron después: (nombre, tipo) para migrar almacenes antiguos
+COLUMNAS_NUEVAS = [('seg_hora', 'INTEGER')]
+
+def _columnas(e):
+    """(nombre, segundo del día, segundo de la hora, periodicidad, máscara de horas, tipo, activo)."""
+    try: seg = hora_a_segundos(e['time'])
+    except Exception: seg = None
+    per = e.get('periodicity')
+    if per == 'hourly': horas = TODAS_LAS_HORAS
+    elif per == 'other':
+        horas = 0
+        for h in e.get('other_hours', []) or []:
+            if str(h).isdigit() and int(h) <= 23: horas |= 1 << int(h)
+    else: horas = 0 if seg is None else 1 << (seg // 3600)
+    return (e.get('name', ''), seg, None if seg is None else seg % 3600, per, horas, e.get('type'),
+            1 if e.get('active', True) else 0)
+
+def _franja(desde, hasta):
+    """Condición SQL para "suena en algún instante de [desde, hasta) del día".
+
+    Un evento suena a las h * 3600 + seg_hora para cada hora h de su máscara: las
+    horas enteras del rango se miran solo con la máscara y las dos de los bordes
+    también con el segundo de la hora.
+    """
+    desde, hasta = max(0, desde or 0), min(86400, 86400 if hasta is None else hasta)
+    if desde >= hasta: return "0", []
+    enteras, partes, args = 0, [], []
+    for h in range(desde // 3600, (hasta - 1) // 3600 + 1):
+        a, b = max(desde - h * 3600, 0), min(hasta - h * 3600, 3600)
+        if a == 0 and b == 3600: enteras |= 1 << h
+        else:
+            partes.append("(e.horas & ? AND e.seg_hora >= ? AND e.seg_hora < ?)")
+            args += [1 << h, a, b]
+    if enteras:
+        partes.insert(0, "(e.horas & ?)")
+        args.insert(0, enteras)
+    return "(" + " OR ".join(partes) + ")", args
+
+class AlmacenEventos:
+    def __init__(self, path):
+        self.path = path
+        self.con = sqlite3.connect(path, check_same_thread=False)
+        self.con.execute("PRAGMA foreign_keys = ON")
+        self.con.executescript(ESQUEMA)
+        self._migrar()
+
+    def _migrar(self):
+        existentes = {f[1] for f in self.con.execute("PRAGMA table_info(eventos)")}
+        nuevas = [(c, t) for c, t in COLUMNAS_NUEVAS if c not in existentes]
+        with self.con:
+            for c, t in nuevas: self.con.execute(f"ALTER TABLE eventos ADD COLUMN {c} {t}")
+            if nuevas:
+                # Almacén de antes de seg_hora: las horas de los horarios estaban a 0, se recalculan todas
+                filas = [_columnas(json.loads(d)) + (i,) for i, d in self.con.execute("SELECT id, datos FROM eventos")]
+                self.con.executemany("UPDATE eventos SET nombre = ?, segundo = ?, seg_hora = ?, periodicidad = ?, horas = ?, "
+                                     "tipo = ?, activo = ? WHERE id = ?", filas)
+            self.con.execute("CREATE INDEX IF NOT EXISTS idx_eventos_seg_hora ON eventos(seg_hora)")
+
+    def cerrar(self):
+        self.con.close()
+
+    # --- Lectura ---
+    def eventos_con_id(self):
+        """[(id, evento), ...] en el orden de la parrilla."""
+        return [(i, json.loads(d)) for i, d in self.con.execute("SELECT id, datos FROM eventos ORDER BY pos")]
+
+    def eventos(self):
+        return [e for i, e in self.eventos_con_id()]
+
+    def buscar(self, dia=None, desde=None, hasta=None, periodicidad=None, activo=None):
+        """Eventos filtrados por día (0 = lunes), periodicidad, activo y franja [desde, hasta)
+        en segundos del día: entran los que suenan en algún momento de la franja."""
+        sql = "SELECT e.id, e.datos FROM eventos e"
+        cond, args = [], []
+        if dia is not None:
+            sql += " JOIN evento_dia d ON d.id = e.id"
+            cond.append("d.dia = ?"); args.append(dia)
+        if desde is not None or hasta is not None:
+            c, a = _franja(desde, hasta)
+            cond.append(c); args += a
+        if periodicidad is not None: cond.append("e.periodicidad = ?"); args.append(periodicidad)
+        if activo is not None: cond.append("e.activo = ?"); args.append(1 if activo else 0)
+        if cond: sql += " WHERE " + " AND ".join(cond)
+        sql += " ORDER BY e.pos"
+        return [(i, json.loads(d)) for i, d in self.con.execute(sql, args)]
+
+    # --- Escritura: una fila por operación, cada una en su transacción ---
+    def _escribir_dias(self, id_, e, seg):
+        self.con.execute("DELETE FROM evento_dia WHERE id = ?", (id_,))
+        dias = e.get('days', []) or []
+        self.con.executemany("INSERT INTO evento_dia (id, dia, segundo) VALUES (?, ?, ?)",
+                             [(id_, d, seg) for d in range(7) if d < len(dias) and dias[d]])
+
+    def _insertar(self, e, pos):
+        cols = _columnas(e)
+        cur = self.con.execute("INSERT INTO eventos (pos, nombre, segundo, seg_hora, periodicidad, horas, tipo, activo, datos) "
+                               "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (pos,) + cols + (json.dumps(e),))
+        self._escribir_dias(cur.lastrowid, e, cols[1])
+        return cur.lastrowid
+
+    def insertar(self, e):
+        with self.con:
+            pos = self.con.execute("SELECT COALESCE(MAX(pos), -1) + 1 FROM eventos").fetchone()[0]
+            return self._insertar(e, pos)
+
+    def actualizar(self, id_, e):
+        with self.con:
+            cols = _columnas(e)
+            self.con.execute("UPDATE eventos SET nombre = ?, segundo = ?, seg_hora = ?, periodicidad = ?, horas = ?, tipo = ?, "
+                             "activo = ?, datos = ? WHERE id = ?", cols + (json.dumps(e), id_))
+            self._escribir_dias(id_, e, cols[1])
+
+    def borrar(self, id_):
+        with self.con:
+            self.con.execute("DELETE FROM eventos WHERE id = ?", (id_,))
+
+    def reemplazar_todo(self, eventos):
+        with self.con:
+            self.con.execute("DELETE FROM eventos")
+            return [self._insertar(e, pos) for pos, e in enumerate(eventos)]
+
+    # --- Importar / exportar JSON ---
+    def guardar_envoltorio(self, envoltorio):
+        with self.con:
+            self.con.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES ('envoltorio', ?)", (json.dumps(envoltorio),))
+
+    def importar_json(self, path):
+        eventos, envoltorio = leer_documento(path)
+        ids = self.reemplazar_todo(eventos)
+        self.guardar_envoltorio(envoltorio)
+        return ids
+
+    def exportar_json(self, path):
+        fila = self.con.execute("SELECT valor FROM meta WHERE clave = 'envoltorio'").fetchone()
+        envoltorio = json.loads(fila[0]) if fila else None
+        eventos = self.eventos()
+        if envoltorio is None: datos = eventos
+        else: datos = {k: (eventos if k == 'events' else v) for k, v in envoltorio.items()}
+        guardar_atomico(path, datos)
+
+def cargar_eventos(path):
+    """Lista de eventos desde un JSON (lista o {"events": [...]}) o un almacén SQLite, según la extensión."""
+    if es_almacen(path):
+        almacen = AlmacenEventos(path)
+        try: return almacen.eventos()
+        finally: almacen.cerrar()
+    with open(path, 'r') as f: data = json.load(f)
+    return data.get('events', []) if isinstance(data, dict) else data
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] not in ('importar', 'exportar'):
+        print("Uso: python almacen_sqlite.py importar archivo.json almacen.db | exportar almacen.db archivo.json")
+        sys.exit(1)
+    orden, origen, destino = sys.argv[1:4]
+    almacen = AlmacenEventos(destino if orden == 'importar' else origen)
+    try:
+        if orden == 'importar': print(f"{len(almacen.importar_json(origen))} eventos importados")
+        else:
+            almacen.exportar_json(destino)
+            print("Exportado")
+    finally: almacen.cerrar()
@@ -5,6 +5,9 @@ echo Archivos en esta carpeta:
 dir
 echo.
 call "%USERPROFILE%\musicenv\Scripts\activate.bat"
+rem Fija los dispositivos de ccpcadena.json por nombre antes de que cambien los indices.
+rem Si cambia algo deja ccpcadena.json.bak y lo apunta en dispositivos.log
+python "%~dp0audio_libs.py" "%~dp0ccpcadena.json"
 python "%~dp0player_modular.py"
 echo.
 echo ====== FIN / ERROR ======
@@ -1,5 +1,145 @@
 # -*- coding: utf-8 -*-
-import sounddevice as sd
+import json
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from time import perf_counter
+import numpy as np
+try: import sounddevice as sd
+except OSError as e:
+    # Sin PortAudio el gestor y el motor siguen funcionando; la lista de dispositivos sale con error
+    print(f"Audio no disponible: {e}")
+    sd = None
+import soundfile as sf
+import metricas
+from persistencia import guardar_atomico
+
+def _enumerar():
+    """Dispositivos que ve el PortAudio de este proceso, con su referencia estable."""
+    lista = []
+    host_apis = sd.query_hostapis()
+    vistos = {}
+    for i, d in enumerate(sd.query_devices()):
+        api = "Unknown"
+        try:
+            if d['hostapi'] < len(host_apis): api = host_apis[d['hostapi']]['name']
+        except: pass
+        n = vistos.get((d['name'], api), 0)
+        vistos[(d['name'], api)] = n + 1
+        lista.append({'index': i, 'name': d['name'], 'hostapi': api, 'n': n,
+                      'inputs': d['max_input_channels'], 'outputs': d['max_output_channels'],
+                      'samplerate': d['default_samplerate']})
+    return lista
+
+# Sondeo en un proceso aparte: PortAudio arranca de cero y ve el hardware recién enchufado
+SONDEO = "import json, audio_libs; print(json.dumps(audio_libs._enumerar()))"
+ESPERA_SONDEO = 15.0
+
+class RegistroDispositivos:
+    """
+    Lista de dispositivos de audio enumerada una sola vez y cacheada.
+    Los índices de PortAudio cambian al enchufar o quitar hardware, así que lo
+    que se guarda en la configuración es una referencia estable
+    {"name", "hostapi", "n"} (n = cuál de los que se llaman igual en esa API)
+    y el índice actual se resuelve al usarla.
+
+    PortAudio solo ve el hardware nuevo si se reinicia, y reiniciarlo corta
+    todos los streams abiertos del proceso (también la salida al aire), así que
+    aquí nunca se reinicia: sondear() enumera en un proceso aparte y dice qué
+    dispositivos nuevos hay, que se podrán usar al volver a abrir el programa.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lista = None
+        self.error = False
+
+    def refrescar(self):
+        """Vuelve a enumerar con el PortAudio actual (no ve hardware enchufado después de arrancar)."""
+        lista, error = [], False
+        try: lista = _enumerar()
+        except Exception as e:
+            print(f"Error listando dispositivos: {e}")
+            error = True
+        with self.lock: self.lista, self.error = lista, error
+        return lista
+
+    def sondear(self):
+        """Enumera en un proceso nuevo y devuelve los dispositivos que este proceso aún no ve."""
+        try:
+            r = subprocess.run([sys.executable, "-c", SONDEO], cwd=os.path.dirname(os.path.abspath(__file__)),
+                               capture_output=True, text=True, timeout=ESPERA_SONDEO)
+            frescos = json.loads(r.stdout.strip().splitlines()[-1])
+        except Exception as e:
+            print(f"Error sondeando dispositivos: {e}")
+            return []
+        conocidos = {(d['name'], d['hostapi'], d['n']) for d in self.refrescar()}
+        return [d for d in frescos if (d['name'], d['hostapi'], d['n']) not in conocidos]
+
+    def dispositivos(self):
+        with self.lock: lista = self.lista
+        return lista if lista is not None else self.refrescar()
+
+    def salidas(self):
+        return [d for d in self.dispositivos() if d['outputs'] > 0]
+
+    def entradas(self):
+        return [d for d in self.dispositivos() if d['inputs'] > 0]
+
+    def referencia(self, index):
+        """Referencia estable del dispositivo con ese índice actual (o None)."""
+        for d in self.dispositivos():
+            if d['index'] == index: return {'name': d['name'], 'hostapi': d['hostapi'], 'n': d['n'], 'index': index}
+        return None
+
+    def buscar(self, ref):
+        """Índice actual de la referencia, o None si este proceso no ve ese dispositivo."""
+        for d in self.dispositivos():
+            if d['name'] == ref.get('name') and d['hostapi'] == ref.get('hostapi') and d['n'] == ref.get('n', 0):
+                return d['index']
+        return None
+
+    def resolver(self, ref):
+        """Índice actual de una referencia. Acepta también el índice suelto de las configuraciones
+        antiguas (se usa tal cual). Si el dispositivo no aparece se usa el índice guardado."""
+        if ref is None or isinstance(ref, int): return ref
+        i = self.buscar(ref)
+        return i if i is not None else ref.get('index')
+
+REGISTRO = RegistroDispositivos()
+
+def nombre_completo(d):
+    return f"{d['name']} [{d['hostapi']}]"
+
+def migrar_config(audio_config):
+    """Añade a main_device/cue_device su referencia estable (main_device_ref, cue_device_ref) y,
+    si ya la tenían, corrige el índice con ella. El índice se mantiene porque el reproductor lo
+    lee tal cual. La primera vez solo es fiable si el hardware no ha cambiado desde que se guardó."""
+    cfg = dict(audio_config)
+    for clave in ('main_device', 'cue_device'):
+        ref = cfg.get(clave + '_ref')
+        if ref:
+            i = REGISTRO.buscar(ref)
+            if i is not None: cfg[clave], cfg[clave + '_ref'] = i, dict(ref, index=i)
+        elif isinstance(cfg.get(clave), int) and cfg[clave] >= 0:
+            ref = REGISTRO.referencia(cfg[clave])
+            if ref: cfg[clave + '_ref'] = ref
+    return cfg
+
+def migrar_documento(path):
+    """Aplica migrar_config al audio_config de un documento tipo ccpcadena.json.
+    Antes de reescribirlo deja una copia en <path>.bak. Devuelve los cambios hechos (vacío si ninguno)."""
+    with open(path, 'r', encoding='utf-8') as f: doc = json.load(f)
+    if not isinstance(doc, dict) or not isinstance(doc.get('audio_config'), dict): return []
+    viejo = doc['audio_config']
+    cfg = migrar_config(viejo)
+    cambios = [f"{k}: {viejo.get(k)!r} -> {v!r}" for k, v in cfg.items() if viejo.get(k) != v]
+    if not cambios: return []
+    shutil.copy2(path, path + '.bak')
+    doc['audio_config'] = cfg
+    guardar_atomico(path, doc)
+    return cambios
 
 def get_output_devices():
     """
@@ -7,31 +147,233 @@ def get_output_devices():
     Filtra duplicados y añade el tipo de API (MME, DirectSound, etc.)
     Formato: [(index, "Nombre Dispositivo [API]"), ...]
     """
-    devices = []
-    seen_names = set()
-    
-    try:
-        all_devs = sd.query_devices()
-        host_apis = sd.query_hostapis()
-        
-        for i, d in enumerate(all_devs):
-            # Solo queremos dispositivos que tengan canales de SALIDA (altavoces)
-            if d['max_output_channels'] > 0:
-                api_name = "Unknown"
-                try:
-                    if d['hostapi'] < len(host_apis):
-                        api_name = host_apis[d['hostapi']]['name']
-                except: pass
-                
-                # Construimos un nombre único
-                full_name = f"{d['name']} [{api_name}]"
-                
-                # Opcional: Filtrar para mostrar solo MME o DirectSound si hay muchos
-                # pero por seguridad mostramos todos los de salida.
-                devices.append((i, full_name))
-                
-    except Exception as e:
-        print(f"Error listando dispositivos: {e}")
-        devices.append((-1, "Error detectando dispositivos"))
-        
-    return devices
\ No newline at end of file
+    devices = [(d['index'], nombre_completo(d)) for d in REGISTRO.salidas()]
+    if REGISTRO.error: devices.append((-1, "Error detectando dispositivos"))
+    return devices
+
+# --- LECTURA POR BLOQUES ---
+BLOQUE_LECTURA = 4096
+CAPACIDAD_ANILLO = 1 << 17   # frames en el anillo (~3 s a 44.1 kHz), da igual lo que dure el archivo
+ESPERA_LECTOR = 0.01         # s que duerme el hilo lector con el anillo lleno
+
+class LectorBloques:
+    """
+    Decodifica un archivo por bloques desde un hilo propio y los deja, ya en
+    estéreo float32, en un anillo de tamaño fijo del que tira el callback de audio.
+    La memoria no depende de la duración del archivo y se puede empezar a sonar
+    en cuanto llega el primer bloque. Los mono se duplican bloque a bloque.
+
+    El anillo es de un productor (el hilo lector) y un consumidor (el callback)
+    y no usa locks: 'escrito' solo lo cambia el lector y 'leido' solo el
+    callback, y cada uno publica su contador después de tocar los datos. Lo que
+    cruza de un hilo a otro (petición de seek, salto, fin) se publica como una
+    única tupla, cuya asignación es atómica. El callback nunca espera por nadie.
+    """
+    def __init__(self, path, capacidad=CAPACIDAD_ANILLO, bloque=BLOQUE_LECTURA):
+        self.f = sf.SoundFile(path)
+        self.samplerate = self.f.samplerate
+        self.frames = self.f.frames
+        self.capacidad = capacidad
+        self.bloque = bloque
+        self.anillo = np.zeros((capacidad, 2), dtype=np.float32)
+        self.escrito = 0                # frames escritos en total (solo el lector)
+        self.leido = 0                  # frames consumidos en total (solo el callback)
+        self.peticion = (0, 0)          # (nº, frame) del último seek pedido (interfaz)
+        self.salto = (0, 0, 0)          # (nº, índice del anillo, frame) del último seek hecho (lector)
+        self.fin = (0, -1)              # (nº, índice del anillo) donde acaba el archivo (lector)
+        self.atendida = 0               # último nº de petición que ve el callback
+        self.base = 0                   # frame del archivo = base + leido (callback)
+        self.subdesbordes = 0           # bloques entregados incompletos sin ser el final
+        self.parar = False
+        self.aviso = threading.Event()  # despierta al lector tras un seek (solo la interfaz lo usa)
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+
+    @property
+    def posicion(self):
+        n, frame = self.peticion
+        return frame if n != self.atendida else self.base + self.leido
+
+    def agotado(self):
+        n, i = self.fin
+        return n == self.atendida == self.peticion[0] and 0 <= i <= self.leido
+
+    def cerrar(self):
+        self.parar = True
+        self.aviso.set()
+        self.hilo.join(1.0)
+        self.f.close()
+
+    def buscar(self, frame):
+        """Pide un seek; lo hace el lector y el callback lo aplica al llegar al salto."""
+        frame = max(0, min(int(frame), self.frames))
+        self.peticion = (self.peticion[0] + 1, frame)
+        self.aviso.set()
+
+    def leer(self, out):
+        """Copia en 'out' (frames x 2) lo disponible; devuelve cuántos frames copió. Sin locks."""
+        n_pet = self.peticion[0]
+        if n_pet != self.atendida:
+            n, i, frame = self.salto
+            # El lector aún no ha hecho el seek: silencio, no audio de antes del salto
+            if n != n_pet: return 0
+            self.atendida = n
+            self.base = frame - i
+            self.leido = i
+        n = max(0, min(len(out), self.escrito - self.leido))
+        if n:
+            i = self.leido % self.capacidad
+            a = min(n, self.capacidad - i)
+            out[:a] = self.anillo[i:i + a]
+            if a < n: out[a:n] = self.anillo[:n - a]
+            self.leido += n
+        if n < len(out) and not self.agotado():
+            # El lector no llegó a tiempo (disco lento, arranque): el hueco sale en silencio
+            self.subdesbordes += 1
+            metricas.SUBDESBORDES.sumar()
+        return n
+
+    def _bucle(self):
+        hecha, fin = 0, False
+        while not self.parar:
+            n_pet, frame = self.peticion
+            if n_pet != hecha:
+                self.f.seek(frame)
+                hecha, fin = n_pet, False
+                self.salto = (n_pet, self.escrito, frame)
+            libre = self.capacidad - (self.escrito - self.leido)
+            if fin or libre < self.bloque:
+                self.aviso.wait(ESPERA_LECTOR)
+                self.aviso.clear()
+                continue
+            datos = self.f.read(self.bloque, dtype='float32', always_2d=True)
+            n = len(datos)
+            i = self.escrito % self.capacidad
+            a = min(n, self.capacidad - i)
+            # Mono: la única columna se copia en las dos (sin np.column_stack del archivo entero)
+            cols = datos[:, :1] if datos.shape[1] == 1 else datos[:, :2]
+            self.anillo[i:i + a] = cols[:a]
+            if a < n: self.anillo[:n - a] = cols[a:]
+            # Publicar después de escribir: el callback nunca ve frames a medio copiar
+            self.escrito += n
+            if n < self.bloque:
+                fin = True
+                self.fin = (hecha, self.escrito)
+
+# --- SALIDAS COMPARTIDAS ---
+BLOQUE_SALIDA = 2048
+
+class SalidaCompartida:
+    """
+    Un OutputStream abierto y arrancado una sola vez que mezcla las fuentes
+    enganchadas. Una fuente es un callable fuente(buf) que llena 'buf'
+    (frames x canales) y devuelve False cuando ha terminado. Aquí se mide el
+    arranque de todo lo que suena por el pool: de enganchar() al primer bloque.
+    Enganchar y soltar solo cambian la tupla (versión, fuentes), que se
+    publica con una asignación atómica, así que play/pausa no tocan PortAudio
+    y el callback nunca espera. Las fuentes se comparan con ==: guardar el
+    callable una vez y pasar siempre el mismo.
+    """
+    def __init__(self, device, samplerate, channels=2):
+        self.device, self.samplerate, self.channels = device, samplerate, channels
+        self.estado = (0, ())           # (versión, fuentes)
+        self.lock = threading.Lock()    # solo entre quienes cambian la tupla
+        self.tmp = np.zeros((BLOQUE_SALIDA, channels), dtype=np.float32)
+        self.xruns = 0
+        self.arranques = {}             # fuente -> perf_counter() al engancharla
+        self.stream = sd.OutputStream(samplerate=samplerate, channels=channels, device=device,
+                                      callback=self._callback, blocksize=BLOQUE_SALIDA)
+        self.stream.start()
+
+    @property
+    def fuentes(self):
+        return self.estado[1]
+
+    @property
+    def viva(self):
+        return not self.stream.closed and self.stream.active
+
+    def enganchar(self, fuente):
+        with self.lock:
+            v, fuentes = self.estado
+            if fuente in fuentes: return
+            self.arranques[fuente] = perf_counter()
+            self.estado = (v + 1, fuentes + (fuente,))
+
+    def soltar(self, fuente):
+        with self.lock:
+            v, fuentes = self.estado
+            self.estado = (v + 1, tuple(f for f in fuentes if f != fuente))
+            self.arranques.pop(fuente, None)
+
+    def cerrar(self):
+        with self.lock: self.estado = (self.estado[0] + 1, ())
+        try: self.stream.stop(); self.stream.close()
+        except Exception: pass
+
+    def _callback(self, out, frames, t, status):
+        if status.output_underflow:
+            self.xruns += 1
+            metricas.XRUNS.sumar()
+        (version, fuentes), terminadas = self.estado, []
+        if not fuentes: out.fill(0)
+        elif len(fuentes) == 1:
+            # Caso normal: la única fuente escribe directamente en el búfer de PortAudio
+            if not fuentes[0](out): terminadas.append(fuentes[0])
+        else:
+            if len(self.tmp) < frames: self.tmp = np.zeros((frames, self.channels), dtype=np.float32)
+            buf = self.tmp[:frames]
+            out.fill(0)
+            for f in fuentes:
+                if not f(buf): terminadas.append(f)
+                out += buf
+            np.clip(out, -1.0, 1.0, out=out)
+        if self.arranques:
+            ahora = perf_counter()
+            for f in fuentes:
+                t = self.arranques.pop(f, None)
+                if t is not None: metricas.ARRANQUE.observar(ahora - t)
+        if terminadas and self.lock.acquire(blocking=False):
+            # Solo si nadie ha enganchado o soltado desde que se leyó la tupla: un pausa+play
+            # dentro de este bloque no debe perder la fuente recién enganchada. Si no, se
+            # vuelve a mirar en el siguiente bloque.
+            if self.estado[0] == version:
+                self.estado = (version + 1, tuple(f for f in fuentes if f not in terminadas))
+            self.lock.release()
+
+class PoolSalidas:
+    """Una SalidaCompartida por (dispositivo, samplerate, canales), abierta la primera vez que se pide."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.salidas = {}
+
+    def obtener(self, device, samplerate, channels=2):
+        clave = (device, int(samplerate), channels)
+        with self.lock:
+            s = self.salidas.get(clave)
+            if s is None or not s.viva:
+                # Primera vez, o el stream murió (dispositivo desenchufado): se reabre
+                if s is not None: s.cerrar()
+                s = self.salidas[clave] = SalidaCompartida(device, int(samplerate), channels)
+            return s
+
+    def cerrar(self):
+        with self.lock:
+            for s in self.salidas.values(): s.cerrar()
+            self.salidas.clear()
+
+POOL = PoolSalidas()
+
+if __name__ == "__main__":
+    # python audio_libs.py ccpcadena.json  -> fija los dispositivos por nombre (ver migrar_config)
+    if len(sys.argv) < 2:
+        print("Uso: python audio_libs.py ccpcadena.json")
+        sys.exit(1)
+    cambios = migrar_documento(sys.argv[1])
+    if cambios:
+        # Queda constancia de cada cambio junto al archivo
+        from datetime import datetime
+        with open(os.path.join(os.path.dirname(os.path.abspath(sys.argv[1])), "dispositivos.log"), 'a', encoding='utf-8') as f:
+            for c in cambios: f.write(f"{datetime.now():%Y-%m-%d %H:%M:%S} {sys.argv[1]}: {c}\n")
+    for c in cambios: print(c)
+    print(f"Dispositivos actualizados (copia en {sys.argv[1]}.bak)" if cambios else "Sin cambios")
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark del motor de eventos (MotorEventos).
+
+Genera parrillas sintéticas de 10 a 100k eventos con todas las periodicidades
+y tipos, y mide: tiempo de carga y memoria por evento, por separado para el
+JSON en frío (sin caché binaria, ni leerla ni escribirla) y para el arranque
+desde la caché .mevc ya escrita; latencia por tick (p50/p99) del tick real
+(comprobar_todos: recoger + resolver_conflictos) y coste de una recarga
+incremental. Los resultados se guardan en JSON para compararlos entre versiones:
+
+    python bench_motor.py --salida antes.json
+    python bench_motor.py --salida despues.json --comparar antes.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+import cache_binaria
+import eventos3
+
+TAMAÑOS = [10, 100, 1000, 10000, 100000]
+TIPOS = ['file', 'random', 'time', 'temp', 'sat']
+# Cuánto puede empeorar una métrica antes de marcarla como regresión
+TOLERANCIA = 1.2
+# Formato de los resultados: con otro formato las métricas no miden lo mismo
+FORMATO = 2
+
+def generar(n, semilla=1):
+    rnd = random.Random(semilla)
+    eventos = []
+    for i in range(n):
+        per = rnd.choice(['once', 'hourly', 'other'])
+        typ = rnd.choice(TIPOS)
+        eventos.append({
+            "name": f"Evento {i}",
+            "time": f"{rnd.randrange(24):02}:{rnd.randrange(60):02}:{rnd.randrange(60):02}",
+            "periodicity": per,
+            "other_hours": sorted(rnd.sample(range(24), rnd.randint(1, 12))) if per == 'other' else [],
+            "days": [rnd.random() < 0.8 for _ in range(7)],
+            "immediate": rnd.random() < 0.3,
+            "overlay": rnd.random() < 0.1,
+            "priority": rnd.choice(['high', 'low']),
+            "expire": False,
+            "type": typ,
+            "value": f"D:/musica/bloque{i % 50}/tema{i}.mp3" if typ in ('file', 'random') else (i % 4 if typ == 'sat' else ''),
+            "extra": {"wait_enabled": rnd.random() < 0.5, "wait_minutes": rnd.randint(1, 15), "duration": "00:30:00"},
+            "active": rnd.random() < 0.95,
+        })
+    return eventos
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+def cargar(ruta, medir_memoria=False):
+    """(motor, segundos, bytes) de crear un MotorEventos sobre 'ruta'."""
+    if medir_memoria:
+        tracemalloc.start()
+        base = tracemalloc.take_snapshot()
+    t = time.perf_counter()
+    motor = eventos3.MotorEventos(vigilar=False, path=ruta)
+    dur = time.perf_counter() - t
+    uso = 0
+    if medir_memoria:
+        uso = sum(s.size_diff for s in tracemalloc.take_snapshot().compare_to(base, 'filename'))
+        tracemalloc.stop()
+    return motor, dur, uso
+
+def medir(n, ticks=3600):
+    eventos = generar(n)
+    carpeta = tempfile.mkdtemp(prefix="bench_motor_")
+    ruta = os.path.join(carpeta, "events_db.json")
+    with open(ruta, 'w') as f: json.dump(eventos, f)
+    guardar = cache_binaria.guardar
+    try:
+        # JSON en frío: sin .mevc y sin escribirlo, para medir solo parseo + compilación
+        cache_binaria.guardar = lambda *a, **k: None
+        try:
+            motor, carga_json, _ = cargar(ruta)
+            _, _, uso_json = cargar(ruta, medir_memoria=True)
+        finally: cache_binaria.guardar = guardar
+        # Caché en caliente: se escribe una vez (sin medir) y se arranca desde ella
+        cargar(ruta)
+        _, carga_cache, _ = cargar(ruta)
+        _, _, uso_cache = cargar(ruta, medir_memoria=True)
+
+        # Latencia por tick: una hora seguida a partir de un lunes a medianoche, con el tick
+        # real (recoger + resolver_conflictos), sobre el motor cargado desde el JSON
+        inicio = datetime(2026, 1, 5)
+        lat = []
+        for s in range(ticks):
+            ahora = inicio + timedelta(seconds=s)
+            t = time.perf_counter()
+            motor.comprobar_todos(now=ahora)
+            lat.append(time.perf_counter() - t)
+
+        # Recarga incremental: editamos un 1% de los eventos
+        for e in random.Random(2).sample(eventos, max(1, n // 100)):
+            e['time'] = "12:34:56"
+        with open(ruta, 'w') as f: json.dump(eventos, f)
+        t = time.perf_counter()
+        motor.recargar_si_cambia()
+        recarga = time.perf_counter() - t
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+    return {
+        "eventos": n,
+        "carga_json_s": round(carga_json, 6),
+        "carga_cache_s": round(carga_cache, 6),
+        "tick_p50_us": round(percentil(lat, 0.50) * 1e6, 2),
+        "tick_p99_us": round(percentil(lat, 0.99) * 1e6, 2),
+        "bytes_por_evento_json": round(uso_json / n, 1),
+        "bytes_por_evento_cache": round(uso_cache / n, 1),
+        "recarga_s": round(recarga, 6),
+    }
+
+def comparar(actual, previo):
+    if previo.get('formato') != FORMATO:
+        print(f"Aviso: {previo.get('formato', 1)!r} es otro formato de resultados; solo se comparan las métricas comunes")
+    antes = {r['eventos']: r for r in previo['resultados']}
+    regresiones = 0
+    for r in actual['resultados']:
+        a = antes.get(r['eventos'])
+        if not a: continue
+        for k, v in r.items():
+            if k == 'eventos' or not a.get(k): continue
+            ratio = v / a[k]
+            marca = "  <-- REGRESIÓN" if ratio > TOLERANCIA else ""
+            if marca: regresiones += 1
+            print(f"{r['eventos']:>7} {k:18} {a[k]:>12} -> {v:>12}  x{ratio:.2f}{marca}")
+    return regresiones
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Benchmark del motor de eventos")
+    ap.add_argument("--tamaños", type=int, nargs="+", default=TAMAÑOS)
+    ap.add_argument("--ticks", type=int, default=3600)
+    ap.add_argument("--salida", default="bench_motor.json")
+    ap.add_argument("--comparar", help="JSON de una ejecución anterior")
+    args = ap.parse_args()
+
+    resultados = []
+    for n in args.tamaños:
+        r = medir(n, args.ticks)
+        print(f"{n:>7} eventos: carga json {r['carga_json_s']:.4f}s caché {r['carga_cache_s']:.4f}s  "
+              f"tick p50 {r['tick_p50_us']}us p99 {r['tick_p99_us']}us  "
+              f"{r['bytes_por_evento_json']}/{r['bytes_por_evento_cache']} B/evento  recarga {r['recarga_s']:.4f}s")
+        resultados.append(r)
+    salida = {"formato": FORMATO, "fecha": datetime.now().isoformat(timespec='seconds'), "python": platform.python_version(),
+              "plataforma": platform.platform(), "resultados": resultados}
+    with open(args.salida, 'w') as f: json.dump(salida, f, indent=2)
+    if args.comparar:
+        with open(args.comparar) as f: previo = json.load(f)
+        if comparar(salida, previo): raise SystemExit(1)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Caché binaria de la programación compilada.
+
+Junto a EVENTS_FILE se guarda un .mevc con las reglas ya compiladas en arrays
+empaquetados (segundos, máscaras, prioridades...) y una tabla de cadenas
+internadas para nombres, rutas y demás campos. Si la firma del JSON (mtime y
+tamaño, o su hash si solo cambió el mtime) coincide, el motor arranca desde
+aquí sin parsear JSON; los dicts de evento se reconstruyen solo al pedirlos.
+Al final van los errores de esquema de la carga en frío, para que un arranque
+desde la caché avise de lo mismo.
+"""
+import hashlib
+import json
+import os
+import struct
+from array import array
+from reglas import EventRule
+
+MAGIA = b'MEVC'
+VERSION = 3
+CABECERA = struct.Struct('<4sHIqq20sI')
+
+# Claves conocidas del evento, en el orden del editor. Cada una ocupa un bit de
+# 'claves' (presente o no) para devolver el dict tal y como estaba.
+CAMPOS = ['name', 'time', 'periodicity', 'other_hours', 'days', 'immediate', 'overlay', 'priority',
+          'expire', 'expire_date', 'type', 'value', 'extra', 'active']
+# Campos que van como cadena internada (JSON) y no como bit
+TEXTO = ['name', 'time', 'periodicity', 'other_hours', 'days', 'priority', 'expire_date', 'type', 'value', 'extra']
+BOOLEANOS = ['immediate', 'overlay', 'expire', 'active']
+# Arrays de la regla compilada: (nombre, código de array)
+ARRAYS = [('pos', 'i'), ('periodicidad', 'b'), ('segundo', 'i'), ('dias', 'B'), ('horas', 'i'),
+          ('expira', 'd'), ('rango', 'B'), ('overlay', 'B'), ('activo', 'B'), ('valida', 'B'),
+          ('claves', 'i'), ('bools', 'B'), ('resto', 'i')] + [('s_' + c, 'i') for c in TEXTO]
+
+def ruta_cache(path):
+    return path + ".mevc"
+
+def hash_archivo(path):
+    with open(path, 'rb') as f: return hashlib.sha1(f.read()).digest()
+
+def guardar(path, fuente, eventos, reglas, errores=()):
+    """Escribe la caché de 'eventos' (leídos de 'fuente') con sus reglas compiladas y sus errores de esquema."""
+    st = os.stat(fuente)
+    cadenas, internas = [], {}
+    def internar(valor):
+        t = json.dumps(valor)
+        i = internas.get(t)
+        if i is None:
+            i = internas[t] = len(cadenas)
+            cadenas.append(t)
+        return i
+
+    cols = {n: array(c) for n, c in ARRAYS}
+    por_pos = {r.pos: r for r in reglas}
+    for i, e in enumerate(eventos):
+        r = por_pos.get(i)
+        cols['valida'].append(1 if r else 0)
+        cols['pos'].append(i)
+        cols['periodicidad'].append(r.periodicidad if r else -1)
+        cols['segundo'].append(r.segundo if r else 0)
+        cols['dias'].append(r.dias if r else 0)
+        cols['horas'].append(r.horas if r else 0)
+        cols['expira'].append(r.expira if r else 0)
+        cols['rango'].append(r.rango if r else 0)
+        cols['overlay'].append(1 if r and r.overlay else 0)
+        cols['activo'].append(1 if r and r.activo else 0)
+        claves = bools = 0
+        for b, c in enumerate(CAMPOS):
+            if c in e: claves |= 1 << b
+        for b, c in enumerate(BOOLEANOS):
+            if e.get(c): bools |= 1 << b
+        cols['claves'].append(claves)
+        cols['bools'].append(bools)
+        for c in TEXTO:
+            cols['s_' + c].append(internar(e[c]) if c in e else -1)
+        # Claves que no conocemos (o booleanos que no son bool): van tal cual
+        resto = {k: v for k, v in e.items() if k not in CAMPOS or (k in BOOLEANOS and not isinstance(v, bool))}
+        cols['resto'].append(internar(resto) if resto else -1)
+
+    blob = bytearray()
+    fines = array('I')
+    for t in cadenas:
+        blob += t.encode('utf-8')
+        fines.append(len(blob))
+
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        f.write(CABECERA.pack(MAGIA, VERSION, len(eventos), st.st_mtime_ns, st.st_size, hash_archivo(fuente), len(cadenas)))
+        f.write(fines.tobytes())
+        f.write(struct.pack('<I', len(blob)))
+        f.write(blob)
+        for n, c in ARRAYS: f.write(cols[n].tobytes())
+        texto = json.dumps(list(errores)).encode('utf-8')
+        f.write(struct.pack('<I', len(texto)))
+        f.write(texto)
+    os.replace(tmp, path)
+
+class Decodificador:
+    """Reconstruye bajo demanda los dicts de evento a partir de la caché."""
+    def __init__(self, n, cols, fines, blob):
+        self.n = n
+        self.cols = cols
+        self.fines = fines
+        self.blob = blob
+        self.cadenas = {}
+        self.eventos = [None] * n
+
+    def cadena(self, i):
+        v = self.cadenas.get(i)
+        if v is None:
+            a = self.fines[i - 1] if i else 0
+            v = self.cadenas[i] = self.blob[a:self.fines[i]].decode('utf-8')
+        return v
+
+    def evento(self, i):
+        e = self.eventos[i]
+        if e is not None: return e
+        cols = self.cols
+        claves, bools = cols['claves'][i], cols['bools'][i]
+        e = {}
+        for b, c in enumerate(CAMPOS):
+            if not claves >> b & 1: continue
+            if c in BOOLEANOS: e[c] = bool(bools >> BOOLEANOS.index(c) & 1)
+            else: e[c] = json.loads(self.cadena(cols['s_' + c][i]))
+        if cols['resto'][i] >= 0: e.update(json.loads(self.cadena(cols['resto'][i])))
+        self.eventos[i] = e
+        return e
+
+def cargar(path, fuente):
+    """(decodificador, reglas, errores) si la caché sigue siendo válida para 'fuente'; si no, None."""
+    try:
+        st = os.stat(fuente)
+        with open(path, 'rb') as f: datos = f.read()
+        magia, version, n, mtime, size, h, ncad = CABECERA.unpack_from(datos, 0)
+        if magia != MAGIA or version != VERSION or size != st.st_size: return None
+        # Mismo tamaño pero otro mtime (copiado, tocado): decide el hash
+        if mtime != st.st_mtime_ns and h != hash_archivo(fuente): return None
+        off = CABECERA.size
+        fines = array('I')
+        fines.frombytes(datos[off:off + 4 * ncad]); off += 4 * ncad
+        (lblob,) = struct.unpack_from('<I', datos, off); off += 4
+        blob = datos[off:off + lblob]; off += lblob
+        cols = {}
+        for nombre, c in ARRAYS:
+            a = array(c)
+            tam = a.itemsize * n
+            a.frombytes(datos[off:off + tam]); off += tam
+            cols[nombre] = a
+        (lerr,) = struct.unpack_from('<I', datos, off); off += 4
+        errores = json.loads(datos[off:off + lerr].decode('utf-8'))
+    except Exception:
+        return None
+
+    dec = Decodificador(n, cols, fines, blob)
+    reglas = []
+    for i in range(n):
+        if not cols['valida'][i]: continue
+        reglas.append(EventRule(None, cols['pos'][i], cols['periodicidad'][i], cols['segundo'][i], cols['dias'][i],
+                                cols['horas'][i], cols['expira'][i], cols['rango'][i], bool(cols['overlay'][i]),
+                                bool(cols['activo'][i]), (dec, i)))
+    return dec, reglas, errores
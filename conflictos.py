@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Detector de solapes de la parrilla usando la duración real de los audios.
+
+Sobre la línea de tiempo de simulacion.expandir() calcula cuándo acaba cada
+disparo y avisa de:
+  - solape: un evento principal sigue sonando cuando entra el siguiente
+  - espera agotada: un evento con 'Espera máx' no llegaría a sonar a tiempo
+  - inmediatos seguidos: un inmediato corta a otro inmediato
+"""
+import json
+import os
+from datetime import datetime
+import numpy as np
+import soundfile as sf
+from persistencia import escribir_atomico
+from simulacion import expandir
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DURACIONES_FILE = os.path.join(BASE_DIR, "duraciones_cache.json")
+AUDIO_EXTS = (".mp3", ".wav", ".wma", ".aac", ".flac", ".ogg", ".m4a")
+# Locuciones de hora/temperatura: duración aproximada
+DURACION_LOCUCION = 8.0
+
+class CacheDuraciones:
+    """Duración en segundos por fichero (o peor caso por carpeta), cacheada en disco por mtime/tamaño."""
+    def __init__(self, path=DURACIONES_FILE):
+        self.path = path
+        self.cache = {}
+        self.sucio = False
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f: self.cache = json.load(f)
+            except: self.cache = {}
+
+    def guardar(self):
+        if not self.sucio: return
+        try:
+            # Se guarda desde el hilo del análisis: un corte nunca deja la caché a medias
+            escribir_atomico(self.path, json.dumps(self.cache))
+            self.sucio = False
+        except Exception as e: print(f"Error guardando duraciones: {e}")
+
+    def _consultar(self, path, calcular):
+        try: st = os.stat(path)
+        except OSError: return None
+        c = self.cache.get(path)
+        if c and c['mtime'] == st.st_mtime_ns and c['size'] == st.st_size: return c['dur']
+        dur = calcular(path)
+        self.cache[path] = {'mtime': st.st_mtime_ns, 'size': st.st_size, 'dur': dur}
+        self.sucio = True
+        return dur
+
+    def fichero(self, path):
+        def calcular(p):
+            try: return sf.info(p).duration
+            except Exception: return None
+        return self._consultar(path, calcular)
+
+    def carpeta(self, path):
+        # Para carpetas random tomamos el tema más largo: es el que puede pisar al siguiente
+        def calcular(p):
+            durs = [self.fichero(os.path.join(p, n)) for n in os.listdir(p) if n.lower().endswith(AUDIO_EXTS)]
+            durs = [d for d in durs if d]
+            return max(durs) if durs else None
+        return self._consultar(path, calcular)
+
+    def evento(self, e):
+        typ = e.get('type')
+        if typ == 'file': return self.fichero(e.get('value', ''))
+        if typ == 'random': return self.carpeta(e.get('value', ''))
+        if typ in ('time', 'temp'): return DURACION_LOCUCION
+        if typ == 'sat':
+            h, m, s = (int(x) for x in e.get('extra', {}).get('duration', '00:00:00').split(':'))
+            return h * 3600 + m * 60 + s
+        return None
+
+def analizar(reglas, desde, hasta, duraciones=None):
+    """Lista de conflictos [{'tipo', 'ts', 'evento', 'con', 'detalle'}] en [desde, hasta)."""
+    duraciones = duraciones or CacheDuraciones()
+    linea = expandir(reglas, desde, hasta)
+    if len(linea) == 0: return []
+
+    dur_regla = np.array([duraciones.evento(r.evento) or 0.0 for r in reglas])
+    duraciones.guardar()
+    overlay = np.array([r.overlay for r in reglas], dtype=bool)
+    inmediato = np.array([r.evento['immediate'] for r in reglas], dtype=bool)
+    espera = np.array([r.evento['extra']['wait_minutes'] * 60 if r.evento['extra']['wait_enabled'] else -1
+                       for r in reglas])
+
+    # Los overlay suenan por encima: no ocupan la salida principal
+    linea = linea[~overlay[linea['regla']]]
+    if len(linea) < 2: return []
+    ri = linea['regla']
+    ts = linea['ts'].astype(np.int64)
+    fin = ts + dur_regla[ri]
+    # Hasta cuándo está ocupada la salida justo antes de cada disparo, y por quién
+    tope = np.maximum.accumulate(fin)
+    quien = np.maximum.accumulate(np.where(fin >= tope, np.arange(len(fin)), 0))[:-1]
+    resto = tope[:-1] - ts[1:]
+    ocupado = resto > 0
+    inm = inmediato[ri]
+    inm_sig, inm_quien = inm[1:], inm[quien]
+    esp = espera[ri][1:]
+
+    out = []
+    def añadir(tipo, k, detalle):
+        out.append({'tipo': tipo, 'ts': datetime.fromisoformat(str(linea['ts'][k + 1])),
+                    'evento': reglas[ri[k + 1]].evento, 'con': reglas[ri[quien[k]]].evento, 'detalle': detalle})
+
+    for k in np.nonzero(ocupado & inm_sig)[0]:
+        añadir('inmediatos' if inm_quien[k] else 'solape', k, f"corta {resto[k]:.0f}s del anterior")
+    for k in np.nonzero(ocupado & ~inm_sig)[0]:
+        if esp[k] >= 0 and resto[k] > esp[k]:
+            añadir('espera', k, f"espera {resto[k]:.0f}s > máx {esp[k]:.0f}s")
+        else:
+            añadir('solape', k, f"espera {resto[k]:.0f}s a que acabe el anterior")
+    out.sort(key=lambda c: c['ts'])
+    return out
+
+def resumen(conflictos):
+    return [f"{c['ts']:%a %H:%M:%S}  [{c['tipo']}] {c['evento'].get('name', '')} <- {c['con'].get('name', '')}: {c['detalle']}"
+            for c in conflictos]
@@ -1,63 +1,67 @@
 # -*- coding: utf-8 -*-
 import os
-import threading
-import numpy as np
-import sounddevice as sd
-import soundfile as sf
-from PySide6.QtWidgets import (QDialog, QVBoxLayout, QLabel, QSlider, QHBoxLayout, 
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QLabel, QHBoxLayout, 
                                QPushButton, QDialogButtonBox, QMessageBox)
 from PySide6.QtCore import Qt, QTimer, QObject
+from audio_libs import REGISTRO, POOL, LectorBloques
+from onda import Resumen, SliderOnda
 
 class CueWorker(QObject):
     def __init__(self, filepath, device):
         super().__init__()
         self.filepath = filepath
-        self.device = device
-        self.data = None; self.fs = 44100; self.current_frame = 0
-        self.is_playing = False; self.stream = None; self.lock = threading.Lock()
+        self.device = REGISTRO.resolver(device)  # índice o referencia estable del registro
+        self.lector = None; self.fs = 44100; self.current_frame = 0
+        self.is_playing = False; self.salida = None
+        self.fuente = self.cb  # un único bound method: la salida compara fuentes con ==
 
     def load(self):
+        # Solo abre el archivo: los bloques se decodifican en segundo plano mientras suena
         try:
-            data, fs = sf.read(self.filepath, dtype='float32')
-            if data.ndim == 1: data = np.column_stack((data, data))
-            self.data = data; self.fs = fs
+            self.lector = LectorBloques(self.filepath); self.fs = self.lector.samplerate
             return True
         except: return False
 
+    def unload(self):
+        if self.lector: self.lector.cerrar(); self.lector = None
+
     def play(self):
-        if self.data is None: return
+        if self.lector is None: return
         self.is_playing = True
-        try:
-            self.stream = sd.OutputStream(samplerate=self.fs, channels=2, device=self.device, callback=self.cb, blocksize=2048)
-            self.stream.start()
+        # El stream del pool ya está abierto y sonando: play/pausa solo enganchan y sueltan la fuente
+        try: self.salida = POOL.obtener(self.device, self.fs, 2); self.salida.enganchar(self.fuente)
         except: self.is_playing = False
 
     def pause(self):
         self.is_playing = False
-        if self.stream: self.stream.stop(); self.stream.close()
+        if self.salida: self.salida.soltar(self.fuente)
 
     def seek(self, percent):
-        if self.data is None: return
-        with self.lock: self.current_frame = int(len(self.data) * percent)
+        if self.lector is None: return
+        self.lector.buscar(self.lector.frames * percent); self.current_frame = self.lector.posicion
 
-    def cb(self, out, fr, t, s):
-        if not self.is_playing: out.fill(0); raise sd.CallbackStop
-        with self.lock:
-            chk = len(out)
-            if self.current_frame + chk > len(self.data): out.fill(0); self.is_playing = False; raise sd.CallbackStop
-            else: out[:] = self.data[self.current_frame:self.current_frame+chk]; self.current_frame += chk
+    def cb(self, out):
+        """Fuente para la SalidaCompartida: False cuando ya no hay más audio."""
+        lector = self.lector
+        if not self.is_playing or lector is None: out.fill(0); return False
+        # Sin locks: el lector y seek() se comunican con el callback por el anillo del LectorBloques
+        n = lector.leer(out)
+        if n < len(out): out[n:] = 0
+        self.current_frame = lector.posicion
+        if lector.agotado(): self.is_playing = False; return False
+        return True
 
-    def get_pos(self): return (self.current_frame / len(self.data)) if (self.data is not None and len(self.data)>0) else 0
+    def get_pos(self): return (self.current_frame / self.lector.frames) if (self.lector is not None and self.lector.frames>0) else 0
     def get_time_str(self):
-        if self.data is None: return "00:00"
-        c = self.current_frame/self.fs; t = len(self.data)/self.fs
+        if self.lector is None: return "00:00"
+        c = self.current_frame/self.fs; t = self.lector.frames/self.fs
         return f"{int(c//60):02}:{int(c%60):02} / {int(t//60):02}:{int(t%60):02}"
 
 class CuePlayerDialog(QDialog):
     def __init__(self, parent, filepath, device_id, current_offset=0):
         super().__init__(parent)
         self.setWindowTitle("Pre-escucha (CUE) - Fijar Inicio")
-        self.resize(500, 160)
+        self.resize(500, 200)
         self.offset = current_offset
         self.worker = CueWorker(filepath, device_id)
         
@@ -67,7 +71,8 @@ class CuePlayerDialog(QDialog):
 
         l = QVBoxLayout(self)
         l.addWidget(QLabel(f"<b>Editando:</b> {os.path.basename(filepath)}"))
-        self.sl = QSlider(Qt.Horizontal); self.sl.setRange(0, 1000)
+        self.sl = SliderOnda(); self.sl.setRange(0, 1000)
+        self.onda = self.abrir_onda(filepath)
         self.sl.sliderPressed.connect(lambda: setattr(self, 'seeking', True))
         self.sl.sliderReleased.connect(self.do_seek)
         l.addWidget(self.sl)
@@ -85,6 +90,11 @@ class CuePlayerDialog(QDialog):
         self.tm = QTimer(self); self.tm.timeout.connect(self.upd); self.tm.start(100)
         self.tgl()
 
+    def abrir_onda(self, filepath):
+        # De la caché sale al momento; si no, se calcula en segundo plano y se va dibujando
+        try: r = Resumen(filepath)
+        except Exception as e: print("Sin forma de onda:", e); return None
+        self.sl.set_resumen(r); return r
     def tgl(self):
         if self.worker.is_playing: self.worker.pause(); self.bp.setText("▶ Play")
         else: self.worker.play(); self.bp.setText("⏸ Pausa")
@@ -92,12 +102,17 @@ class CuePlayerDialog(QDialog):
     def upd(self):
         self.lbl.setText(self.worker.get_time_str())
         if not self.seeking: self.sl.setValue(int(self.worker.get_pos()*1000))
+        if self.onda and not self.onda.completo: self.sl.update()
         if not self.worker.is_playing: self.bp.setText("▶ Play")
     def save(self):
         if self.worker.fs > 0: self.offset = self.worker.current_frame / self.worker.fs
         self.stop_close(save=True)
     def stop_close(self, save=False):
-        self.worker.pause(); self.tm.stop()
+        self.worker.pause(); self.worker.unload(); self.tm.stop()
+        if self.onda: self.onda.cerrar()
         if save: self.accept()
         else: self.reject()
-    def closeEvent(self, e): self.worker.pause(); e.accept()
\ No newline at end of file
+    def closeEvent(self, e):
+        self.worker.pause(); self.worker.unload()
+        if self.onda: self.onda.cerrar()
+        e.accept()
\ No newline at end of file
@@ -1,89 +1,87 @@
 # -*- coding: utf-8 -*-
 import os
-import threading
-import numpy as np
-import sounddevice as sd
-import soundfile as sf
-from PySide6.QtWidgets import (QDialog, QVBoxLayout, QLabel, QSlider, QHBoxLayout, 
+from PySide6.QtWidgets import (QDialog, QVBoxLayout, QLabel, QHBoxLayout, 
                                QPushButton, QDialogButtonBox, QMessageBox)
 from PySide6.QtCore import Qt, QTimer, QObject
-
-def read_audio(filepath):
-    try:
-        data, fs = sf.read(filepath, dtype='float32')
-        return data, fs
-    except:
-        return None, 0
+from audio_libs import REGISTRO, POOL, LectorBloques
+from onda import Resumen, SliderOnda
 
 class CueWorker(QObject):
     def __init__(self, filepath, device):
         super().__init__()
         self.filepath = filepath
-        self.device = device
-        self.data = None
+        self.device = REGISTRO.resolver(device)  # índice o referencia estable del registro
+        self.lector = None
         self.fs = 44100
         self.current_frame = 0
         self.is_playing = False
-        self.stream = None
-        self.lock = threading.Lock()
+        self.salida = None
+        self.fuente = self.callback  # un único bound method: la salida compara fuentes con ==
 
     def load(self):
-        d, f = read_audio(self.filepath)
-        if d is None: return False
-        if d.ndim == 1: d = np.column_stack((d, d))
-        self.data = d
-        self.fs = f
+        # Solo abre el archivo: los bloques se decodifican en segundo plano mientras suena
+        try:
+            self.lector = LectorBloques(self.filepath)
+        except Exception as e:
+            print("Error abriendo audio CUE:", e)
+            return False
+        self.fs = self.lector.samplerate
         return True
 
+    def unload(self):
+        if self.lector:
+            self.lector.cerrar()
+            self.lector = None
+
     def play(self):
-        if self.data is None: return
+        if self.lector is None: return
         self.is_playing = True
+        # El stream del pool ya está abierto y sonando: play/pausa solo enganchan y sueltan la fuente
         try:
-            self.stream = sd.OutputStream(
-                samplerate=self.fs, channels=2, device=self.device,
-                callback=self.callback, blocksize=2048
-            )
-            self.stream.start()
+            self.salida = POOL.obtener(self.device, self.fs, 2)
+            self.salida.enganchar(self.fuente)
         except Exception as e:
             print("Error stream CUE:", e)
             self.is_playing = False
 
     def pause(self):
         self.is_playing = False
-        if self.stream:
-            self.stream.stop(); self.stream.close()
+        if self.salida:
+            self.salida.soltar(self.fuente)
 
     def seek(self, percent):
-        if self.data is None: return
-        with self.lock:
-            self.current_frame = int(len(self.data) * percent)
-
-    def callback(self, outdata, frames, time, status):
-        if not self.is_playing:
-            outdata.fill(0); raise sd.CallbackStop
-        with self.lock:
-            chunksize = len(outdata)
-            if self.current_frame + chunksize > len(self.data):
-                outdata.fill(0); self.is_playing = False; raise sd.CallbackStop
-            else:
-                outdata[:] = self.data[self.current_frame:self.current_frame+chunksize]
-                self.current_frame += chunksize
+        if self.lector is None: return
+        self.lector.buscar(self.lector.frames * percent)
+        self.current_frame = self.lector.posicion
+
+    def callback(self, outdata):
+        """Fuente para la SalidaCompartida: False cuando ya no hay más audio."""
+        lector = self.lector
+        if not self.is_playing or lector is None:
+            outdata.fill(0); return False
+        # Sin locks: el lector y seek() se comunican con el callback por el anillo del LectorBloques
+        n = lector.leer(outdata)
+        if n < len(outdata): outdata[n:] = 0
+        self.current_frame = lector.posicion
+        if lector.agotado():
+            self.is_playing = False; return False
+        return True
 
     def get_pos(self):
-        if self.data is None or len(self.data) == 0: return 0
-        return self.current_frame / len(self.data)
+        if self.lector is None or self.lector.frames == 0: return 0
+        return self.current_frame / self.lector.frames
     
     def get_time_str(self):
-        if self.data is None: return "00:00"
+        if self.lector is None: return "00:00"
         cur = self.current_frame / self.fs
-        tot = len(self.data) / self.fs
+        tot = self.lector.frames / self.fs
         return f"{int(cur//60):02}:{int(cur%60):02} / {int(tot//60):02}:{int(tot%60):02}"
 
 class CuePlayerDialog(QDialog):
     def __init__(self, parent, filepath, device_id, current_offset=0):
         super().__init__(parent)
         self.setWindowTitle("Pre-escucha (CUE) - Fijar Inicio")
-        self.resize(500, 150)
+        self.resize(500, 190)
         self.offset = current_offset
         self.worker = CueWorker(filepath, device_id)
         
@@ -94,8 +92,9 @@ class CuePlayerDialog(QDialog):
         l = QVBoxLayout(self)
         l.addWidget(QLabel(f"<b>Editando:</b> {os.path.basename(filepath)}"))
         
-        self.slider = QSlider(Qt.Horizontal)
+        self.slider = SliderOnda()
         self.slider.setRange(0, 1000)
+        self.onda = self.abrir_onda(filepath)
         self.slider.sliderPressed.connect(self.seek_start)
         self.slider.sliderReleased.connect(self.seek_end)
         l.addWidget(self.slider)
@@ -119,6 +118,16 @@ class CuePlayerDialog(QDialog):
         self.timer = QTimer(self); self.timer.timeout.connect(self.update_ui); self.timer.start(100)
         self.toggle_play()
 
+    def abrir_onda(self, filepath):
+        # De la caché sale al momento; si no, se calcula en segundo plano y se va dibujando
+        try:
+            r = Resumen(filepath)
+        except Exception as e:
+            print("Sin forma de onda:", e)
+            return None
+        self.slider.set_resumen(r)
+        return r
+
     def toggle_play(self):
         if self.worker.is_playing:
             self.worker.pause(); self.btn_play.setText("▶ Play")
@@ -130,9 +139,10 @@ class CuePlayerDialog(QDialog):
         self.worker.seek(self.slider.value() / 1000); self.seeking = False
 
     def update_ui(self):
-        if self.worker.data is not None:
+        if self.worker.lector is not None:
             self.lbl_time.setText(self.worker.get_time_str())
             if not self.seeking: self.slider.setValue(int(self.worker.get_pos() * 1000))
+            if self.onda and not self.onda.completo: self.slider.update()
             if not self.worker.is_playing and self.btn_play.text() == "⏸ Pausa": self.btn_play.setText("▶ Play")
 
     def save(self):
@@ -140,8 +150,12 @@ class CuePlayerDialog(QDialog):
         self.stop_close(save=True)
 
     def stop_close(self, save=False):
-        self.worker.pause(); self.timer.stop()
+        self.worker.pause(); self.worker.unload(); self.timer.stop()
+        if self.onda: self.onda.cerrar()
         if save: self.accept()
         else: self.reject()
 
-    def closeEvent(self, e): self.worker.pause(); e.accept()
\ No newline at end of file
+    def closeEvent(self, e):
+        self.worker.pause(); self.worker.unload()
+        if self.onda: self.onda.cerrar()
+        e.accept()
\ No newline at end of file
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Esquema canónico de los eventos y migración de formatos antiguos.
+
+Nuestros archivos no coinciden: ccpcadena.json usa extra.wait y no tiene
+'expire', events_db.json usa extra.wait_enabled/wait_minutes, y a algunos
+eventos les falta 'name' u 'overlay'. normalizar() se ejecuta una vez al cargar
+y deja cada evento con todos los campos y tipos del editor, de modo que el
+motor no tenga que ir con .get() por detrás. Los errores se devuelven juntos
+para poder avisar al abrir.
+"""
+import re
+
+VERSION_ESQUEMA = 2
+PERIODICIDADES = ('once', 'hourly', 'other')
+TIPOS = ('file', 'random', 'time', 'temp', 'sat')
+RE_HORA = re.compile(r'^(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?$')
+
+def _hora(t):
+    m = RE_HORA.match(str(t).strip())
+    if not m: raise ValueError(f"hora no válida: {t!r}")
+    h, mi, s = int(m.group(1)), int(m.group(2)), int(m.group(3) or 0)
+    if h > 23 or mi > 59 or s > 59: raise ValueError(f"hora fuera de rango: {t!r}")
+    return f"{h:02}:{mi:02}:{s:02}"
+
+def _migrar_v1(e):
+    """v1 (ccpcadena.json): extra.wait en minutos, sin expire/overlay/name."""
+    extra = e.get('extra') or {}
+    if not isinstance(extra, dict): return e   # lo informa la validación
+    extra = dict(extra)
+    if 'wait' in extra:
+        # 'wait' se queda: otros lectores del archivo todavía lo usan
+        wait = extra['wait'] or 0
+        try: wait = int(wait)
+        except (TypeError, ValueError): raise ValueError(f"espera no válida: {wait!r}")
+        extra.setdefault('wait_enabled', wait > 0)
+        extra.setdefault('wait_minutes', wait if wait > 0 else 10)
+    e['extra'] = extra
+    return e
+
+MIGRACIONES = {1: _migrar_v1}
+
+def normalizar_evento(e):
+    """Devuelve (evento canónico, errores). Con errores se devuelve el original intacto."""
+    if not isinstance(e, dict): return e, ["no es un objeto"]
+    # Ya normalizado (guardado por el gestor o por una carga anterior): nada que hacer
+    if e.get('schema') == VERSION_ESQUEMA: return e, []
+    n = dict(e)
+    version = n.pop('schema', 1)
+    try:
+        for v in range(version, VERSION_ESQUEMA):
+            if v in MIGRACIONES: n = MIGRACIONES[v](n)
+    except (TypeError, ValueError) as ex: return e, [f"no se pudo migrar (schema {version!r}): {ex}"]
+
+    errores = []
+    try: n['time'] = _hora(n.get('time', ''))
+    except ValueError as ex: errores.append(str(ex))
+    if n.get('periodicity') not in PERIODICIDADES:
+        errores.append(f"periodicidad desconocida: {n.get('periodicity')!r}")
+    try:
+        horas = {int(h) for h in n.get('other_hours') or []}
+        fuera = sorted(h for h in horas if not 0 <= h <= 23)
+        if fuera: errores.append(f"horas fuera de rango: {fuera}")
+        else: n['other_hours'] = sorted(horas)
+    except (TypeError, ValueError): errores.append(f"horas no válidas: {n.get('other_hours')!r}")
+    if n.get('periodicity') == 'other' and not n.get('other_hours'):
+        errores.append("parrilla sin horas")
+    dias = n.get('days', [True] * 7)
+    if not isinstance(dias, list) or len(dias) != 7: errores.append(f"días no válidos: {dias!r}")
+    else: n['days'] = [bool(d) for d in dias]
+    if n.get('type') not in TIPOS: errores.append(f"tipo desconocido: {n.get('type')!r}")
+    elif n['type'] in ('file', 'random') and not n.get('value'): errores.append("sin fichero/carpeta")
+    extra = n.get('extra') or {}
+    if not isinstance(extra, dict): errores.append(f"extra no válido: {extra!r}")
+    else:
+        extra = dict(extra)
+        try:
+            extra['wait_minutes'] = int(extra.get('wait_minutes', 10))
+            if extra['wait_minutes'] < 0: raise ValueError
+        except (TypeError, ValueError): errores.append(f"espera no válida: {extra.get('wait_minutes')!r}")
+    if errores: return e, errores
+
+    n['name'] = str(n.get('name') or '')
+    n['immediate'] = bool(n.get('immediate', False))
+    n['overlay'] = bool(n.get('overlay', False))
+    n['priority'] = 'high' if n.get('priority') == 'high' else 'low'
+    n['expire'] = bool(n.get('expire', False))
+    if n['type'] in ('time', 'temp'): n['value'] = n.get('value') or ''
+    extra['wait_enabled'] = bool(extra.get('wait_enabled', False))
+    try: extra['duration'] = _hora(extra.get('duration', '00:30:00'))
+    except ValueError: extra['duration'] = '00:30:00'
+    n['extra'] = extra
+    n['active'] = bool(n.get('active', True))
+    n['schema'] = VERSION_ESQUEMA
+    return n, []
+
+def normalizar(eventos):
+    """(eventos, errores) para toda la lista. Los inválidos se quedan en su sitio tal cual."""
+    out, errores = [], []
+    for i, e in enumerate(eventos):
+        n, err = normalizar_evento(e)
+        out.append(n)
+        if err:
+            nombre = e.get('name', '') if isinstance(e, dict) else ''
+            errores.append(f"Evento {i + 1} ({nombre}): " + "; ".join(err))
+    return out, errores
@@ -2,18 +2,44 @@
 import json
 import os
 import copy
-from datetime import datetime
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QTableView, 
                                QLabel, QLineEdit, QGroupBox, QRadioButton, QCheckBox, 
                                QTimeEdit, QDateEdit, QSpinBox, QComboBox, QStackedWidget, 
                                QFileDialog, QDialogButtonBox, QHeaderView, QGridLayout, 
                                QStyledItemDelegate, QStyle, QWidget, QMessageBox)
-from PySide6.QtCore import Qt, QAbstractTableModel, QModelIndex, QTime, QDate, QEvent, QRect
-import sounddevice as sd
+from PySide6.QtCore import (Qt, QAbstractTableModel, QAbstractProxyModel, QModelIndex, QTime, QDate, QEvent,
+                            QRect, QThread, QTimer, Signal)
+import numpy as np
+from audio_libs import REGISTRO, nombre_completo
+import conflictos
+from persistencia import DiarioCambios, aplicar_entrada, guardar_atomico, leer_diario, ruta_diario
+from almacen_sqlite import AlmacenEventos, cargar_eventos, es_almacen, leer_documento
+import cache_binaria
+import metricas
+from esquema import normalizar
+import salamandra
+from simulacion import compilar_eventos
+from reglas import (POLITICA_PRINCIPAL, TODAS_LAS_HORAS, compilar, entradas_indice,
+                    clave_evento, hora_a_segundos, proximo_disparo, resolver_conflictos)
 
 # --- RUTA POR DEFECTO DEL SISTEMA ---
+# Si EVENTS_FILE acaba en .db/.sqlite se usa el almacén SQLite (edición fila a fila)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 EVENTS_FILE = os.path.join(BASE_DIR, "events_db.json")
+# Segundos de retraso que el motor recupera si el bucle de Qt se atasca
+MAX_RETRASO = 5
+# Diferencia (s) entre reloj de pared y monotónico a partir de la cual consideramos
+# que el reloj ha saltado (NTP, cambio manual, horario de verano)
+SALTO_RELOJ = 1.0
+# Métricas en formato Prometheus, reescritas cada METRICAS_INTERVALO segundos por un solo Volcador
+METRICAS_FILE = os.path.join(BASE_DIR, "metricas.prom")
+METRICAS_INTERVALO = 10.0
+# Lo más que duerme el hilo del motor sin disparos a la vista
+SUEÑO_MAXIMO = 10.0
 
 class HourGridDialog(QDialog):
     def __init__(self, parent=None, selected_hours=None):
@@ -168,16 +194,15 @@ class EventEditorDialog(QDialog):
         w3 = QWidget()
         l3 = QHBoxLayout(w3)
         self.combo_sat = QComboBox()
-        try:
-            devs = sd.query_devices()
-            for i, d in enumerate(devs):
-                if d['max_input_channels'] > 0:
-                    self.combo_sat.addItem(f"{i}: {d['name']}", i)
-        except: pass
+        self.llenar_entradas()
+        b_refrescar = QPushButton("⟳")
+        b_refrescar.setToolTip("Volver a buscar dispositivos")
+        b_refrescar.clicked.connect(lambda: self.llenar_entradas(True))
         self.dur_sat = QTimeEdit(QTime(0, 30, 0))
         self.dur_sat.setDisplayFormat("HH:mm:ss")
         l3.addWidget(QLabel("Entrada:"))
         l3.addWidget(self.combo_sat)
+        l3.addWidget(b_refrescar)
         l3.addWidget(QLabel("Duración:"))
         l3.addWidget(self.dur_sat)
         self.stack.addWidget(w3)
@@ -226,6 +251,8 @@ class EventEditorDialog(QDialog):
         self.chk_wait.setChecked(extra.get('wait_enabled', False))
         self.spin_wait.setValue(extra.get('wait_minutes', 10))
         self.chk_expire.setChecked(d.get('expire', False))
+        if d.get('expire_date'):
+            self.date_expire.setDate(QDate.fromString(d['expire_date'], "yyyy-MM-dd"))
         if d.get('priority') == 'high':
             self.rb_prio_high.setChecked(True)
         days = d.get('days', [True]*7)
@@ -245,9 +272,24 @@ class EventEditorDialog(QDialog):
             self.rb_temp.setChecked(True)
         elif typ == 'sat':
             self.rb_sat.setChecked(True)
-            idx = self.combo_sat.findData(val)
+            # El índice guardado puede haber cambiado: manda la referencia por nombre
+            idx = self.combo_sat.findData(REGISTRO.resolver(extra.get('device', val)))
             if idx >= 0: self.combo_sat.setCurrentIndex(idx)
 
+    def llenar_entradas(self, refrescar=False):
+        # La lista sale de la caché del registro: abrir el editor no consulta a PortAudio
+        actual = self.combo_sat.currentData()
+        if refrescar:
+            # Sondeo en otro proceso: reiniciar PortAudio aquí cortaría la salida al aire
+            nuevos = REGISTRO.sondear()
+            if nuevos:
+                QMessageBox.information(self, "Dispositivos nuevos",
+                                        "Se podrán usar al reiniciar el programa:\n" + "\n".join(nombre_completo(d) for d in nuevos))
+        self.combo_sat.clear()
+        for d in REGISTRO.entradas(): self.combo_sat.addItem(f"{d['index']}: {nombre_completo(d)}", d['index'])
+        idx = self.combo_sat.findData(actual)
+        if idx >= 0: self.combo_sat.setCurrentIndex(idx)
+
     def get_data(self):
         typ = 'file'
         val = self.txt_file.text()
@@ -266,35 +308,90 @@ class EventEditorDialog(QDialog):
         per = 'once'
         if self.rb_hourly.isChecked(): per = 'hourly'
         elif self.rb_grid.isChecked(): per = 'other'
-        return {
+        # Se parte del extra original: conserva lo que el editor no muestra (wait antiguo, datos de Salamandra...)
+        extra = dict(self.event_data.get('extra') or {})
+        extra.update(wait_enabled=self.chk_wait.isChecked(), wait_minutes=self.spin_wait.value(),
+                     duration=self.dur_sat.time().toString("HH:mm:ss"))
+        if 'wait' in extra: extra['wait'] = extra['wait_minutes'] if extra['wait_enabled'] else 0
+        d = {
             "name": self.txt_name.text(),
             "time": self.time_edit.time().toString("HH:mm:ss"),
             "periodicity": per,
-            "other_hours": self.other_hours_list,
+            "other_hours": sorted(self.other_hours_list),
             "days": [c.isChecked() for c in self.days_checks],
             "immediate": self.chk_immediate.isChecked(),
             "overlay": self.chk_overlay.isChecked(),
             "priority": "high" if self.rb_prio_high.isChecked() else "low",
             "expire": self.chk_expire.isChecked(),
+            "expire_date": self.date_expire.date().toString("yyyy-MM-dd"),
             "type": typ,
             "value": val,
-            "extra": {
-                "wait_enabled": self.chk_wait.isChecked(),
-                "wait_minutes": self.spin_wait.value(),
-                "duration": self.dur_sat.time().toString("HH:mm:ss")
-            },
+            "extra": extra,
             "active": self.event_data.get('active', True)
         }
+        if typ == 'sat':
+            ref = REGISTRO.referencia(val)
+            if ref: d["extra"]["device"] = ref
+        return d
+
+DIAS_LETRAS = "LMXJVSD"
+TIPOS_EVENTO = ['file', 'random', 'time', 'temp', 'sat']
+
+def dias_texto(days):
+    return "".join(c if i < len(days) and days[i] else "·" for i, c in enumerate(DIAS_LETRAS))
+
+def claves_evento(e):
+    """Claves de orden y filtro de un evento: (segundo, días, horas, tipo, prioridad, activo, nombre, texto)."""
+    try: seg = hora_a_segundos(e['time'])
+    except Exception: seg = 0
+    dias = 0
+    for i, d in enumerate(e.get('days', [])[:7]):
+        if d: dias |= 1 << i
+    per = e.get('periodicity')
+    if per == 'hourly': horas = TODAS_LAS_HORAS
+    elif per == 'other':
+        horas = 0
+        # Eventos con errores de esquema llegan sin normalizar: se ignoran las horas imposibles
+        for h in e.get('other_hours') or []:
+            if str(h).isdigit() and int(h) <= 23: horas |= 1 << int(h)
+    else: horas = 1 << (seg // 3600)
+    tipo = TIPOS_EVENTO.index(e['type']) if e.get('type') in TIPOS_EVENTO else len(TIPOS_EVENTO)
+    nombre = str(e.get('name', '')).lower()
+    return (seg, dias, horas, tipo, 0 if e.get('priority') == 'high' else 1, bool(e.get('active', True)),
+            nombre, nombre + "\n" + str(e.get('value', '')).lower())
 
 class EventsTableModel(QAbstractTableModel):
-    def __init__(self, events):
+    """Tabla de eventos; cada cambio avisa solo de las filas que toca."""
+    def __init__(self, events, al_cambiar=None):
         super().__init__()
         self.events = events
+        self.al_cambiar = al_cambiar
         self.headers = ["Hora", "Tipo", "Nombre", "Días", "Activo"]
 
-    def rowCount(self, p=QModelIndex()): return len(self.events)
+    def rowCount(self, p=QModelIndex()): return 0 if p.isValid() else len(self.events)
     def columnCount(self, p=QModelIndex()): return 5
-    
+
+    def reset_events(self, events):
+        self.beginResetModel()
+        self.events = events
+        self.endResetModel()
+
+    def append_event(self, e):
+        fila = len(self.events)
+        self.beginInsertRows(QModelIndex(), fila, fila)
+        self.events.append(e)
+        self.endInsertRows()
+        return fila
+
+    def replace_event(self, row, e):
+        self.events[row] = e
+        self.dataChanged.emit(self.index(row, 0), self.index(row, 4))
+
+    def remove_event(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        self.events.pop(row)
+        self.endRemoveRows()
+
     def data(self, index, role):
         if not index.isValid(): return None
         e = self.events[index.row()]
@@ -302,7 +399,7 @@ class EventsTableModel(QAbstractTableModel):
             if index.column() == 0: return e['time']
             if index.column() == 1: return e['type'].upper()
             if index.column() == 2: return e.get('name', '')
-            if index.column() == 3: return "LMXJVSD" 
+            if index.column() == 3: return dias_texto(e.get('days', []))
             if index.column() == 4: return "SI" if e.get('active', True) else "NO"
         return None
 
@@ -315,9 +412,292 @@ class EventsTableModel(QAbstractTableModel):
         self.events[row]['active'] = not self.events[row].get('active', True)
         self.dataChanged.emit(self.index(row, 0), self.index(row, 4))
         # Guardado automático en el archivo del sistema
-        try:
-            with open(EVENTS_FILE, 'w') as f: json.dump(self.events, f)
-        except Exception as e: print(f"Error guardando estado: {e}")
+        if self.al_cambiar: self.al_cambiar('toggle', row)
+
+class FiltroEventos(QAbstractProxyModel):
+    """Orden, filtro y búsqueda sobre EventsTableModel, con carga por páginas.
+
+    Las claves de cada evento (segundo, máscara de días y horas, tipo, prioridad,
+    texto) se calculan una vez y se actualizan fila a fila con los avisos del
+    modelo; filtrar y ordenar son operaciones NumPy sobre esas columnas, no
+    llamadas a Python por fila. La búsqueda por texto es incremental: si la
+    consulta nueva contiene la anterior, solo se busca entre lo que ya coincidía.
+    La vista solo conoce las filas ya paginadas (canFetchMore/fetchMore).
+    Altas, bajas y cambios del modelo se traducen en inserciones, borrados o
+    movimientos de una sola fila del proxy (búsqueda binaria de su sitio), así
+    que la vista conserva el scroll y la selección.
+    """
+    PAGINA = 500
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.claves = []
+        self.arrays = None
+        self.filas = np.arange(0)          # fila del proxy -> fila del modelo
+        self.inversa = np.full(0, -1)      # fila del modelo -> fila del proxy (-1 = oculta)
+        self.cargadas = 0
+        self.columna, self.orden = -1, Qt.AscendingOrder
+        self.texto, self.tipo, self.dia, self.desde, self.hasta = "", None, None, 0, 86399
+        self.busqueda = ("", None)         # (consulta, filas del modelo que coinciden)
+
+    def setSourceModel(self, m):
+        super().setSourceModel(m)
+        m.modelAboutToBeReset.connect(self.beginResetModel)
+        m.modelReset.connect(self.fuente_reiniciada)
+        m.rowsInserted.connect(self.filas_insertadas)
+        m.rowsAboutToBeRemoved.connect(self.filas_a_quitar)
+        m.rowsRemoved.connect(self.filas_quitadas)
+        m.dataChanged.connect(self.datos_cambiados)
+        self.beginResetModel()
+        self.fuente_reiniciada()
+
+    # --- Claves, al día con los avisos del modelo ---
+    @staticmethod
+    def columnas_de(claves):
+        return {
+            'seg': np.fromiter((k[0] for k in claves), np.int32, len(claves)),
+            'dias': np.fromiter((k[1] for k in claves), np.int32, len(claves)),
+            'horas': np.fromiter((k[2] for k in claves), np.int32, len(claves)),
+            'tipo': np.fromiter((k[3] for k in claves), np.int8, len(claves)),
+            'prio': np.fromiter((k[4] for k in claves), np.int8, len(claves)),
+            'activo': np.fromiter((k[5] for k in claves), np.bool_, len(claves)),
+            'nombre': np.array([k[6] for k in claves], dtype=object),
+        }
+
+    def fuente_reiniciada(self):
+        self.claves = [claves_evento(e) for e in self.sourceModel().events]
+        self.arrays = self.columnas_de(self.claves)
+        self.busqueda = ("", None)
+        self.calcular(reiniciar=True)
+        self.endResetModel()
+
+    def reindexar(self):
+        self.inversa = np.full(len(self.claves), -1, dtype=np.int64)
+        self.inversa[self.filas] = np.arange(len(self.filas))
+
+    def quitar(self, p):
+        """Saca la fila p del proxy; la vista solo se entera si ya estaba paginada."""
+        visible = p < self.cargadas
+        if visible: self.beginRemoveRows(QModelIndex(), p, p)
+        self.filas = np.delete(self.filas, p)
+        self.reindexar()
+        if visible:
+            self.cargadas -= 1
+            self.endRemoveRows()
+
+    def poner(self, p, fila):
+        """Mete la fila 'fila' del modelo en la posición p del proxy."""
+        visible = p < self.cargadas or self.cargadas == len(self.filas)
+        if visible: self.beginInsertRows(QModelIndex(), p, p)
+        self.filas = np.insert(self.filas, p, fila)
+        self.reindexar()
+        if visible:
+            self.cargadas += 1
+            self.endInsertRows()
+
+    def filas_insertadas(self, p, a, b):
+        k = b - a + 1
+        ev = self.sourceModel().events
+        nuevas = [claves_evento(ev[i]) for i in range(a, b + 1)]
+        self.claves[a:a] = nuevas
+        cols = self.columnas_de(nuevas)
+        self.arrays = {n: np.concatenate([v[:a], cols[n], v[a:]]) for n, v in self.arrays.items()}
+        # Las filas de detrás se desplazan; en el proxy siguen en su sitio
+        self.filas[self.filas >= a] += k
+        q, coinciden = self.busqueda
+        if coinciden is not None:
+            coinciden = coinciden + k * (coinciden >= a)
+            self.busqueda = (q, np.union1d(coinciden, [i for i in range(a, b + 1) if q in self.claves[i][7]]).astype(np.int64))
+        self.reindexar()
+        for i in range(a, b + 1):
+            if self.pasa(i): self.poner(self.posicion(i), i)
+
+    def filas_a_quitar(self, p, a, b):
+        # Antes de que desaparezcan del modelo: la vista no debe pedir datos de filas que ya no existen
+        for i in range(b, a - 1, -1):
+            if self.inversa[i] >= 0: self.quitar(int(self.inversa[i]))
+
+    def filas_quitadas(self, p, a, b):
+        k = b - a + 1
+        del self.claves[a:b + 1]
+        self.arrays = {n: np.concatenate([v[:a], v[b + 1:]]) for n, v in self.arrays.items()}
+        self.filas[self.filas > b] -= k
+        q, coinciden = self.busqueda
+        if coinciden is not None:
+            coinciden = coinciden[(coinciden < a) | (coinciden > b)]
+            self.busqueda = (q, coinciden - k * (coinciden > b))
+        self.reindexar()
+
+    def datos_cambiados(self, a, b, roles=()):
+        ev = self.sourceModel().events
+        for i in range(a.row(), b.row() + 1):
+            self.claves[i] = claves_evento(ev[i])
+            for n, v in self.columnas_de([self.claves[i]]).items(): self.arrays[n][i] = v[0]
+            q, coinciden = self.busqueda
+            if coinciden is not None:
+                coinciden = coinciden[coinciden != i]
+                if q in self.claves[i][7]: coinciden = np.union1d(coinciden, [i]).astype(np.int64)
+                self.busqueda = (q, coinciden)
+            self.recolocar(i)
+
+    def recolocar(self, i):
+        """Pone la fila i del modelo donde le toca según filtro y orden, moviéndola si hace falta."""
+        antes = int(self.inversa[i])
+        if antes < 0:
+            if self.pasa(i): self.poner(self.posicion(i), i)
+            return
+        if not self.pasa(i):
+            self.quitar(antes)
+            return
+        resto = np.delete(self.filas, antes)
+        despues = self.posicion(i, resto)
+        if despues == antes:
+            if antes < self.cargadas:
+                self.dataChanged.emit(self.index(antes, 0), self.index(antes, self.columnCount() - 1))
+        elif antes < self.cargadas:
+            # Mover conserva la selección y la posición de la vista; si su sitio nuevo
+            # cae fuera de lo paginado, se pagina hasta él para no perderla
+            if despues >= self.cargadas:
+                self.beginInsertRows(QModelIndex(), self.cargadas, despues)
+                self.cargadas = despues + 1
+                self.endInsertRows()
+            self.beginMoveRows(QModelIndex(), antes, antes, QModelIndex(), despues + 1 if despues > antes else despues)
+            self.filas = np.insert(resto, despues, i)
+            self.reindexar()
+            self.endMoveRows()
+        else:
+            self.quitar(antes)
+            self.poner(despues, i)
+
+    def clave_orden(self, i):
+        a, c = self.arrays, self.columna
+        if c == 0: return (int(a['seg'][i]), int(a['prio'][i]), i)
+        if c == 1: return (int(a['tipo'][i]), i)
+        if c == 2: return (a['nombre'][i], i)
+        if c == 3: return (int(a['dias'][i]), i)
+        if c == 4: return (not a['activo'][i], i)
+        return (i,)
+
+    def posicion(self, i, filas=None):
+        """Fila del proxy que le toca a la fila i del modelo entre 'filas' (por defecto las actuales)."""
+        filas = self.filas if filas is None else filas
+        k = self.clave_orden(i)
+        asc = self.orden != Qt.DescendingOrder or self.columna < 0
+        lo, hi = 0, len(filas)
+        while lo < hi:
+            m = (lo + hi) // 2
+            km = self.clave_orden(int(filas[m]))
+            if (km < k) if asc else (km > k): lo = m + 1
+            else: hi = m
+        return lo
+
+    # --- Filtro y orden ---
+    def set_filtro(self, texto=None, tipo=None, dia=None, desde=None, hasta=None):
+        """tipo: 'file'... o None; dia: 0 = lunes o None; desde/hasta: segundos del día."""
+        self.texto = (texto or "").lower()
+        self.tipo, self.dia = tipo, dia
+        self.desde = 0 if desde is None else desde
+        self.hasta = 86399 if hasta is None else hasta
+        self.beginResetModel()
+        self.calcular(reiniciar=True)
+        self.endResetModel()
+
+    def buscar(self, q):
+        """Filas del modelo cuyo nombre o ruta contiene q."""
+        previa, filas = self.busqueda
+        if filas is None or not previa or previa not in q: filas = range(len(self.claves))
+        c = self.claves
+        filas = np.array([i for i in filas if q in c[i][7]], dtype=np.int64)
+        self.busqueda = (q, filas)
+        return filas
+
+    def mascara(self, idx):
+        """Filtro de tipo, día y franja horaria para las filas 'idx' del modelo (sin el texto)."""
+        a = self.arrays
+        ok = np.ones(len(idx), dtype=bool)
+        if self.tipo is not None: ok &= a['tipo'][idx] == TIPOS_EVENTO.index(self.tipo)
+        if self.dia is not None: ok &= (a['dias'][idx] >> self.dia & 1).astype(bool)
+        if self.desde > 0 or self.hasta < 86399:
+            # ¿Suena alguna vez entre 'desde' y 'hasta'? Probamos cada hora de su máscara
+            seg_hora = a['seg'][idx] % 3600
+            horas = a['horas'][idx]
+            en_rango = np.zeros(len(idx), dtype=bool)
+            for h in range(24):
+                t = h * 3600 + seg_hora
+                en_rango |= (horas >> h & 1).astype(bool) & (t >= self.desde) & (t <= self.hasta)
+            ok &= en_rango
+        return ok
+
+    def pasa(self, i):
+        return bool(self.mascara([i])[0]) and (not self.texto or self.texto in self.claves[i][7])
+
+    def calcular(self, reiniciar=False):
+        a = self.arrays
+        n = len(self.claves)
+        ok = self.mascara(np.arange(n))
+        if self.texto:
+            m = np.zeros(n, dtype=bool)
+            m[self.buscar(self.texto)] = True
+            ok &= m
+        filas = np.flatnonzero(ok)
+        if self.columna >= 0 and len(filas):
+            if self.columna == 0: orden = np.lexsort((a['prio'][filas], a['seg'][filas]))
+            elif self.columna == 1: orden = np.argsort(a['tipo'][filas], kind='stable')
+            elif self.columna == 2: orden = np.argsort(a['nombre'][filas], kind='stable')
+            elif self.columna == 3: orden = np.argsort(a['dias'][filas], kind='stable')
+            else: orden = np.argsort(~a['activo'][filas], kind='stable')
+            if self.orden == Qt.DescendingOrder: orden = orden[::-1]
+            filas = filas[orden]
+        self.filas = filas
+        self.reindexar()
+        if reiniciar: self.cargadas = min(len(filas), self.PAGINA)
+        else: self.cargadas = min(len(filas), max(self.cargadas, self.PAGINA))
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.columna, self.orden = column, order
+        self.layoutAboutToBeChanged.emit()
+        viejos = self.persistentIndexList()
+        fuentes = [self.mapToSource(i) for i in viejos]
+        self.calcular()
+        self.changePersistentIndexList(viejos, [self.mapFromSource(s) for s in fuentes])
+        self.layoutChanged.emit()
+
+    def mostrar(self, fila_fuente):
+        """Pagina hasta la fila del modelo indicada; devuelve su índice en el proxy (o inválido)."""
+        if fila_fuente >= len(self.inversa) or self.inversa[fila_fuente] < 0: return QModelIndex()
+        r = int(self.inversa[fila_fuente])
+        if r >= self.cargadas:
+            self.beginInsertRows(QModelIndex(), self.cargadas, r)
+            self.cargadas = r + 1
+            self.endInsertRows()
+        return self.index(r, 0)
+
+    # --- QAbstractProxyModel ---
+    def rowCount(self, p=QModelIndex()): return 0 if p.isValid() else self.cargadas
+    def columnCount(self, p=QModelIndex()): return self.sourceModel().columnCount() if self.sourceModel() else 0
+    def index(self, r, c, p=QModelIndex()):
+        return self.createIndex(r, c) if not p.isValid() and 0 <= r < self.cargadas else QModelIndex()
+    def parent(self, i=QModelIndex()): return QModelIndex()
+    def headerData(self, s, o, r=Qt.DisplayRole): return self.sourceModel().headerData(s, o, r)
+
+    def mapToSource(self, i):
+        if not i.isValid() or i.row() >= len(self.filas): return QModelIndex()
+        return self.sourceModel().index(int(self.filas[i.row()]), i.column())
+
+    def mapFromSource(self, i):
+        if not i.isValid() or i.row() >= len(self.inversa): return QModelIndex()
+        r = int(self.inversa[i.row()])
+        return self.createIndex(r, i.column()) if 0 <= r < self.cargadas else QModelIndex()
+
+    def canFetchMore(self, p=QModelIndex()):
+        return not p.isValid() and self.cargadas < len(self.filas)
+
+    def fetchMore(self, p=QModelIndex()):
+        n = min(self.PAGINA, len(self.filas) - self.cargadas)
+        if n <= 0: return
+        self.beginInsertRows(QModelIndex(), self.cargadas, self.cargadas + n - 1)
+        self.cargadas += n
+        self.endInsertRows()
 
 class EventDelegate(QStyledItemDelegate):
     def paint(self, painter, option, index):
@@ -333,27 +713,109 @@ class EventDelegate(QStyledItemDelegate):
 
     def editorEvent(self, event, model, option, index):
         if event.type() == QEvent.MouseButtonRelease and index.column() == 4:
+            if isinstance(model, QAbstractProxyModel):
+                index, model = model.mapToSource(index), model.sourceModel()
             model.toggle_active(index.row())
             return True
         return False
 
+# --- PANEL DE MÉTRICAS ---
+class PanelMetricas(QDialog):
+    """Tiempos del motor y de la reproducción, refrescados cada segundo."""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Métricas del motor")
+        self.resize(620, 320)
+        l = QVBoxLayout(self)
+        self.lbl = QLabel()
+        self.lbl.setTextFormat(Qt.RichText)
+        self.lbl.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        l.addWidget(self.lbl)
+        b_close = QPushButton("Cerrar")
+        b_close.clicked.connect(self.accept)
+        l.addWidget(b_close)
+        self.tm = QTimer(self)
+        self.tm.timeout.connect(self.upd)
+        self.tm.start(1000)
+        self.upd()
+
+    def upd(self):
+        filas = [f"{'':34} {'n':>7} {'media':>9} {'p50':>9} {'p99':>9} {'máx':>9}"]
+        for m in list(metricas.REGISTRO.values()):
+            if isinstance(m, metricas.Histograma):
+                ms = [x * 1000 for x in (m.media(), m.percentil(0.5), m.percentil(0.99), m.maximo)]
+                filas.append(f"{m.nombre:34} {m.cuenta:7} " + " ".join(f"{x:7.2f}ms" for x in ms))
+            else:
+                filas.append(f"{m.nombre:34} {m.valor:7}")
+        self.lbl.setText("<pre>" + "\n".join(filas) + "</pre>")
+
 # --- VENTANA GESTOR CON FUNCIONES DE GUARDAR COMO ---
 class EventsManager(QDialog):
+    conflictos_listos = Signal(list)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Gestor de Eventos")
         self.resize(850, 450)
-        self.events = self.load_default()
+        # También sin hilo del motor (gestor abierto solo) se exportan las métricas
+        metricas.volcar_cada(METRICAS_FILE, METRICAS_INTERVALO)
+        self.almacen = None
+        self.diario = None
+        self.ids = []
+        if es_almacen(EVENTS_FILE):
+            self.almacen = AlmacenEventos(EVENTS_FILE)
+        else:
+            # Cada cambio es una línea en el diario; el JSON completo se reescribe
+            # en segundo plano al compactar
+            self.diario = DiarioCambios(EVENTS_FILE)
+        self.events, errores = normalizar(self.load_default())
         self.setup()
+        if errores: self.avisar_errores(errores)
 
     def setup(self):
         l = QVBoxLayout(self)
+
+        # FILTROS: texto (nombre o ruta), tipo, día y franja horaria
+        fl = QHBoxLayout()
+        self.f_texto = QLineEdit()
+        self.f_texto.setPlaceholderText("Buscar nombre o ruta...")
+        self.f_tipo = QComboBox()
+        self.f_tipo.addItem("Todos los tipos", None)
+        for t in TIPOS_EVENTO: self.f_tipo.addItem(t.upper(), t)
+        self.f_dia = QComboBox()
+        self.f_dia.addItem("Todos los días", None)
+        for i, d in enumerate(["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]):
+            self.f_dia.addItem(d, i)
+        self.f_desde = QTimeEdit(QTime(0, 0, 0))
+        self.f_hasta = QTimeEdit(QTime(23, 59, 59))
+        for w in (self.f_desde, self.f_hasta): w.setDisplayFormat("HH:mm:ss")
+        fl.addWidget(self.f_texto)
+        fl.addWidget(self.f_tipo)
+        fl.addWidget(self.f_dia)
+        fl.addWidget(QLabel("De"))
+        fl.addWidget(self.f_desde)
+        fl.addWidget(QLabel("a"))
+        fl.addWidget(self.f_hasta)
+        l.addLayout(fl)
+        self.f_texto.textChanged.connect(self.filtrar)
+        self.f_tipo.currentIndexChanged.connect(self.filtrar)
+        self.f_dia.currentIndexChanged.connect(self.filtrar)
+        self.f_desde.timeChanged.connect(self.filtrar)
+        self.f_hasta.timeChanged.connect(self.filtrar)
+
         self.table = QTableView()
-        self.model = EventsTableModel(self.events)
-        self.table.setModel(self.model)
+        self.model = EventsTableModel(self.events, self.registrar)
+        self.proxy = FiltroEventos(self)
+        self.proxy.setSourceModel(self.model)
+        self.table.setModel(self.proxy)
         self.table.setItemDelegate(EventDelegate(self.table))
+        # Sin columna de orden al abrir: se ve el orden de la parrilla
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
         self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
         self.table.setSelectionBehavior(QTableView.SelectRows)
+        # Altura de fila fija: la vista no mide cada fila al paginar
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
         l.addWidget(self.table)
         
         # FILA 1: EDICIÓN
@@ -382,53 +844,133 @@ class EventsManager(QDialog):
         
         # Etiqueta separadora
         lbl_info = QLabel(" | ")
+
+        # Aviso de solapes de la próxima semana (se recalcula tras cada cambio)
+        self.b_conflictos = QPushButton()
+        self.b_conflictos.clicked.connect(self.show_conflicts)
         
+        b_metricas = QPushButton("📊 Métricas")
+        b_metricas.clicked.connect(lambda: PanelMetricas(self).exec())
+
         b_close = QPushButton("Cerrar")
         b_close.clicked.connect(self.accept)
         
         bl2.addWidget(b_open)
         bl2.addWidget(b_save_as)
         bl2.addWidget(lbl_info)
+        bl2.addWidget(self.b_conflictos)
+        bl2.addWidget(b_metricas)
         bl2.addStretch()
         bl2.addWidget(b_close)
         l.addLayout(bl2)
+        self.duraciones = conflictos.CacheDuraciones()
+        # El análisis de la semana va en un hilo aparte y agrupando cambios seguidos:
+        # con parrillas grandes tarda segundos y la tabla no debe esperar por él
+        self.conflictos = []
+        self.analizando = False
+        self.repetir = False
+        self.t_conflictos = QTimer(self)
+        self.t_conflictos.setSingleShot(True)
+        self.t_conflictos.timeout.connect(self.lanzar_analisis)
+        self.conflictos_listos.connect(self.mostrar_conflictos)
+        self.check_conflicts()
+
+    def filtrar(self):
+        self.proxy.set_filtro(self.f_texto.text(), self.f_tipo.currentData(), self.f_dia.currentData(),
+                              QTime(0, 0).secsTo(self.f_desde.time()), QTime(0, 0).secsTo(self.f_hasta.time()))
+
+    def check_conflicts(self):
+        self.t_conflictos.start(300)
+
+    def lanzar_analisis(self):
+        if self.analizando:
+            self.repetir = True
+            return
+        self.analizando = True
+        self.b_conflictos.setText("Analizando...")
+        self.b_conflictos.setEnabled(False)
+        threading.Thread(target=self.analizar, args=(list(self.events),), daemon=True).start()
+
+    def analizar(self, eventos):
+        hoy = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        try: res = conflictos.analizar(compilar_eventos(eventos), hoy, hoy + timedelta(days=7), self.duraciones)
+        except Exception as e:
+            print(f"Error analizando conflictos: {e}")
+            res = []
+        try: self.conflictos_listos.emit(res)
+        except RuntimeError: pass  # el gestor ya se cerró
+
+    def mostrar_conflictos(self, res):
+        self.analizando = False
+        self.conflictos = res
+        if self.repetir:
+            self.repetir = False
+            self.lanzar_analisis()
+            return
+        self.b_conflictos.setText(f"⚠ {len(self.conflictos)} Conflictos" if self.conflictos else "Sin conflictos")
+        self.b_conflictos.setEnabled(bool(self.conflictos))
+
+    def show_conflicts(self):
+        lineas = conflictos.resumen(self.conflictos)
+        txt = "\n".join(lineas[:40])
+        if len(lineas) > 40: txt += f"\n... y {len(lineas) - 40} más"
+        QMessageBox.warning(self, "Conflictos (próximos 7 días)", txt)
+
+    def avisar_errores(self, errores):
+        txt = "\n".join(errores[:40])
+        if len(errores) > 40: txt += f"\n... y {len(errores) - 40} más"
+        QMessageBox.warning(self, "Eventos no válidos (se ignorarán)", txt)
 
     def load_default(self):
-        if os.path.exists(EVENTS_FILE):
-            try:
-                with open(EVENTS_FILE, 'r') as f: return json.load(f)
-            except: return []
-        return []
+        if self.almacen:
+            filas = self.almacen.eventos_con_id()
+            self.ids = [i for i, e in filas]
+            return [e for i, e in filas]
+        try: return self.diario.cargar()
+        except Exception as e:
+            print(f"Error cargando eventos: {e}")
+            return []
 
     # --- NUEVAS FUNCIONES DE ARCHIVO ---
     def load_from_file(self):
-        file_path, _ = QFileDialog.getOpenFileName(self, "Abrir Programación de Eventos", "", "Archivos JSON (*.json)")
+        file_path, _ = QFileDialog.getOpenFileName(self, "Abrir Programación de Eventos", "",
+                                                   "Archivos JSON (*.json);;Salamandra (*.slsche)")
         if file_path:
             try:
-                with open(file_path, 'r') as f:
-                    new_events = json.load(f)
-                self.events = new_events
+                if file_path.lower().endswith('.slsche'):
+                    self.events, errores = salamandra.importar(file_path)
+                elif self.almacen:
+                    # El almacén guarda también el resto del documento (playlist, audio_config...);
+                    # los eventos se escriben una sola vez, ya normalizados, en save_system_db()
+                    eventos, envoltorio = leer_documento(file_path)
+                    self.events, errores = normalizar(eventos)
+                    self.almacen.guardar_envoltorio(envoltorio)
+                else:
+                    with open(file_path, 'r') as f:
+                        new_events = json.load(f)
+                    self.events, errores = normalizar(new_events)
+                if errores: self.avisar_errores(errores)
                 
                 # IMPORTANTISIMO: Guardamos inmediatamente en el archivo del sistema (EVENTS_FILE)
                 # para que el reloj lo detecte y lo use.
-                with open(EVENTS_FILE, 'w') as f:
-                    json.dump(self.events, f)
+                self.save_system_db()
                 
-                # Refrescamos la tabla visual
-                self.model = EventsTableModel(self.events)
-                self.table.setModel(self.model)
-                self.table.setItemDelegate(EventDelegate(self.table))
+                # Refrescamos la tabla visual (mismo modelo y delegado, solo se reinician los datos)
+                self.model.reset_events(self.events)
                 
                 QMessageBox.information(self, "Cargado", f"Programación cargada desde:\n{os.path.basename(file_path)}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"No se pudo cargar el archivo: {e}")
 
     def save_as_file(self):
-        file_path, _ = QFileDialog.getSaveFileName(self, "Guardar Programación Como...", "", "Archivos JSON (*.json)")
+        file_path, _ = QFileDialog.getSaveFileName(self, "Guardar Programación Como...", "",
+                                                   "Archivos JSON (*.json);;Salamandra (*.slsche)")
         if file_path:
             try:
-                with open(file_path, 'w') as f:
-                    json.dump(self.events, f)
+                # Salamandra no tiene eventos de hora/temperatura/satélite: esos no se exportan
+                if file_path.lower().endswith('.slsche'): salamandra.exportar(self.events, file_path)
+                elif self.almacen: self.almacen.exportar_json(file_path)
+                else: guardar_atomico(file_path, self.events)
                 QMessageBox.information(self, "Guardado", f"Copia de seguridad guardada en:\n{os.path.basename(file_path)}")
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"No se pudo guardar el archivo: {e}")
@@ -436,84 +978,572 @@ class EventsManager(QDialog):
     # Guardado automático al archivo principal cuando se edita algo
     def save_system_db(self):
         try:
-            with open(EVENTS_FILE, 'w') as f: json.dump(self.events, f)
+            if self.almacen: self.ids = self.almacen.reemplazar_todo(self.events)
+            else: self.diario.reescribir(self.events)
         except Exception as e:
             print(f"Error auto-guardado: {e}")
+        self.check_conflicts()
+
+    def registrar(self, op, row=None, evento=None):
+        """Persiste un cambio: fila a fila en SQLite o como entrada del diario."""
+        try:
+            if self.almacen:
+                if op == 'add': self.ids.append(self.almacen.insertar(self.events[-1]))
+                elif op in ('edit', 'toggle'): self.almacen.actualizar(self.ids[row], self.events[row])
+                elif op == 'delete': self.almacen.borrar(self.ids.pop(row))
+            elif op == 'add': self.diario.registrar(op, len(self.events) - 1, self.events[-1])
+            elif op == 'delete': self.diario.registrar(op, row, evento)
+            else: self.diario.registrar(op, row, self.events[row])
+        except Exception as e:
+            print(f"Error auto-guardado: {e}")
+        self.check_conflicts()
+
+    def done(self, r):
+        # Al cerrar el gestor compactamos lo pendiente y paramos sus hilos (cada apertura crea los suyos)
+        if self.diario: self.diario.cerrar()
+        super().done(r)
+
+    def datos_editor(self, dlg):
+        """Lo que sale del editor pasa por el mismo esquema que lo cargado; si no valida, se avisa y no se guarda."""
+        (e,), errores = normalizar([dlg.get_data()])
+        if errores:
+            self.avisar_errores(errores)
+            return None
+        return e
 
     def add(self):
         dlg = EventEditorDialog(self)
-        if dlg.exec():
-            self.events.append(dlg.get_data())
-            self.model.layoutChanged.emit()
-            self.save_system_db()
+        e = self.datos_editor(dlg) if dlg.exec() else None
+        if e is not None:
+            self.table.scrollTo(self.proxy.mostrar(self.model.append_event(e)))
+            self.registrar('add')
 
     def duplicate(self):
-        idx = self.table.selectionModel().currentIndex()
+        idx = self.proxy.mapToSource(self.table.selectionModel().currentIndex())
         if idx.isValid():
             new_event = copy.deepcopy(self.events[idx.row()])
             new_event['name'] = f"{new_event.get('name','')} (Copia)"
             dlg = EventEditorDialog(self, new_event)
-            if dlg.exec():
-                self.events.append(dlg.get_data())
-                self.model.layoutChanged.emit()
-                self.save_system_db()
+            e = self.datos_editor(dlg) if dlg.exec() else None
+            if e is not None:
+                self.table.scrollTo(self.proxy.mostrar(self.model.append_event(e)))
+                self.registrar('add')
         else:
             QMessageBox.information(self, "Info", "Selecciona un evento para duplicar.")
 
     def edit(self):
-        idx = self.table.selectionModel().currentIndex()
+        idx = self.proxy.mapToSource(self.table.selectionModel().currentIndex())
         if idx.isValid():
             dlg = EventEditorDialog(self, self.events[idx.row()])
-            if dlg.exec():
-                self.events[idx.row()] = dlg.get_data()
-                self.model.layoutChanged.emit()
-                self.save_system_db()
+            e = self.datos_editor(dlg) if dlg.exec() else None
+            if e is not None:
+                self.model.replace_event(idx.row(), e)
+                self.registrar('edit', idx.row())
 
     def delete(self):
-        idx = self.table.selectionModel().currentIndex()
+        idx = self.proxy.mapToSource(self.table.selectionModel().currentIndex())
         if idx.isValid():
             if QMessageBox.question(self, "Borrar", "¿Seguro de borrar este evento?") == QMessageBox.Yes:
-                self.events.pop(idx.row())
-                self.model.layoutChanged.emit()
-                self.save_system_db()
+                row = idx.row()
+                borrado = self.events[row]
+                self.model.remove_event(row)
+                # El evento va en la entrada solo para la auditoría: aplicar el borrado no lo necesita
+                self.registrar('delete', row, borrado)
 
 # --- MOTOR (CEREBRO DEL RELOJ) ---
+def con_dispositivo(e):
+    """Los satélites salen con el índice actual de su dispositivo: el guardado en 'value' puede haber cambiado."""
+    ref = e['extra'].get('device') if e.get('type') == 'sat' and isinstance(e.get('extra'), dict) else None
+    if not ref: return e
+    i = REGISTRO.resolver(ref)
+    return e if i is None or i == e.get('value') else dict(e, value=i)
+
 class MotorEventos:
-    def __init__(self):
+    def __init__(self, max_retraso=MAX_RETRASO, politica=POLITICA_PRINCIPAL, vigilar=True, path=None):
+        self.path = path or EVENTS_FILE
         self.events_cache = []
-        self.last_check_second = -1
+        self.decodificador = None
+        self.reglas = []
+        self.max_retraso = max_retraso
+        self.politica = politica
+        self.ultimo_instante = None
+        self.pendientes = []
+        self.indice = {'once': {}, 'hourly': {}, 'other': {}}
+        self.cola = []
+        self.firma_archivo = None
+        self.diario_offset = 0
+        self.errores = []
+        # El vigilante recarga desde su hilo; el tick y la recarga no se pisan
+        self.lock = threading.RLock()
+        self.despertar = threading.Event()
         self.load()
+        self.vigilante = None
+        if vigilar:
+            self.vigilante = VigilanteEventos(self)
+            self.vigilante.start()
+
+    def detener(self):
+        if self.vigilante: self.vigilante.parar.set()
+
+    # Si arrancamos desde la caché binaria, la lista de dicts solo se construye cuando alguien la pide
+    @property
+    def events_cache(self):
+        if self._eventos is None:
+            dec = self.decodificador
+            self._eventos = [dec.evento(i) for i in range(dec.n)]
+        return self._eventos
+
+    @events_cache.setter
+    def events_cache(self, eventos):
+        self._eventos = eventos
+
+    def estado_archivo(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def leer_archivo(self):
+        """Eventos ya normalizados; los errores de esquema se avisan una vez, al cargar."""
+        if os.path.exists(self.path):
+            try: eventos = cargar_eventos(self.path)
+            except: return None
+            eventos, errores = normalizar(eventos)
+            self.avisar_errores(errores)
+            return eventos
+        return []
+
+    def avisar_errores(self, errores):
+        """Los errores de esquema se avisan una vez por cambio, vengan del JSON o de la caché."""
+        if errores != self.errores:
+            for err in errores: print(f"Esquema: {err}")
+        self.errores = errores
+
+    def compilar_todos(self, eventos, pos0=0):
+        reglas = []
+        for i, e in enumerate(eventos):
+            try: reglas.append(compilar(e, pos0 + i))
+            except Exception as ex: print(f"Evento {pos0 + i} ignorado ({e.get('name', '')}): {ex}")
+        return reglas
+
+    def leer_diario(self):
+        """Entradas nuevas del diario de ediciones que se aplican al JSON cargado."""
+        if es_almacen(self.path) or self.firma_archivo is None: return []
+        base, entradas, offset = leer_diario(ruta_diario(self.path), self.diario_offset)
+        # Diario de otra versión del JSON (compactación a medias): esperamos a la siguiente pasada
+        if base != list(self.firma_archivo): return []
+        self.diario_offset = offset
+        for ent in entradas:
+            if 'evento' in ent: ent['evento'] = normalizar([ent['evento']])[0][0]
+        return entradas
 
     def load(self):
-        if os.path.exists(EVENTS_FILE):
-            try:
-                with open(EVENTS_FILE, 'r') as f: self.events_cache = json.load(f)
-            except: self.events_cache = []
-        else:
-            self.events_cache = []
+        t0 = time.perf_counter()
+        firma = self.estado_archivo()
+        dec = None
+        if firma and not es_almacen(self.path):
+            cache = cache_binaria.cargar(cache_binaria.ruta_cache(self.path), self.path)
+            if cache:
+                dec, reglas, errores = cache
+                self.avisar_errores(errores)
+        if dec is None:
+            eventos = self.leer_archivo() or []
+            reglas = self.compilar_todos(eventos)
+            if firma and eventos and not es_almacen(self.path):
+                try: cache_binaria.guardar(cache_binaria.ruta_cache(self.path), self.path, eventos, reglas, self.errores)
+                except Exception as e: print(f"No se pudo escribir la caché binaria: {e}")
+        with self.lock:
+            self.decodificador = dec
+            self.events_cache = None if dec else eventos
+            self.reglas = reglas
+            self.firma_archivo = firma
+            self.diario_offset = 0
+            self.indexar()
+            self.planificar()
+        entradas = self.leer_diario()
+        if entradas:
+            eventos = list(self.events_cache)
+            for ent in entradas: aplicar_entrada(eventos, ent)
+            self.aplicar_cambios(eventos)
+        metricas.CARGA.observar(time.perf_counter() - t0)
 
-    def comprobar(self):
+    def recargar_si_cambia(self):
+        """Llamado desde el hilo vigilante: aplica solo las diferencias del archivo y del diario."""
+        t0 = time.perf_counter()
+        firma = self.estado_archivo()
+        cambios = False
+        if firma != self.firma_archivo:
+            eventos = self.leer_archivo()
+            # JSON a medio escribir: lo dejamos para la próxima pasada
+            if eventos is None: return False
+            self.aplicar_cambios(eventos)
+            self.firma_archivo = firma
+            self.diario_offset = 0
+            cambios = True
+        entradas = self.leer_diario()
+        if entradas:
+            # Los eventos no tocados conservan su objeto: el diff los reconoce por identidad
+            eventos = list(self.events_cache)
+            for ent in entradas: aplicar_entrada(eventos, ent)
+            self.aplicar_cambios(eventos)
+            cambios = True
+        if cambios: metricas.RECARGA.observar(time.perf_counter() - t0)
+        return cambios
+
+    def aplicar_cambios(self, nuevos):
+        """Sustituye la lista de eventos tocando solo las entradas del índice que cambian.
+        
+        Las reglas sin cambios se conservan tal cual y todas toman como 'pos' su
+        sitio en la lista, igual que en una carga completa: los empates se
+        resuelven igual se llegue por donde se llegue. Si cambia más de la mitad,
+        índice y cola se rehacen enteros.
+        """
+        por_objeto = {id(r.evento): r for r in self.reglas}
+        viejas = None
+        lista, reglas, añadidas = [], [], []
+        for pos, e in enumerate(nuevos):
+            r = por_objeto.pop(id(e), None)
+            if r is None:
+                if viejas is None:
+                    # Solo cuando llegan objetos nuevos (p. ej. JSON releído): clave barata y luego ==
+                    viejas = {}
+                    for x in por_objeto.values():
+                        viejas.setdefault(clave_evento(x.evento), []).append(x)
+                previas = viejas.get(clave_evento(e), ())
+                r = next((x for x in previas if id(x.evento) in por_objeto and x.evento == e), None)
+                if r is not None: del por_objeto[id(r.evento)]
+            if r is not None:
+                # Misma regla: nos quedamos con su objeto para que la próxima vez baste la identidad
+                r.pos = pos
+                lista.append(r.evento)
+                reglas.append(r)
+                continue
+            lista.append(e)
+            try: r = compilar(e, pos)
+            except Exception as ex:
+                print(f"Evento ignorado ({e.get('name', '')}): {ex}")
+                continue
+            reglas.append(r)
+            añadidas.append(r)
+        quitadas = list(por_objeto.values())
+
+        if len(añadidas) + len(quitadas) > len(reglas) // 2:
+            # Retocar índice y cola pieza a pieza ya costaría más que rehacerlos
+            with self.lock:
+                self.events_cache = lista
+                self.reglas = reglas
+                self.indexar()
+            self.planificar()
+            return
         now = datetime.now()
-        if now.second == self.last_check_second: return None
-        self.last_check_second = now.second
+        with self.lock:
+            for r in quitadas:
+                if not r.activo: continue
+                for tabla, clave in entradas_indice(r):
+                    cubo = [x for x in self.indice[tabla].get(clave, []) if x is not r]
+                    if cubo: self.indice[tabla][clave] = cubo
+                    else: self.indice[tabla].pop(clave, None)
+            for r in añadidas:
+                if not r.activo: continue
+                for tabla, clave in entradas_indice(r):
+                    self.indice[tabla].setdefault(clave, []).append(r)
+            # Las posiciones pueden haber cambiado: la cola se rehace con las nuevas
+            fuera = {id(r) for r in quitadas}
+            cola = [(t, r.pos, r) for t, _, r in self.cola if id(r) not in fuera]
+            for r in añadidas:
+                if not r.activo: continue
+                t = proximo_disparo(r, now)
+                if t: cola.append((t, r.pos, r))
+            heapq.heapify(cola)
+            self.cola = cola
+            self.events_cache = lista
+            self.reglas = reglas
+        if añadidas or quitadas: self.despertar.set()
+
+    def indexar(self):
+        # Índice de disparos compilado al cargar: cada tick es una búsqueda directa
+        # sin importar cuántos eventos haya.
+        indice = {'once': {}, 'hourly': {}, 'other': {}}
+        for r in self.reglas:
+            if not r.activo: continue
+            for tabla, clave in entradas_indice(r):
+                indice[tabla].setdefault(clave, []).append(r)
+        self.indice = indice
+
+    # --- MODO COLA: próximo disparo de cada evento en un montículo ---
+    def planificar(self, desde=None):
+        desde = desde or datetime.now()
+        cola = []
+        for r in self.reglas:
+            if not r.activo: continue
+            t = proximo_disparo(r, desde)
+            if t: cola.append((t, r.pos, r))
+        heapq.heapify(cola)
+        with self.lock: self.cola = cola
+        # Si alguien está durmiendo en esperar(), que recalcule con la cola nueva
+        self.despertar.set()
+
+    def _avanzar(self, hasta, out=None):
+        """Reprograma las cabezas de la cola anteriores o iguales a 'hasta' (con el lock tomado)."""
+        while self.cola and self.cola[0][0] <= hasta:
+            t, pos, r = heapq.heappop(self.cola)
+            if out is not None: out.append((t, r))
+            sig = proximo_disparo(r, t)
+            if sig: heapq.heappush(self.cola, (sig, pos, r))
+
+    def next_events(self, n=5, now=None):
+        """Los n próximos disparos como [(datetime, evento), ...] para mostrar en la interfaz."""
+        now = now or datetime.now()
+        with self.lock:
+            # Lo que ya no puede salir por vencidos() se reprograma aquí, por si nadie vacía la cola
+            self._avanzar(now - timedelta(seconds=max(self.max_retraso, 1)))
+            return [(t, r.evento) for t, pos, r in heapq.nsmallest(n, (c for c in self.cola if c[0] >= now))]
+
+    def segundos_hasta_proximo(self, now=None):
+        now = now or datetime.now()
+        with self.lock:
+            if not self.cola: return None
+            return max(0.0, (self.cola[0][0] - now).total_seconds())
+
+    def vencidos(self, now=None):
+        """Saca de la cola los eventos cuyo instante ya ha llegado y los vuelve a programar."""
+        now = now or datetime.now()
+        limite = now - timedelta(seconds=max(self.max_retraso, 1))
+        out = []
+        with self.lock: self._avanzar(now, out)
+        return [(t, con_dispositivo(r.evento)) for t, r in out if t >= limite]
+
+    def sin_disparos_hasta(self, t):
+        """La cola dice que antes de 't' no suena nada: recoger() no cuenta esos segundos como saltados."""
+        with self.lock:
+            if self.ultimo_instante is not None and self.ultimo_instante < t - timedelta(seconds=1):
+                self.ultimo_instante = t - timedelta(seconds=1)
+
+    def esperar(self, maximo=None):
+        """Duerme hasta el próximo disparo (o 'maximo' segundos) y devuelve los vencidos."""
+        espera = self.segundos_hasta_proximo()
+        if maximo is not None: espera = maximo if espera is None else min(espera, maximo)
+        self.despertar.clear()
+        self.despertar.wait(espera)
+        return self.vencidos()
+
+    def reloj_cambiado(self):
+        """El reloj de pared ha saltado: olvidamos el último instante y replanificamos la cola.
         
-        if now.second == 0 and now.minute == 0:
-            self.load()
+        Hacia delante se recupera como mucho 'max_retraso'; hacia atrás (o al
+        retrasar la hora en otoño) se vuelve a disparar según la hora de pared.
+        """
+        with self.lock: self.ultimo_instante = None
+        self.planificar()
 
-        curr_t = now.strftime("%H:%M:%S")
+    def disparos_en(self, now):
+        """Reglas que saltan exactamente en el segundo 'now', en el orden de la lista."""
         wday = now.weekday()
+        seg_hora = now.minute * 60 + now.second
+        ts = now.timestamp()
+        with self.lock:
+            cands = self.indice['once'].get((wday, now.hour * 3600 + seg_hora), []) + self.indice['hourly'].get((wday, seg_hora), [])
+            cands += [r for r in self.indice['other'].get((wday, seg_hora), ()) if r.horas >> now.hour & 1]
+        return sorted((r for r in cands if r.vigente(ts)), key=lambda r: r.pos)
+
+    def recoger(self, now=None, politica=None):
+        """Añade a 'pendientes' las reglas vencidas desde el último instante evaluado, ya filtradas por la política."""
+        now = now or datetime.now().replace(microsecond=0)
+        ult = self.ultimo_instante
+        if ult == now: return
+
+        # Recuperación de ticks perdidos: evaluamos todos los segundos desde el
+        # último instante evaluado, con un límite de retraso. Si el reloj va hacia
+        # atrás (NTP/cambio de hora) solo evaluamos el segundo actual.
+        if ult is None or now < ult: desde = now
+        else:
+            desde = max(ult + timedelta(seconds=1), now - timedelta(seconds=self.max_retraso))
+            saltados = int((now - ult).total_seconds()) - 1
+            if saltados > 0:
+                recuperados = int((now - desde).total_seconds())
+                metricas.TICKS_RECUPERADOS.sumar(recuperados)
+                metricas.TICKS_PERDIDOS.sumar(saltados - recuperados)
+        self.ultimo_instante = now
+
+        nuevas = []
+        t = desde
+        while t <= now:
+            reglas = self.disparos_en(t)
+            if reglas:
+                retraso = time.time() - t.timestamp()
+                for r in reglas: metricas.RETRASO_DISPARO.observar(retraso)
+                nuevas += reglas
+            t += timedelta(seconds=1)
+        if nuevas:
+            nuevas = resolver_conflictos(nuevas, politica or self.politica)
+            self.pendientes = sorted(self.pendientes + nuevas, key=lambda r: r.rango)
+
+    def comprobar(self, now=None):
+        self.recoger(now)
+        return con_dispositivo(self.pendientes.pop(0).evento) if self.pendientes else None
+
+    def comprobar_todos(self, politica=None, now=None):
+        """Todos los eventos que tocan ahora, ordenados y filtrados según la política."""
+        self.recoger(now, politica)
+        reglas, self.pendientes = self.pendientes, []
+        return [con_dispositivo(r.evento) for r in resolver_conflictos(reglas, politica or self.politica)]
+
+class MotorMultiEstacion:
+    """Varias programaciones (estaciones) con un solo hilo de reloj y un solo vigilante.
+
+    Cada estación es un MotorEventos sin vigilante propio y todas comparten el
+    evento 'despertar': quien espera duerme una vez hasta el primer disparo de
+    cualquiera de ellas, y cada tick evalúa todas con el mismo instante. Los
+    eventos salen como copias con la clave 'estacion'. Sirve tal cual a HiloMotor.
+    """
+    def __init__(self, estaciones, max_retraso=MAX_RETRASO, politica=POLITICA_PRINCIPAL, vigilar=True):
+        self.max_retraso = max_retraso
+        self.politica = politica
+        self.despertar = threading.Event()
+        self.estaciones = {}
+        for nombre, path in estaciones.items(): self.añadir(nombre, path)
+        self.vigilante = None
+        if vigilar:
+            self.vigilante = VigilanteEventos(self)
+            self.vigilante.start()
+
+    def añadir(self, nombre, path):
+        motor = MotorEventos(self.max_retraso, self.politica, vigilar=False, path=path)
+        motor.despertar = self.despertar
+        self.estaciones[nombre] = motor
+        self.despertar.set()
+        return motor
+
+    def quitar(self, nombre):
+        self.estaciones.pop(nombre, None)
+        self.despertar.set()
+
+    def detener(self):
+        if self.vigilante: self.vigilante.parar.set()
+
+    @staticmethod
+    def etiquetar(nombre, e):
+        return dict(e, estacion=nombre)
+
+    def recargar_si_cambia(self):
+        # Todas, aunque la primera ya haya cambiado
+        return any([m.recargar_si_cambia() for m in list(self.estaciones.values())])
 
-        for e in self.events_cache:
-            if not e.get('active', True): continue
-            if not e['days'][wday]: continue
-
-            trig = False
-            if e['periodicity'] == 'once' and e['time'] == curr_t:
-                trig = True
-            elif e['periodicity'] == 'hourly' and e['time'][3:] == curr_t[3:]:
-                trig = True
-            elif e['periodicity'] == 'other' and now.hour in e.get('other_hours', []) and e['time'][3:] == curr_t[3:]:
-                trig = True
-            
-            if trig: return e
-        return None
\ No newline at end of file
+    def next_events(self, n=5, now=None):
+        out = []
+        for nombre, m in list(self.estaciones.items()):
+            out += [(t, nombre, e) for t, e in m.next_events(n, now)]
+        out.sort(key=lambda x: x[0])
+        return [(t, self.etiquetar(nombre, e)) for t, nombre, e in out[:n]]
+
+    def segundos_hasta_proximo(self, now=None):
+        now = now or datetime.now()
+        esperas = [s for s in (m.segundos_hasta_proximo(now) for m in list(self.estaciones.values())) if s is not None]
+        return min(esperas) if esperas else None
+
+    def sin_disparos_hasta(self, t):
+        for m in list(self.estaciones.values()): m.sin_disparos_hasta(t)
+
+    def vencidos(self, now=None):
+        now = now or datetime.now()
+        out = []
+        for nombre, m in list(self.estaciones.items()):
+            out += [(t, nombre, e) for t, e in m.vencidos(now)]
+        out.sort(key=lambda x: x[0])
+        return [(t, self.etiquetar(nombre, e)) for t, nombre, e in out]
+
+    def esperar(self, maximo=None):
+        espera = self.segundos_hasta_proximo()
+        if maximo is not None: espera = maximo if espera is None else min(espera, maximo)
+        self.despertar.clear()
+        self.despertar.wait(espera)
+        return self.vencidos()
+
+    def reloj_cambiado(self):
+        for m in list(self.estaciones.values()): m.reloj_cambiado()
+
+    def comprobar_todos(self, politica=None, now=None):
+        """Eventos que tocan ahora en todas las estaciones; la política se aplica por estación."""
+        now = now or datetime.now().replace(microsecond=0)
+        out = []
+        for nombre, m in list(self.estaciones.items()):
+            out += [self.etiquetar(nombre, e) for e in m.comprobar_todos(politica, now)]
+        return out
+
+class VigilanteEventos(threading.Thread):
+    """Hilo que vigila el archivo del motor (mtime/tamaño) y recarga fuera del tick."""
+    def __init__(self, motor, intervalo=2.0):
+        super().__init__(daemon=True)
+        self.motor = motor
+        self.intervalo = intervalo
+        self.parar = threading.Event()
+
+    def run(self):
+        while not self.parar.wait(self.intervalo):
+            try: self.motor.recargar_si_cambia()
+            except Exception as e: print(f"Error recargando eventos: {e}")
+
+class HiloMotor(QThread):
+    """Hilo propio del motor: evalúa los segundos sin depender del hilo de la interfaz.
+    
+    Duerme con el reloj monotónico hasta el cambio de segundo del primer disparo
+    de la cola (como mucho SUEÑO_MAXIMO, calculado en cada vuelta, así no acumula
+    deriva) y entrega los eventos por señal Qt. Una recarga lo despierta antes.
+    """
+    disparados = Signal(list)
+    salto_reloj = Signal(float)
+
+    def __init__(self, motor=None, parent=None):
+        super().__init__(parent)
+        self.motor = motor or MotorEventos()
+        self.parar = threading.Event()
+        metricas.volcar_cada(METRICAS_FILE, METRICAS_INTERVALO)
+
+    @staticmethod
+    def desfase():
+        # Hora local de pared menos monotónico: cambia si hay NTP, ajuste manual o horario de verano
+        ahora = time.time()
+        return ahora + time.localtime(ahora).tm_gmtoff - time.monotonic()
+
+    def detener(self):
+        self.parar.set()
+        self.motor.despertar.set()
+        self.wait()
+
+    def run(self):
+        desfase = self.desfase()
+        while not self.parar.is_set():
+            # Despertamos unos ms después del cambio de segundo (Event.wait usa el monotónico).
+            # Si en el próximo segundo no suena nada, saltamos hasta el del primer disparo.
+            self.motor.despertar.clear()
+            espera = 1.005 - time.time() % 1.0
+            hasta = self.motor.segundos_hasta_proximo()
+            # Hasta 'libre' no suena nada (None si la cola tiene una cabeza ya pasada)
+            libre = None if hasta == 0 else datetime.now() + timedelta(seconds=SUEÑO_MAXIMO if hasta is None else hasta)
+            espera += max(0, int(min(SUEÑO_MAXIMO if hasta is None else hasta, SUEÑO_MAXIMO) - espera + 0.01))
+            self.motor.despertar.wait(espera)
+            if self.parar.is_set(): break
+            metricas.DESPERTAR.observar(time.time() % 1.0)
+            nuevo = self.desfase()
+            salto = nuevo - desfase
+            desfase = nuevo
+            if abs(salto) > SALTO_RELOJ:
+                print(f"Salto de reloj detectado: {salto:+.1f}s")
+                self.motor.reloj_cambiado()
+                self.salto_reloj.emit(salto)
+            elif libre:
+                # Los segundos dormidos antes del primer disparo no son ticks perdidos
+                self.motor.sin_disparos_hasta(min(datetime.now(), libre).replace(microsecond=0))
+            t0 = time.perf_counter()
+            try:
+                eventos = self.motor.comprobar_todos()
+                # Los disparos salen del índice; la cola solo se mantiene al día para dormir y para next_events
+                self.motor.vencidos()
+            except Exception as e:
+                print(f"Error en el motor de eventos: {e}")
+                continue
+            metricas.TICK.observar(time.perf_counter() - t0)
+            if eventos:
+                metricas.DISPAROS.sumar(len(eventos))
+                self.disparados.emit(eventos)
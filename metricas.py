@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Métricas del motor y de la reproducción.
+
+Histogramas de cubos fijos y contadores, pensados para llamarse desde el tick
+o desde el callback de audio: observar() es una búsqueda binaria y dos sumas,
+sin locks ni reservas de memoria (con el GIL, como mucho se pierde alguna
+muestra si dos hilos observan a la vez). volcar() escribe todo en formato de
+texto de Prometheus para poder demostrar que la señal horaria salió a su hora.
+El archivo lo escribe un solo Volcador por proceso (volcar_cada()), lo pida el
+hilo del motor, el gestor de eventos o ambos.
+"""
+import atexit
+import threading
+import time
+from bisect import bisect_left
+from persistencia import escribir_atomico
+
+# Límites en segundos: de 100 µs a 10 s
+LIMITES = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histograma:
+    def __init__(self, nombre, ayuda, limites=LIMITES):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = limites
+        self.cubos = [0] * (len(limites) + 1)   # el último es +Inf
+        self.cuenta = 0
+        self.suma = 0.0
+        self.maximo = 0.0
+
+    def observar(self, v):
+        self.cubos[bisect_left(self.limites, v)] += 1
+        self.cuenta += 1
+        self.suma += v
+        if v > self.maximo: self.maximo = v
+
+    def percentil(self, q):
+        """Estimación por cubos: el límite superior del cubo donde cae el percentil q (0..1)."""
+        if not self.cuenta: return 0.0
+        objetivo, acum = q * self.cuenta, 0
+        for i, c in enumerate(self.cubos):
+            acum += c
+            if acum >= objetivo: return self.limites[i] if i < len(self.limites) else self.maximo
+        return self.maximo
+
+    def media(self):
+        return self.suma / self.cuenta if self.cuenta else 0.0
+
+    def texto(self):
+        out = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} histogram"]
+        acum = 0
+        for lim, c in zip(self.limites, self.cubos):
+            acum += c
+            out.append(f'{self.nombre}_bucket{{le="{lim}"}} {acum}')
+        out.append(f'{self.nombre}_bucket{{le="+Inf"}} {self.cuenta}')
+        out.append(f"{self.nombre}_sum {self.suma}")
+        out.append(f"{self.nombre}_count {self.cuenta}")
+        return out
+
+class Contador:
+    def __init__(self, nombre, ayuda):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.valor = 0
+
+    def sumar(self, n=1):
+        self.valor += n
+
+    def texto(self):
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} counter", f"{self.nombre} {self.valor}"]
+
+REGISTRO = {}
+
+def histograma(nombre, ayuda, limites=LIMITES):
+    return REGISTRO.setdefault(nombre, Histograma(nombre, ayuda, limites))
+
+def contador(nombre, ayuda):
+    return REGISTRO.setdefault(nombre, Contador(nombre, ayuda))
+
+# --- Métricas del motor y de la reproducción ---
+TICK = histograma("motor_tick_segundos", "Duración de cada evaluación del motor (comprobar_todos)")
+DESPERTAR = histograma("motor_despertar_retraso_segundos", "Retraso del hilo del motor respecto al cambio de segundo")
+RETRASO_DISPARO = histograma("motor_disparo_retraso_segundos", "Retraso de cada evento disparado respecto a su segundo programado")
+CARGA = histograma("motor_carga_segundos", "Duración de la carga completa de la programación")
+RECARGA = histograma("motor_recarga_segundos", "Duración de las recargas incrementales")
+ARRANQUE = histograma("reproduccion_arranque_segundos", "Desde que una fuente se engancha a su salida hasta su primer bloque entregado")
+TICKS_RECUPERADOS = contador("motor_ticks_recuperados_total", "Segundos saltados que se evaluaron a posteriori")
+TICKS_PERDIDOS = contador("motor_ticks_perdidos_total", "Segundos saltados fuera de la ventana de recuperación")
+DISPAROS = contador("motor_disparos_total", "Eventos entregados por el motor")
+SUBDESBORDES = contador("reproduccion_subdesbordes_total", "Bloques de audio entregados incompletos porque el lector no llegó a tiempo")
+XRUNS = contador("reproduccion_xruns_total", "Underflows de salida señalados por PortAudio")
+
+def texto():
+    out = []
+    for m in list(REGISTRO.values()): out += m.texto()
+    out.append(f"# TYPE metricas_timestamp_segundos gauge\nmetricas_timestamp_segundos {time.time():.3f}")
+    return "\n".join(out) + "\n"
+
+def volcar(path):
+    escribir_atomico(path, texto())
+
+class Volcador(threading.Thread):
+    """Único escritor del archivo de métricas: lo reescribe cada 'intervalo' segundos y al salir."""
+    def __init__(self, path, intervalo):
+        super().__init__(daemon=True)
+        self.path = path
+        self.intervalo = intervalo
+        self.parar = threading.Event()
+        atexit.register(self.volcar)
+
+    def volcar(self):
+        try: volcar(self.path)
+        except Exception as e: print(f"No se pudieron escribir las métricas: {e}")
+
+    def run(self):
+        while not self.parar.wait(self.intervalo): self.volcar()
+
+_VOLCADOR = None
+_LOCK_VOLCADOR = threading.Lock()
+
+def volcar_cada(path, intervalo=10.0):
+    """Arranca el Volcador la primera vez; las siguientes llamadas devuelven el mismo."""
+    global _VOLCADOR
+    with _LOCK_VOLCADOR:
+        if _VOLCADOR is None:
+            _VOLCADOR = Volcador(path, intervalo)
+            _VOLCADOR.start()
+        return _VOLCADOR
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Resumen de forma de onda (mínimo, máximo y RMS por columna) para la pre-escucha.
+
+El archivo se parte en COLUMNAS tramos iguales y cada tramo se reduce de una vez
+con NumPy (reshape a columnas x muestras y min/max/media por filas), leyendo
+por bloques desde un hilo propio. Las columnas se publican según se calculan,
+así que un archivo largo se va dibujando mientras se analiza. Al terminar se
+guarda en CACHE_DIR con la ruta, el mtime y el tamaño como clave: volver a
+abrir la misma cuña lo muestra al instante.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+import numpy as np
+import soundfile as sf
+from PySide6.QtWidgets import QSlider, QStyle, QStyleOptionSlider
+from PySide6.QtGui import QPainter, QColor
+from PySide6.QtCore import Qt, QLineF
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, "cache_ondas")
+COLUMNAS = 1024
+BLOQUE_ONDA = 1 << 16   # frames que se leen por vuelta (se redondea a columnas enteras)
+
+def clave(path):
+    st = os.stat(path)
+    return hashlib.sha1(f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}".encode('utf-8')).hexdigest()
+
+def reducir(datos, paso):
+    """(frames x canales) -> (mínimo, máximo, rms) por cada 'paso' frames; el último tramo se rellena con su último frame."""
+    n = -(-len(datos) // paso)
+    if len(datos) < n * paso: datos = np.concatenate([datos, np.repeat(datos[-1:], n * paso - len(datos), axis=0)])
+    # Frames contiguos -> una fila por columna con todas sus muestras (de todos los canales)
+    b = datos.reshape(n, -1)
+    return b.min(axis=1), b.max(axis=1), np.sqrt(np.mean(b * b, axis=1))
+
+class Resumen:
+    """Forma de onda de un archivo; 'hechas' dice cuántas columnas están ya calculadas."""
+    def __init__(self, path, columnas=COLUMNAS):
+        self.path = path
+        self.hechas = 0
+        self.completo = False
+        self.parar = False
+        self.hilo = None
+        with sf.SoundFile(path) as f: self.frames = f.frames
+        self.paso = max(1, -(-self.frames // columnas))
+        self.columnas = max(1, -(-self.frames // self.paso))
+        self.minimo = np.zeros(self.columnas, dtype=np.float32)
+        self.maximo = np.zeros(self.columnas, dtype=np.float32)
+        self.rms = np.zeros(self.columnas, dtype=np.float32)
+        try: self.cache = os.path.join(CACHE_DIR, clave(path) + ".npz")
+        except OSError: self.cache = None
+        if not self._cargar():
+            self.hilo = threading.Thread(target=self._calcular, daemon=True)
+            self.hilo.start()
+
+    def cerrar(self):
+        self.parar = True
+
+    def _cargar(self):
+        if not self.cache or not os.path.exists(self.cache): return False
+        try:
+            with np.load(self.cache) as d:
+                if int(d['frames']) != self.frames or len(d['rms']) != self.columnas: return False
+                self.minimo, self.maximo, self.rms = d['minimo'], d['maximo'], d['rms']
+        except Exception: return False
+        self.hechas, self.completo = self.columnas, True
+        return True
+
+    def _calcular(self):
+        try:
+            with sf.SoundFile(self.path) as f:
+                for datos in f.blocks(self.paso * max(1, BLOQUE_ONDA // self.paso), dtype='float32', always_2d=True):
+                    if self.parar: return
+                    mn, mx, rms = reducir(datos, self.paso)
+                    i, j = self.hechas, min(self.hechas + len(rms), self.columnas)
+                    self.minimo[i:j], self.maximo[i:j], self.rms[i:j] = mn[:j - i], mx[:j - i], rms[:j - i]
+                    # Publicar después de escribir: quien dibuja nunca ve columnas a medias
+                    self.hechas = j
+        except Exception as e:
+            print("Error analizando forma de onda:", e)
+            return
+        self.completo = True
+        self._guardar()
+
+    def _guardar(self):
+        if not self.cache: return
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix=".tmp_", suffix=".npz", dir=CACHE_DIR)
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, frames=self.frames, minimo=self.minimo, maximo=self.maximo, rms=self.rms)
+            os.replace(tmp, self.cache)
+        except OSError as e:
+            print("No se pudo guardar la forma de onda:", e)
+
+class SliderOnda(QSlider):
+    """QSlider horizontal que dibuja un Resumen detrás del surco."""
+    def __init__(self, parent=None):
+        super().__init__(Qt.Horizontal, parent)
+        self.resumen = None
+        self.lineas = None
+        self.firma = None   # (ancho, columnas hechas) de las líneas calculadas
+        self.setMinimumHeight(60)
+
+    def set_resumen(self, resumen):
+        self.resumen = resumen
+        self.firma = None
+        self.update()
+
+    def _lineas(self, x0, ancho, medio, alto):
+        r = self.resumen
+        firma = (x0, ancho, medio, alto, r.hechas)
+        if firma != self.firma:
+            # Una columna de la imagen por píxel: el extremo de todas las columnas del resumen que caen en él
+            px = np.arange(ancho)
+            desde = px * r.columnas // ancho
+            hasta = np.maximum(desde + 1, (px + 1) * r.columnas // ancho)
+            ok = hasta <= r.hechas
+            mn = np.minimum.reduceat(r.minimo, desde)[ok]
+            mx = np.maximum.reduceat(r.maximo, desde)[ok]
+            rms = np.maximum.reduceat(r.rms, desde)[ok]
+            x = (x0 + px[ok]).tolist()
+            self.lineas = ([QLineF(a, medio - b * alto, a, medio - c * alto) for a, b, c in zip(x, mx.tolist(), mn.tolist())],
+                           [QLineF(a, medio - b * alto, a, medio + b * alto) for a, b in zip(x, rms.tolist())])
+            self.firma = firma
+        return self.lineas
+
+    def paintEvent(self, e):
+        if self.resumen is not None and self.resumen.hechas:
+            opt = QStyleOptionSlider()
+            self.initStyleOption(opt)
+            surco = self.style().subControlRect(QStyle.CC_Slider, opt, QStyle.SC_SliderGroove, self)
+            mango = self.style().subControlRect(QStyle.CC_Slider, opt, QStyle.SC_SliderHandle, self)
+            # Mismo recorrido que el mango, para que cada punto de la onda quede bajo su posición
+            x0 = surco.x() + mango.width() // 2
+            ancho = max(1, surco.width() - mango.width())
+            picos, rms = self._lineas(x0, ancho, self.height() / 2, self.height() / 2 - 2)
+            p = QPainter(self)
+            p.setPen(QColor("#9fb7d9")); p.drawLines(picos)
+            p.setPen(QColor("#3b6aa8")); p.drawLines(rms)
+            p.end()
+        super().paintEvent(e)
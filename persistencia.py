@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+Guardado seguro de la programación.
+
+- guardar_atomico(): escribe en un temporal, fsync y renombra; un corte a mitad
+  de escritura nunca deja el JSON truncado.
+- GuardadoDiferido: agrupa cambios rápidos (p. ej. 50 clics en "Activo") en una
+  sola escritura, hecha desde un hilo propio y no desde la interfaz.
+- DiarioCambios: cada edición es una línea en un diario (.journal) y el JSON
+  completo solo se reescribe al compactar, en segundo plano.
+"""
+import getpass
+import json
+import os
+import queue
+import socket
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+def escribir_atomico(path, texto):
+    carpeta = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_", dir=carpeta)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(texto)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+
+def guardar_atomico(path, datos):
+    escribir_atomico(path, json.dumps(datos))
+
+class GuardadoDiferido:
+    """Escritura diferida: guarda 'retraso' segundos después del último cambio."""
+    def __init__(self, path, retraso=0.5, escribir=guardar_atomico):
+        self.path = path
+        self.retraso = retraso
+        self.escribir = escribir
+        self.datos = None
+        self.version = 0
+        self.version_escrita = 0
+        self.limite = 0
+        self.parado = False
+        self.cond = threading.Condition()
+        # vaciar() y el hilo pueden escribir a la vez: nunca pisar una versión más nueva
+        self.escritura = threading.Lock()
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+
+    def programar(self, datos):
+        # Copia superficial: la interfaz puede seguir añadiendo/quitando eventos
+        with self.cond:
+            self.datos = list(datos)
+            self.version += 1
+            self.limite = time.monotonic() + self.retraso
+            self.cond.notify()
+
+    def vaciar(self):
+        """Escribe ya lo pendiente (al cerrar el gestor o la aplicación)."""
+        with self.cond:
+            datos, self.datos = self.datos, None
+            version = self.version
+        if datos is not None: self._escribir(datos, version)
+
+    def detener(self):
+        """Escribe lo pendiente y termina el hilo."""
+        with self.cond:
+            self.parado = True
+            self.cond.notify()
+        self.hilo.join()
+        self.vaciar()
+
+    def _escribir(self, datos, version):
+        with self.escritura:
+            if version <= self.version_escrita: return
+            try:
+                self.escribir(self.path, datos)
+                self.version_escrita = version
+            except Exception as e: print(f"Error guardando {os.path.basename(self.path)}: {e}")
+
+    def _bucle(self):
+        while True:
+            with self.cond:
+                while self.datos is None and not self.parado: self.cond.wait()
+                if self.parado: return
+                # Cada cambio nuevo aplaza la escritura
+                while self.datos is not None and not self.parado and time.monotonic() < self.limite:
+                    self.cond.wait(self.limite - time.monotonic())
+                if self.parado: return
+                datos, self.datos = self.datos, None
+                version = self.version
+            if datos is not None: self._escribir(datos, version)
+
+# --- DIARIO DE CAMBIOS ---
+# Formato del .journal: una primera línea {"base": [mtime_ns, tamaño]} con la firma
+# del JSON al que se aplican las entradas, y después una entrada por línea:
+# {"ts", "usuario", "op": add|edit|toggle|delete, "pos", "evento"} (en delete,
+# el evento borrado, solo para la auditoría).
+# Al compactar se escribe el JSON nuevo, las entradas pasan al .audit y el
+# diario se reinicia con la firma nueva: quien lea nunca aplica dos veces lo mismo.
+# Si el JSON ha cambiado por fuera y el diario ya no encaja, el diario se aparta
+# a un .journal.AAAAMMDD-HHMMSS en vez de perderse.
+
+def firma_archivo(path):
+    try:
+        st = os.stat(path)
+        return [st.st_mtime_ns, st.st_size]
+    except OSError:
+        return None
+
+def ruta_diario(path):
+    return path + ".journal"
+
+def leer_diario(path, offset=0):
+    """(base, entradas, offset) leyendo desde 'offset' (0 = justo tras la cabecera)."""
+    try: f = open(path, 'rb')
+    except OSError: return None, [], 0
+    with f:
+        try: base = json.loads(f.readline())['base']
+        except Exception: return None, [], 0
+        offset = max(offset, f.tell())
+        f.seek(offset)
+        entradas = []
+        for linea in f:
+            # Línea a medio escribir: la leeremos en la próxima pasada
+            if not linea.endswith(b"\n"): break
+            entradas.append(json.loads(linea))
+            offset += len(linea)
+    return base, entradas, offset
+
+def aplicar_entrada(eventos, ent):
+    op = ent['op']
+    if op == 'add': eventos.append(ent['evento'])
+    elif op in ('edit', 'toggle'): eventos[ent['pos']] = ent['evento']
+    elif op == 'delete': eventos.pop(ent['pos'])
+
+class DiarioCambios:
+    def __init__(self, path, retraso=30.0):
+        self.snapshot = path
+        self.path = ruta_diario(path)
+        self.auditoria = path + ".audit"
+        self.usuario = f"{getpass.getuser()}@{socket.gethostname()}"
+        self.lock = threading.RLock()
+        # Las líneas del diario las escribe (con fsync) un hilo propio, no la interfaz
+        self.cola = queue.Queue()
+        self.escritor = threading.Thread(target=self._escribir_entradas, daemon=True)
+        self.escritor.start()
+        # La compactación reutiliza la escritura diferida: varias ediciones, una sola reescritura
+        self.diferido = GuardadoDiferido(path, retraso, escribir=lambda p, d: self.compactar())
+
+    def _leer_snapshot(self):
+        if not os.path.exists(self.snapshot): return []
+        with open(self.snapshot, 'r') as f: return json.load(f)
+
+    def _reiniciar(self):
+        escribir_atomico(self.path, json.dumps({"base": firma_archivo(self.snapshot)}) + "\n")
+
+    def _apartar(self, entradas):
+        """El diario no corresponde al JSON actual: se guarda aparte y se avisa."""
+        if not entradas: return
+        destino = f"{self.path}.{datetime.now():%Y%m%d-%H%M%S}"
+        os.replace(self.path, destino)
+        print(f"Aviso: {len(entradas)} cambios del diario no encajan con {os.path.basename(self.snapshot)} "
+              f"(modificado por fuera); se conservan en {destino}")
+
+    def _auditar(self, entradas):
+        if not entradas: return
+        with open(self.auditoria, 'a') as f:
+            for ent in entradas: f.write(json.dumps(ent) + "\n")
+
+    def cargar(self):
+        """Lista de eventos = JSON + diario pendiente (recupera ediciones tras un corte)."""
+        self.cola.join()
+        with self.lock:
+            eventos = self._leer_snapshot()
+            base, entradas, _ = leer_diario(self.path)
+            if base != firma_archivo(self.snapshot):
+                # Diario ajeno a este JSON (o inexistente): lo apartamos y empezamos uno nuevo
+                self._apartar(entradas)
+                self._reiniciar()
+            elif entradas:
+                for ent in entradas: aplicar_entrada(eventos, ent)
+                self._escribir_base(eventos, entradas)
+            return eventos
+
+    def registrar(self, op, pos=None, evento=None):
+        ent = {"ts": datetime.now().isoformat(timespec='seconds'), "usuario": self.usuario, "op": op, "pos": pos}
+        if evento is not None: ent["evento"] = evento
+        # Se serializa aquí: el hilo escritor llega más tarde y el dict de la interfaz ya puede haber cambiado
+        self.cola.put(json.dumps(ent))
+
+    def _escribir_entradas(self):
+        while True:
+            ent = self.cola.get()
+            if ent is None:
+                self.cola.task_done()
+                return
+            # Lo que se haya acumulado mientras tanto va en la misma escritura y el mismo fsync
+            lote = [ent]
+            while True:
+                try: ent = self.cola.get_nowait()
+                except queue.Empty: break
+                if ent is None:
+                    self.cola.put(None)
+                    self.cola.task_done()
+                    break
+                lote.append(ent)
+            try:
+                with self.lock:
+                    with open(self.path, 'a') as f:
+                        f.write("".join(e + "\n" for e in lote))
+                        f.flush()
+                        os.fsync(f.fileno())
+            except Exception as e: print(f"Error escribiendo el diario: {e}")
+            for _ in lote: self.cola.task_done()
+            self.diferido.programar([])
+
+    def _escribir_base(self, eventos, entradas):
+        guardar_atomico(self.snapshot, eventos)
+        self._auditar(entradas)
+        self._reiniciar()
+
+    def compactar(self):
+        """Aplica el diario sobre el JSON, lo reescribe y reinicia el diario."""
+        self.cola.join()
+        with self.lock:
+            base, entradas, _ = leer_diario(self.path)
+            if not entradas: return
+            if base != firma_archivo(self.snapshot):
+                # El JSON cambió por fuera: no lo pisamos ni damos estas ediciones por aplicadas
+                self._apartar(entradas)
+                self._reiniciar()
+                return
+            eventos = self._leer_snapshot()
+            for ent in entradas: aplicar_entrada(eventos, ent)
+            self._escribir_base(eventos, entradas)
+
+    def reescribir(self, eventos):
+        """Sustituye toda la programación (p. ej. al abrir otro archivo)."""
+        self.cola.join()
+        with self.lock:
+            _, entradas, _ = leer_diario(self.path)
+            entradas.append({"ts": datetime.now().isoformat(timespec='seconds'), "usuario": self.usuario,
+                             "op": "replace", "pos": None, "total": len(eventos)})
+            self._escribir_base(eventos, entradas)
+
+    def vaciar(self):
+        self.cola.join()
+        self.diferido.vaciar()
+
+    def cerrar(self):
+        """Escribe y compacta lo pendiente y termina los hilos (al cerrar el gestor)."""
+        self.cola.put(None)
+        self.escritor.join()
+        self.diferido.detener()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Reglas compiladas del motor de eventos.
+
+Cada evento del JSON se compila una sola vez al cargar en un EventRule con
+campos enteros y máscaras de bits, para que el tick no toque diccionarios
+ni cadenas.
+"""
+from datetime import datetime, timedelta
+
+ONCE, HOURLY, OTHER = 0, 1, 2
+PERIODICIDADES = {'once': ONCE, 'hourly': HOURLY, 'other': OTHER}
+TODAS_LAS_HORAS = (1 << 24) - 1
+
+# Qué hacer cuando varios eventos coinciden en el mismo segundo
+POLITICA_TODOS = 'todos'          # todos, ordenados por prioridad
+POLITICA_PRINCIPAL = 'principal'  # todos los overlay + solo el evento principal de más prioridad
+
+def hora_a_segundos(t):
+    h, m, s = (int(x) for x in t.split(':'))
+    return h * 3600 + m * 60 + s
+
+def clave_evento(e):
+    """Clave barata para emparejar un evento releído con su versión anterior (se confirma con ==)."""
+    return (e.get('time'), e.get('value'), e.get('name'))
+
+class EventRule:
+    __slots__ = ('_evento', '_fuente', 'pos', 'periodicidad', 'segundo', 'dias', 'horas', 'expira', 'rango',
+                 'overlay', 'activo')
+
+    def __init__(self, evento, pos, periodicidad, segundo, dias, horas, expira, rango, overlay, activo=True, fuente=None):
+        # dict original, es lo que recibe el reproductor. Si viene de la caché binaria
+        # se reconstruye al pedirlo por primera vez: fuente = (decodificador, índice)
+        self._evento = evento
+        self._fuente = fuente
+        self.pos = pos                # orden de desempate
+        self.periodicidad = periodicidad
+        self.segundo = segundo        # segundo del día (0..86399)
+        self.dias = dias              # bit i = weekday i (lunes = 0)
+        self.horas = horas            # bit h = la regla suena a la hora h
+        self.expira = expira          # timestamp a partir del cual no suena (0 = nunca)
+        self.rango = rango            # menor = más prioritario
+        self.overlay = overlay
+        self.activo = activo
+
+    @property
+    def evento(self):
+        if self._evento is None:
+            decodificador, i = self._fuente
+            self._evento = decodificador.evento(i)
+        return self._evento
+
+    def vigente(self, ts):
+        return not self.expira or ts < self.expira
+
+def compilar(e, pos):
+    """Compila un evento (dict) en un EventRule. Lanza excepción si el evento está mal formado.
+
+    Espera un evento ya pasado por esquema.normalizar(): todos los campos presentes y con su tipo.
+    """
+    seg = hora_a_segundos(e['time'])
+    per = PERIODICIDADES[e['periodicity']]
+    dias = 0
+    for i in range(7):
+        if e['days'][i]: dias |= 1 << i
+    if per == ONCE: horas = 1 << (seg // 3600)
+    elif per == HOURLY: horas = TODAS_LAS_HORAS
+    else:
+        horas = 0
+        for h in e['other_hours']: horas |= 1 << h
+    expira = 0
+    if e['expire'] and e.get('expire_date'):
+        # Caduca al terminar el día indicado
+        expira = (datetime.strptime(e['expire_date'], "%Y-%m-%d") + timedelta(days=1)).timestamp()
+    overlay = e['overlay']
+    # Alta antes que baja, inmediato antes que en espera, overlay antes que principal
+    rango = ((e['priority'] != 'high') << 2) | ((not e['immediate']) << 1) | (not overlay)
+    return EventRule(e, pos, per, seg, dias, horas, expira, rango, overlay, e['active'])
+
+def entradas_indice(r):
+    """Entradas (tabla, clave) que aporta una regla al índice de disparos.
+
+    once   -> (día, segundo del día)
+    hourly -> (día, segundo de la hora)  ("MM:SS" de la hora del evento)
+    other  -> (día, segundo de la hora), filtrando luego por la máscara de horas
+    """
+    out = []
+    for wday in range(7):
+        if not r.dias >> wday & 1: continue
+        if r.periodicidad == ONCE: out.append(('once', (wday, r.segundo)))
+        elif r.periodicidad == HOURLY: out.append(('hourly', (wday, r.segundo % 3600)))
+        else: out.append(('other', (wday, r.segundo % 3600)))
+    return out
+
+def proximo_disparo(r, desde):
+    """Primer instante estrictamente posterior a 'desde' en que salta la regla (o None)."""
+    if not r.horas or not r.dias: return None
+    base = desde.replace(hour=0, minute=0, second=0, microsecond=0)
+    seg_hora = r.segundo % 3600
+    for d in range(8):
+        dia = base + timedelta(days=d)
+        if not r.dias >> dia.weekday() & 1: continue
+        for h in range(24):
+            if not r.horas >> h & 1: continue
+            t = dia + timedelta(seconds=h * 3600 + seg_hora)
+            if t > desde:
+                if r.expira and t.timestamp() >= r.expira: return None
+                return t
+    return None
+
+def resolver_conflictos(reglas, politica=POLITICA_PRINCIPAL):
+    """Ordena las reglas simultáneas por prioridad y aplica la política de conflictos."""
+    reglas = sorted(reglas, key=lambda r: r.rango)
+    if politica == POLITICA_TODOS: return reglas
+    out, principal = [], False
+    for r in reglas:
+        if r.overlay: out.append(r)
+        elif not principal:
+            out.append(r); principal = True
+    return out
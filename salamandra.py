@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Importar y exportar programaciones de Salamandra (.slsche).
+
+El .slsche es un ScheduleDocument de Json.NET con grupos y, dentro, objetos
+ScheduledEvent envueltos en "$type"/"$values". En vez de cargar todo el árbol,
+se lee el archivo por trozos y se decodifica cada ScheduledEvent por separado
+con raw_decode, así que un documento con miles de eventos nunca está entero en
+memoria como objetos. La exportación también se escribe evento a evento.
+
+Equivalencias:
+    DaysOfWeek (.NET, 0 = domingo)  -> days (0 = lunes)
+    PlayingHours (las 24)           -> periodicity 'hourly'
+    PlayingHours (algunas)          -> periodicity 'other' + other_hours
+    sin PlayingHours                -> periodicity 'once'
+    StartingDateTime                -> time (HH:MM:SS)
+    UseExpirationDateTime/...       -> expire / expire_date
+    UseMaximumWait/MaximumWaitTime  -> extra.wait_enabled / extra.wait_minutes
+    TrackScheduleType 0 / 1         -> type 'file' / 'random'
+    QueueOrder                      -> orden de la lista (desempate del motor)
+Lo que no tiene equivalente se guarda en extra.salamandra para poder exportarlo igual.
+
+Uso: python salamandra.py entrada.slsche salida.json
+     python salamandra.py entrada.json salida.slsche
+"""
+import json
+import os
+import re
+import sys
+import tempfile
+from datetime import datetime
+from esquema import normalizar
+
+TROZO = 1 << 20
+RE_EVENTO = re.compile(r'\{\s*"\$type"\s*:\s*"Salamandra\.Engine\.Domain\.Events\.ScheduledEvent,')
+# Lo que se conserva del final del búfer por si la marca queda partida entre dos trozos
+COLA = 256
+
+T_DOCUMENTO = "Salamandra.Engine.Domain.Events.ScheduleDocument, Salamandra.Engine"
+T_COLECCION = "System.Windows.Data.WpfObservableRangeCollection`1[[{}, Salamandra.Engine]], Salamandra.Windows"
+T_GRUPO = "Salamandra.Engine.Domain.Events.ScheduledEventGroup"
+T_EVENTO = "Salamandra.Engine.Domain.Events.ScheduledEvent"
+T_HORAS = "System.Collections.ObjectModel.ObservableCollection`1[[System.Int32, System.Private.CoreLib]], System.ObjectModel"
+T_DIAS = "System.Collections.ObjectModel.ObservableCollection`1[[System.DayOfWeek, System.Private.CoreLib]], System.ObjectModel"
+T_ATRIBUTOS = "System.Collections.Generic.List`1[[Salamandra.Engine.Domain.Playlist.Attributes.Base.BasePlaylistEntryAttribute, Salamandra.Engine]], System.Private.CoreLib"
+T_PERSISTIDOS = "System.Collections.Generic.List`1[[System.String, System.Private.CoreLib]], System.Private.CoreLib"
+
+# Campos de Salamandra sin equivalente propio
+SIN_EQUIVALENTE = ('QueueOrder', 'EventPriority', 'MaximumWaitAction', 'LockControls')
+
+def iterar_eventos(path):
+    """Genera los ScheduledEvent (dicts) del documento, uno a uno, leyendo por trozos."""
+    dec = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        buf, i, fin = '', 0, False
+        while True:
+            m = RE_EVENTO.search(buf, i)
+            if m:
+                try:
+                    obj, i = dec.raw_decode(buf, m.start())
+                    yield obj
+                    continue
+                except json.JSONDecodeError:
+                    # Evento cortado al final del trozo: leemos más y reintentamos
+                    if fin: raise
+                    i = m.start()
+            elif fin: return
+            else: i = max(i, len(buf) - COLA)
+            trozo = f.read(TROZO)
+            if not trozo: fin = True
+            buf = buf[i:] + trozo
+            i = 0
+
+def _valores(v):
+    return v.get('$values', []) if isinstance(v, dict) else (v or [])
+
+def _minutos(t):
+    """'hh:mm:ss' (TimeSpan) -> minutos, redondeando hacia arriba."""
+    dias = 0
+    if '.' in t.split(':')[0]: d, t = t.split('.', 1); dias = int(d)
+    h, m, s = t.split(':')
+    seg = dias * 86400 + int(h) * 3600 + int(m) * 60 + float(s)
+    return int(-(-seg // 60))
+
+def a_evento(se):
+    """ScheduledEvent -> evento de este proyecto (sin normalizar)."""
+    horas = sorted({int(h) for h in _valores(se.get('PlayingHours'))}) if se.get('UsePlayingHours') else []
+    if not se.get('UsePlayingHours') or not horas: per = 'once'
+    elif len(horas) == 24: per, horas = 'hourly', []
+    else: per = 'other'
+    if se.get('UseDaysOfWeek', True):
+        dias = [False] * 7
+        for d in _valores(se.get('DaysOfWeek')): dias[(int(d) - 1) % 7] = True
+    else: dias = [True] * 7
+    inicio = se.get('StartingDateTime') or ''
+    fichero = se.get('Filename', '')
+    nombre = se.get('FriendlyName') if se.get('UseCustomFriendlyName') else None
+    expira = se.get('ExpirationDateTime') or ''
+    e = {
+        "name": nombre or os.path.basename(fichero.replace('\\', '/').rstrip('/')),
+        "time": inicio[11:19],
+        "periodicity": per,
+        "other_hours": horas,
+        "days": dias,
+        "immediate": bool(se.get('Immediate', False)),
+        "overlay": False,
+        "priority": "high" if se.get('EventPriority', 0) > 0 else "low",
+        "expire": bool(se.get('UseExpirationDateTime', False)),
+        "type": "random" if se.get('TrackScheduleType') == 1 else "file",
+        "value": fichero,
+        "extra": {
+            "wait_enabled": bool(se.get('UseMaximumWait', False)),
+            "wait_minutes": _minutos(se.get('MaximumWaitTime') or '00:10:00'),
+            "salamandra": {k: se[k] for k in SIN_EQUIVALENTE if k in se},
+        },
+        "active": bool(se.get('IsEnabled', True)),
+    }
+    if e["expire"] and expira: e["expire_date"] = expira[:10]
+    return e
+
+def importar(path):
+    """(eventos normalizados, errores), ordenados por QueueOrder como los encolaría Salamandra."""
+    eventos = [a_evento(se) for se in iterar_eventos(path)]
+    eventos.sort(key=lambda e: e['extra']['salamandra'].get('QueueOrder', 0))
+    return normalizar(eventos)
+
+def _fecha(dia, hora):
+    return datetime.fromisoformat(f"{dia}T{hora}").astimezone().isoformat(timespec='milliseconds')
+
+def a_scheduled(e, id_):
+    """Evento (normalizado) -> ScheduledEvent con sus envoltorios $type."""
+    sal = e['extra'].get('salamandra', {})
+    hoy = datetime.now().strftime("%Y-%m-%d")
+    if e['periodicity'] == 'hourly': horas = list(range(24))
+    elif e['periodicity'] == 'other': horas = e['other_hours']
+    else: horas = []
+    ahora = datetime.now().astimezone().isoformat()
+    return {
+        "$type": f"{T_EVENTO}, Salamandra.Engine",
+        "Id": id_,
+        "IsEnabled": e['active'],
+        "Immediate": e['immediate'],
+        "TrackScheduleType": 1 if e['type'] == 'random' else 0,
+        "Filename": e['value'],
+        "UseCustomFriendlyName": bool(e['name']),
+        "FriendlyName": e['name'],
+        "StartingDateTime": _fecha(hoy, e['time']),
+        "UsePlayingHours": bool(horas),
+        "PlayingHours": {"$type": T_HORAS, "$values": horas},
+        "UseExpirationDateTime": e['expire'],
+        "ExpirationDateTime": _fecha(e.get('expire_date') or hoy, "23:59:59"),
+        "UseDaysOfWeek": True,
+        # days (0 = lunes) -> DayOfWeek (.NET, 0 = domingo)
+        "DaysOfWeek": {"$type": T_DIAS, "$values": sorted((i + 1) % 7 for i in range(7) if e['days'][i])},
+        "UseEveryStartingYear": False,
+        "UseEveryExpiringYear": False,
+        "UseAnyStartingMonth": False,
+        "AnyStartingMonthDayType": 0,
+        "UseAnyExpiringMonth": False,
+        "AnyExpiringMonthDayType": 0,
+        "QueueOrder": sal.get('QueueOrder', 50),
+        "EventPriority": sal.get('EventPriority', 1 if e['priority'] == 'high' else 0),
+        "LockControls": sal.get('LockControls', False),
+        "UseMaximumWait": e['extra']['wait_enabled'],
+        "MaximumWaitTime": f"{e['extra']['wait_minutes'] // 60:02}:{e['extra']['wait_minutes'] % 60:02}:00",
+        "MaximumWaitAction": sal.get('MaximumWaitAction', 0),
+        "CreatedAt": ahora,
+        "UpdatedAt": ahora,
+        "TrackAttributes": {"$type": T_ATRIBUTOS, "$values": []},
+        "PersistedAttributes": {"$type": T_PERSISTIDOS, "$values": []},
+    }
+
+def exportar(eventos, path, grupo="Estándar"):
+    """Escribe 'eventos' como .slsche (un solo grupo), evento a evento y de forma atómica.
+
+    Los eventos de hora/temperatura/satélite no existen en Salamandra y se omiten.
+    Devuelve cuántos se exportaron.
+    """
+    eventos, _ = normalizar(eventos)
+    carpeta = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix=".tmp_", dir=carpeta)
+    n = 0
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            # La cabecera lleva LastEventId, que solo se sabe al final: se escribe tras los eventos
+            f.write('{"$type":' + json.dumps(T_DOCUMENTO) + ',"Groups":{"$type":'
+                    + json.dumps(T_COLECCION.format(T_GRUPO)) + ',"$values":[{"$type":'
+                    + json.dumps(f"{T_GRUPO}, Salamandra.Engine") + ',"Name":' + json.dumps(grupo, ensure_ascii=False)
+                    + ',"ScheduledEvents":{"$type":' + json.dumps(T_COLECCION.format(T_EVENTO)) + ',"$values":[')
+            for e in eventos:
+                if e.get('schema') is None or e['type'] not in ('file', 'random'): continue
+                if n: f.write(',')
+                n += 1
+                f.write(json.dumps(a_scheduled(e, n), ensure_ascii=False, separators=(',', ':')))
+            f.write(f']}},"Id":1}}]}},"LastEventId":{n},"LastGroupId":1}}')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    return n
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Uso: python salamandra.py entrada.slsche salida.json | entrada.json salida.slsche")
+        sys.exit(1)
+    origen, destino = sys.argv[1], sys.argv[2]
+    if origen.lower().endswith('.slsche'):
+        eventos, errores = importar(origen)
+        for err in errores: print(err)
+        with open(destino, 'w', encoding='utf-8') as f: json.dump(eventos, f, ensure_ascii=False, indent=1)
+        print(f"{len(eventos)} eventos importados")
+    else:
+        from simulacion import cargar_eventos
+        print(f"{exportar(cargar_eventos(origen), destino)} eventos exportados")
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Simulación de la programación sin esperar al reloj.
+
+Expande todas las reglas en instantes concretos de disparo para un rango de
+fechas, vectorizado con NumPy (días x horas x reglas) en vez de recorrer
+segundo a segundo. Sirve para preguntar "¿qué suena el domingo a las 03:00?"
+o auditar meses de parrilla en milisegundos.
+"""
+import json
+import sys
+from datetime import datetime, timedelta
+import numpy as np
+from esquema import normalizar
+from reglas import compilar
+
+# Cuántas reglas se expanden a la vez (limita la memoria de la matriz días x horas)
+BLOQUE_REGLAS = 2048
+
+LINEA = np.dtype([('ts', 'datetime64[s]'), ('regla', np.int32)])
+
+def cargar_eventos(path):
+    """Lee events_db.json (lista) o ccpcadena.json ({"events": [...]})."""
+    with open(path, 'r', encoding='utf-8') as f: data = json.load(f)
+    if isinstance(data, dict): return data.get('events', [])
+    return data
+
+def compilar_eventos(eventos, incluir_inactivos=False):
+    reglas = []
+    for i, e in enumerate(normalizar(eventos)[0]):
+        if not incluir_inactivos and not e.get('active', True): continue
+        try: reglas.append(compilar(e, i))
+        except Exception as ex: print(f"Evento {i} ignorado ({e.get('name', '')}): {ex}")
+    return reglas
+
+def expandir(reglas, desde, hasta):
+    """Línea de tiempo ordenada de disparos en [desde, hasta).
+
+    Devuelve un array estructurado con campos 'ts' (datetime64[s], hora local)
+    y 'regla' (índice en 'reglas').
+    """
+    if not reglas: return np.empty(0, dtype=LINEA)
+    t0 = np.datetime64(desde.replace(microsecond=0), 's')
+    t1 = np.datetime64(hasta.replace(microsecond=0), 's')
+    dias = np.arange(t0.astype('datetime64[D]'), t1.astype('datetime64[D]') + 1)
+    # 1970-01-01 fue jueves (weekday 3)
+    wd = (dias.astype(np.int64) + 3) % 7
+    base = dias.astype('datetime64[s]').astype(np.int64)
+    horas = np.arange(24, dtype=np.int64)
+
+    partes_ts, partes_idx = [], []
+    for b in range(0, len(reglas), BLOQUE_REGLAS):
+        bloque = reglas[b:b + BLOQUE_REGLAS]
+        m_dias = np.array([r.dias for r in bloque], dtype=np.int64)
+        m_horas = np.array([r.horas for r in bloque], dtype=np.int64)
+        seg_hora = np.array([r.segundo % 3600 for r in bloque], dtype=np.int64)
+        # La caducidad es un timestamp POSIX; la línea de tiempo va en hora local
+        expira = np.array([np.datetime64(datetime.fromtimestamp(r.expira), 's').astype(np.int64) if r.expira else np.iinfo(np.int64).max
+                           for r in bloque], dtype=np.int64)
+
+        # (regla, día, hora) -> ¿suena?
+        ok = ((m_dias[:, None] >> wd[None, :]) & 1).astype(bool)[:, :, None] & \
+             ((m_horas[:, None] >> horas[None, :]) & 1).astype(bool)[:, None, :]
+        ri, di, hi = np.nonzero(ok)
+        ts = base[di] + hi * 3600 + seg_hora[ri]
+        sel = (ts >= t0.astype(np.int64)) & (ts < t1.astype(np.int64)) & (ts < expira[ri])
+        partes_ts.append(ts[sel])
+        partes_idx.append(ri[sel] + b)
+
+    ts = np.concatenate(partes_ts)
+    idx = np.concatenate(partes_idx)
+    # Orden estable por instante y, en empate, por orden de la lista
+    pos = np.array([r.pos for r in reglas], dtype=np.int64)[idx]
+    orden = np.lexsort((pos, ts))
+    out = np.empty(len(orden), dtype=LINEA)
+    out['ts'] = ts[orden].astype('datetime64[s]')
+    out['regla'] = idx[orden]
+    return out
+
+def en_ventana(linea, inicio, duracion=timedelta(minutes=1)):
+    """Filas de la línea de tiempo que caen en [inicio, inicio + duracion)."""
+    a = np.datetime64(inicio.replace(microsecond=0), 's')
+    b = np.datetime64((inicio + duracion).replace(microsecond=0), 's')
+    i, j = np.searchsorted(linea['ts'], [a, b])
+    return linea[i:j]
+
+def imprimir(linea, reglas, limite=None):
+    for fila in linea[:limite]:
+        e = reglas[fila['regla']].evento
+        print(f"{str(fila['ts']).replace('T', ' ')}  {e['type'].upper():7} {e.get('name', '')}")
+
+if __name__ == "__main__":
+    # python simulacion.py ccpcadena.json [AAAA-MM-DD] [días]
+    if len(sys.argv) < 2:
+        print("Uso: python simulacion.py archivo.json [AAAA-MM-DD] [días]")
+        sys.exit(1)
+    desde = datetime.strptime(sys.argv[2], "%Y-%m-%d") if len(sys.argv) > 2 else datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    dias = int(sys.argv[3]) if len(sys.argv) > 3 else 7
+    reglas = compilar_eventos(cargar_eventos(sys.argv[1]))
+    linea = expandir(reglas, desde, desde + timedelta(days=dias))
+    imprimir(linea, reglas)
+    print(f"\n{len(linea)} disparos en {dias} días")
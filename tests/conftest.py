@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+# Los módulos del proyecto están sueltos en la raíz
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# El motor vive en eventos3, que importa Qt: sin pantalla, plataforma offscreen
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+@pytest.fixture(scope="session")
+def qapp():
+    from PySide6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+class StreamFalso:
+    """OutputStream sin PortAudio: el test llama a 'callback' como lo haría el driver."""
+    abiertos = []
+
+    def __init__(self, samplerate, channels, device, callback, blocksize):
+        self.samplerate, self.channels, self.device = samplerate, channels, device
+        self.callback, self.blocksize = callback, blocksize
+        self.active = self.closed = False
+        StreamFalso.abiertos.append(self)
+
+    def start(self): self.active = True
+    def stop(self): self.active = False
+    def close(self): self.closed = True
+
+    def bloque(self, underflow=False):
+        out = np.zeros((self.blocksize, self.channels), dtype=np.float32)
+        self.callback(out, self.blocksize, None, types.SimpleNamespace(output_underflow=underflow))
+        return out
+
+@pytest.fixture
+def stream_falso(monkeypatch):
+    import audio_libs
+    StreamFalso.abiertos = []
+    monkeypatch.setattr(audio_libs, 'sd', types.SimpleNamespace(OutputStream=StreamFalso))
+    return StreamFalso
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import random
+import sqlite3
+
+import pytest
+
+from almacen_sqlite import AlmacenEventos, leer_documento
+from bench_motor import generar
+from esquema import normalizar
+from reglas import compilar
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CCPCADENA = os.path.join(RAIZ, "ccpcadena.json")
+
+@pytest.fixture
+def almacen(tmp_path):
+    a = AlmacenEventos(str(tmp_path / "eventos.db"))
+    yield a
+    a.cerrar()
+
+def leer(path):
+    with open(path, 'r', encoding='utf-8') as f: return json.load(f)
+
+def test_importar_exportar_sin_perdidas(almacen, tmp_path):
+    almacen.importar_json(CCPCADENA)
+    almacen.exportar_json(str(tmp_path / "copia.json"))
+    assert leer(tmp_path / "copia.json") == leer(CCPCADENA)
+
+def test_importacion_normalizada_conserva_el_original(almacen, tmp_path):
+    # Lo que hace el gestor al abrir un JSON con el almacén activo
+    eventos, envoltorio = leer_documento(CCPCADENA)
+    normalizados, errores = normalizar(eventos)
+    almacen.guardar_envoltorio(envoltorio)
+    almacen.reemplazar_todo(normalizados)
+    almacen.exportar_json(str(tmp_path / "copia.json"))
+    original, copia = leer(CCPCADENA), leer(tmp_path / "copia.json")
+    assert errores == [] and list(copia) == list(original)
+    assert {k: v for k, v in copia.items() if k != 'events'} == {k: v for k, v in original.items() if k != 'events'}
+    for a, b in zip(original['events'], copia['events']):
+        # Todos los campos de origen siguen ahí con su valor (normalizar solo añade)
+        assert {k: v for k, v in b.items() if k in a and k != 'extra'} == {k: v for k, v in a.items() if k != 'extra'}
+        assert {k: v for k, v in b['extra'].items() if k in a['extra']} == a['extra']
+
+def suena_en(r, dia, desde, hasta):
+    if not r.dias >> dia & 1: return False
+    return any(r.horas >> h & 1 and desde <= h * 3600 + r.segundo % 3600 < hasta for h in range(24))
+
+def test_busqueda_por_franja(almacen):
+    eventos = [e for e in normalizar(generar(400))[0] if e.get('schema')]
+    reglas = [compilar(e, i) for i, e in enumerate(eventos)]
+    ids = almacen.reemplazar_todo(eventos)
+    azar = random.Random(3)
+    franjas = [(0, 86400), (3600, 7200), (3599, 3601), (86399, 86400), (0, 1)]
+    franjas += [tuple(sorted(azar.sample(range(86401), 2))) for _ in range(40)]
+    for desde, hasta in franjas:
+        dia = azar.randrange(7)
+        esperado = [ids[i] for i, r in enumerate(reglas) if suena_en(r, dia, desde, hasta)]
+        assert [i for i, e in almacen.buscar(dia=dia, desde=desde, hasta=hasta)] == esperado, (dia, desde, hasta)
+
+def test_busqueda_combinada(almacen):
+    base = {'days': [True] * 7, 'type': 'file', 'value': 'a.mp3'}
+    eventos, _ = normalizar([dict(base, name='hora', time='00:59:54', periodicity='hourly'),
+                             dict(base, name='parrilla', time='00:30:00', periodicity='other', other_hours=[8, 14]),
+                             dict(base, name='una', time='14:30:00', periodicity='once', active=False)])
+    almacen.reemplazar_todo(eventos)
+    nombres = lambda **k: [e['name'] for i, e in almacen.buscar(**k)]
+    assert nombres(desde=14 * 3600, hasta=15 * 3600) == ['hora', 'parrilla', 'una']
+    assert nombres(desde=14 * 3600, hasta=15 * 3600, activo=True) == ['hora', 'parrilla']
+    assert nombres(desde=9 * 3600, hasta=10 * 3600) == ['hora']
+    assert nombres(periodicidad='other') == ['parrilla']
+
+def test_migra_almacen_sin_seg_hora(tmp_path):
+    path = str(tmp_path / "viejo.db")
+    con = sqlite3.connect(path)
+    con.executescript("""
+        CREATE TABLE eventos (id INTEGER PRIMARY KEY, pos INTEGER NOT NULL, nombre TEXT, segundo INTEGER,
+                              periodicidad TEXT, horas INTEGER, tipo TEXT, activo INTEGER, datos TEXT NOT NULL);
+        CREATE TABLE evento_dia (id INTEGER NOT NULL, dia INTEGER NOT NULL, segundo INTEGER, PRIMARY KEY (id, dia));
+    """)
+    e = {'name': 'hora', 'time': '00:59:54', 'periodicity': 'hourly', 'days': [True] * 7}
+    con.execute("INSERT INTO eventos VALUES (1, 0, 'hora', 3594, 'hourly', 0, 'file', 1, ?)", (json.dumps(e),))
+    con.executemany("INSERT INTO evento_dia VALUES (1, ?, 3594)", [(d,) for d in range(7)])
+    con.commit()
+    con.close()
+    a = AlmacenEventos(path)
+    try: assert [i for i, e in a.buscar(dia=2, desde=10 * 3600, hasta=11 * 3600)] == [1]
+    finally: a.cerrar()
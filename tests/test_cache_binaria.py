@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import cache_binaria
+from bench_motor import generar
+from eventos3 import MotorEventos
+
+def reglas_de(m):
+    return [(r.pos, r.periodicidad, r.segundo, r.dias, r.horas, r.expira, r.rango, r.overlay, r.activo) for r in m.reglas]
+
+def escribir(path, eventos):
+    path.write_text(json.dumps(eventos))
+    return str(path)
+
+def test_arranque_desde_la_cache_igual_que_en_frio(tmp_path):
+    path = escribir(tmp_path / "eventos.json", generar(500))
+    frio = MotorEventos(vigilar=False, path=path)
+    assert os.path.exists(cache_binaria.ruta_cache(path))
+    caliente = MotorEventos(vigilar=False, path=path)
+    assert caliente.decodificador is not None and frio.decodificador is None
+    assert reglas_de(caliente) == reglas_de(frio)
+    assert caliente.events_cache == frio.events_cache
+
+def test_invalidacion(tmp_path):
+    eventos = generar(50)
+    path = escribir(tmp_path / "eventos.json", eventos)
+    cache = cache_binaria.ruta_cache(path)
+    MotorEventos(vigilar=False, path=path)
+    assert cache_binaria.cargar(cache, path)
+    # Solo cambia el mtime (copiado, tocado): el hash dice que sigue valiendo
+    os.utime(path, ns=(0, 10 ** 18))
+    assert cache_binaria.cargar(cache, path)
+    # Mismo tamaño, otro contenido
+    eventos[0]['name'] = eventos[0]['name'][::-1] + 'x'
+    eventos[1]['name'] = eventos[1]['name'][:-1]
+    texto = json.dumps(eventos)
+    assert len(texto) == os.path.getsize(path)
+    with open(path, 'w') as f: f.write(texto)
+    assert cache_binaria.cargar(cache, path) is None
+    # Caché corrupta: se ignora
+    with open(cache, 'wb') as f: f.write(b'MEVC basura')
+    assert cache_binaria.cargar(cache, path) is None
+
+def test_arranque_desde_la_cache_avisa_los_mismos_errores(tmp_path, capsys):
+    buenos = generar(10)
+    path = escribir(tmp_path / "eventos.json", buenos + [dict(buenos[0], name='malo', time='25:00')])
+    frio = MotorEventos(vigilar=False, path=path)
+    assert len(frio.errores) == 1 and "malo" in capsys.readouterr().out
+    caliente = MotorEventos(vigilar=False, path=path)
+    assert caliente.decodificador is not None
+    assert caliente.errores == frio.errores
+    assert "malo" in capsys.readouterr().out
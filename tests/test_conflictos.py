@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import soundfile as sf
+
+from conflictos import CacheDuraciones, analizar
+from simulacion import compilar_eventos
+
+DESDE = datetime(2024, 1, 1)
+
+def sat(nombre, hora, duracion, **campos):
+    e = {'name': nombre, 'time': hora, 'periodicity': 'once', 'days': [True] * 7, 'type': 'sat',
+         'extra': {'duration': duracion}}
+    e.update(campos)
+    return e
+
+def conflictos(eventos, tmp_path):
+    return [(c['tipo'], c['ts'].strftime("%H:%M:%S"), c['evento']['name'], c['con']['name'])
+            for c in analizar(compilar_eventos(eventos), DESDE, DESDE + timedelta(days=1),
+                              CacheDuraciones(str(tmp_path / "duraciones.json")))]
+
+def test_solape_espera_e_inmediatos(tmp_path):
+    eventos = [
+        sat('programa', '10:00:00', '00:05:00'),
+        sat('cuña', '10:02:00', '00:00:30', immediate=True),
+        sat('bloque', '10:03:00', '00:01:00', extra={'duration': '00:01:00', 'wait_enabled': True, 'wait_minutes': 1}),
+        sat('musica', '10:20:00', '00:10:00', immediate=True),
+        sat('hora', '10:25:00', '00:00:10', immediate=True),
+        # Un overlay no ocupa la salida
+        sat('pisador', '10:21:00', '00:01:00', overlay=True),
+    ]
+    assert conflictos(eventos, tmp_path) == [
+        ('solape', '10:02:00', 'cuña', 'programa'),
+        ('espera', '10:03:00', 'bloque', 'programa'),
+        ('inmediatos', '10:25:00', 'hora', 'musica'),
+    ]
+
+def test_sin_conflictos(tmp_path):
+    assert conflictos([sat('a', '10:00:00', '00:01:00'), sat('b', '10:01:00', '00:01:00')], tmp_path) == []
+
+def test_cache_de_duraciones(tmp_path):
+    wav = str(tmp_path / "a.wav")
+    sf.write(wav, np.zeros(8000, dtype=np.float32), 8000)
+    path = str(tmp_path / "duraciones.json")
+    c = CacheDuraciones(path)
+    assert c.fichero(wav) == 1.0
+    c.guardar()
+    with open(path) as f: assert json.load(f)[wav]['dur'] == 1.0
+    # Sin restos del guardado atómico
+    assert sorted(os.listdir(tmp_path)) == ["a.wav", "duraciones.json"]
+    # Otro fichero con la misma ruta: la entrada vieja ya no vale
+    sf.write(wav, np.zeros(16000, dtype=np.float32), 8000)
+    assert CacheDuraciones(path).fichero(wav) == 2.0
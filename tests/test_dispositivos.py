@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+import audio_libs
+from audio_libs import REGISTRO, migrar_config, migrar_documento
+
+def dispositivo(index, name, hostapi='MME', n=0, inputs=2, outputs=2):
+    return {'index': index, 'name': name, 'hostapi': hostapi, 'n': n, 'inputs': inputs, 'outputs': outputs, 'samplerate': 44100.0}
+
+ANTES = [dispositivo(0, 'Altavoces'), dispositivo(1, 'Mesa', inputs=0), dispositivo(2, 'Mesa', n=1, inputs=0), dispositivo(3, 'Línea', outputs=0)]
+# Se ha enchufado un USB: todo se corre dos puestos
+DESPUES = [dispositivo(0, 'Altavoces'), dispositivo(1, 'USB'), dispositivo(2, 'USB', 'WASAPI')] + \
+          [dict(d, index=d['index'] + 2) for d in ANTES[1:]]
+
+@pytest.fixture
+def hardware(monkeypatch):
+    def poner(lista): monkeypatch.setattr(REGISTRO, 'lista', lista)
+    poner(ANTES)
+    return poner
+
+def test_referencia_estable(hardware):
+    ref = REGISTRO.referencia(2)
+    assert ref == {'name': 'Mesa', 'hostapi': 'MME', 'n': 1, 'index': 2}
+    hardware(DESPUES)
+    assert REGISTRO.resolver(ref) == 4
+    # Índice suelto de configuraciones antiguas: tal cual; dispositivo desaparecido: el índice guardado
+    assert REGISTRO.resolver(7) == 7
+    assert REGISTRO.resolver({'name': 'Fuera', 'hostapi': 'MME', 'n': 0, 'index': 3}) == 3
+    assert [d['index'] for d in REGISTRO.salidas()] == [0, 1, 2, 3, 4]
+    assert [d['index'] for d in REGISTRO.entradas()] == [0, 1, 2, 5]
+
+def test_sin_portaudio_no_lanza(monkeypatch):
+    monkeypatch.setattr(REGISTRO, 'lista', None)
+    monkeypatch.setattr(REGISTRO, 'error', False)
+    monkeypatch.setattr(audio_libs, 'sd', None)
+    assert REGISTRO.dispositivos() == [] and REGISTRO.error
+    assert audio_libs.get_output_devices() == [(-1, "Error detectando dispositivos")]
+
+def test_migrar_config(hardware):
+    cfg = migrar_config({'main_device': 2, 'cue_device': -1, 'volumen': 80})
+    assert cfg == {'main_device': 2, 'cue_device': -1, 'volumen': 80, 'main_device_ref': {'name': 'Mesa', 'hostapi': 'MME', 'n': 1, 'index': 2}}
+    hardware(DESPUES)
+    assert migrar_config(cfg)['main_device'] == 4
+    assert migrar_config(migrar_config(cfg)) == migrar_config(cfg)
+
+def test_migrar_documento_deja_copia(hardware, tmp_path):
+    path = tmp_path / "ccpcadena.json"
+    original = json.dumps({'events': [], 'audio_config': {'main_device': 1}})
+    path.write_text(original)
+    assert migrar_documento(str(path)) == ["main_device_ref: None -> {'name': 'Mesa', 'hostapi': 'MME', 'n': 0, 'index': 1}"]
+    assert (tmp_path / "ccpcadena.json.bak").read_text() == original
+    assert json.loads(path.read_text())['audio_config']['main_device_ref']['name'] == 'Mesa'
+    # Sin cambios no se toca ni se copia otra vez
+    (tmp_path / "ccpcadena.json.bak").unlink()
+    assert migrar_documento(str(path)) == [] and not (tmp_path / "ccpcadena.json.bak").exists()
+
+def test_satelite_sale_con_el_indice_actual(hardware, tmp_path):
+    from test_motor import crear_motor, evento, s
+    from eventos3 import con_dispositivo
+    from reglas import POLITICA_TODOS
+    sat = evento('sat', type='sat', value=3, extra={'device': REGISTRO.referencia(3)})
+    m = crear_motor(tmp_path, [sat, evento('antiguo', type='sat', value=1)])
+    hardware(DESPUES)
+    assert {e['name']: e['value'] for e in m.comprobar_todos(POLITICA_TODOS, now=s(0))} == {'sat': 5, 'antiguo': 1}
+    # El evento del motor no se toca: el índice se resuelve en cada disparo
+    assert m.events_cache[0]['value'] == 3
+    hardware(ANTES)
+    assert con_dispositivo(m.events_cache[0])['value'] == 3
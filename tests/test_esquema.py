@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import pytest
+
+from esquema import VERSION_ESQUEMA, normalizar
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def evento(**campos):
+    e = {'time': '8:05', 'periodicity': 'once', 'days': [1, 1, 1, 1, 1, 0, 0], 'type': 'file', 'value': 'a.mp3'}
+    e.update(campos)
+    return e
+
+def test_completa_campos_y_tipos():
+    (n,), errores = normalizar([evento()])
+    assert errores == []
+    assert n['time'] == '08:05:00'
+    assert n['days'] == [True] * 5 + [False] * 2
+    assert (n['name'], n['immediate'], n['overlay'], n['priority'], n['expire'], n['active']) == ('', False, False, 'low', False, True)
+    assert n['extra'] == {'wait_enabled': False, 'wait_minutes': 10, 'duration': '00:30:00'}
+    assert n['schema'] == VERSION_ESQUEMA
+
+def test_normalizado_se_devuelve_tal_cual():
+    (n,), _ = normalizar([evento()])
+    (m,), errores = normalizar([n])
+    assert m is n and errores == []
+
+@pytest.mark.parametrize("wait, activo, minutos", [(15, True, 15), (0, False, 10), (None, False, 10), ("5", True, 5)])
+def test_migra_wait_v1(wait, activo, minutos):
+    (n,), errores = normalizar([evento(extra={'wait': wait})])
+    assert errores == []
+    # El 'wait' original se conserva para quien todavía lo lee
+    assert n['extra']['wait'] == wait
+    assert (n['extra']['wait_enabled'], n['extra']['wait_minutes']) == (activo, minutos)
+
+def test_other_hours_ordenadas_sin_repetir():
+    (n,), errores = normalizar([evento(periodicity='other', other_hours=["14", 8, 8])])
+    assert errores == [] and n['other_hours'] == [8, 14]
+
+@pytest.mark.parametrize("campos, error", [
+    ({'time': '25:00'}, "hora fuera de rango"),
+    ({'time': 'mañana'}, "hora no válida"),
+    ({'periodicity': 'weekly'}, "periodicidad desconocida"),
+    ({'periodicity': 'other', 'other_hours': []}, "parrilla sin horas"),
+    ({'periodicity': 'other', 'other_hours': [8, 24]}, "horas fuera de rango: [24]"),
+    ({'other_hours': ['x']}, "horas no válidas"),
+    ({'days': [True] * 6}, "días no válidos"),
+    ({'type': 'video'}, "tipo desconocido"),
+    ({'value': ''}, "sin fichero/carpeta"),
+    ({'extra': 'nada'}, "extra no válido"),
+    ({'extra': {'wait': 'diez'}}, "no se pudo migrar"),
+    ({'extra': {'wait_minutes': -1}}, "espera no válida"),
+])
+def test_errores_no_lanzan_y_dejan_el_original(campos, error):
+    e = evento(name='malo', **campos)
+    eventos, errores = normalizar([evento(), e])
+    assert eventos[1] is e
+    assert len(errores) == 1 and errores[0].startswith("Evento 2 (malo): ") and error in errores[0]
+
+def test_archivos_del_proyecto_sin_errores():
+    for nombre in ("ccpcadena.json", "events_db.json", "eventos Diario.json", "ccpcadena-diario.json"):
+        with open(os.path.join(RAIZ, nombre), 'r', encoding='utf-8') as f: data = json.load(f)
+        eventos = data.get('events', []) if isinstance(data, dict) else data
+        assert normalizar(eventos)[1] == [], nombre
+
+def test_editor_pasa_por_el_esquema(qapp):
+    from eventos3 import EventEditorDialog
+    (original,), _ = normalizar([evento(name='bloque', extra={'wait': 15, 'salamandra': {'QueueOrder': 7}})])
+    dlg = EventEditorDialog(None, original)
+    dlg.spin_wait.setValue(20)
+    e = dlg.get_data()
+    # Sin marca de esquema: la pone normalizar(), que así valida y completa lo del editor
+    assert 'schema' not in e
+    (n,), errores = normalizar([e])
+    assert errores == [] and n['schema'] == VERSION_ESQUEMA
+    assert n['extra']['salamandra'] == {'QueueOrder': 7}
+    assert (n['extra']['wait_minutes'], n['extra']['wait']) == (20, 20)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import time
+
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_libs import LectorBloques
+
+FRAMES = 10000
+
+def rampa(n, canales):
+    """Cada frame lleva su número: así se ve qué parte del archivo ha salido."""
+    x = (np.arange(n, dtype=np.float32) / n)[:, None]
+    return x if canales == 1 else np.hstack([x, -x])
+
+@pytest.fixture
+def wav(tmp_path):
+    def crear(canales=2):
+        path = str(tmp_path / f"tema{canales}.wav")
+        sf.write(path, rampa(FRAMES, canales), 8000, subtype='FLOAT')
+        return path
+    return crear
+
+def leer_todo(lector, tam=300, limite=5.0):
+    """Tira del lector como el callback, en bloques de 'tam', hasta que se agota."""
+    partes, t0 = [], time.monotonic()
+    while not lector.agotado():
+        assert time.monotonic() - t0 < limite
+        out = np.zeros((tam, 2), dtype=np.float32)
+        n = lector.leer(out)
+        partes.append(out[:n])
+        if not n: time.sleep(0.001)
+    return np.concatenate(partes)
+
+@pytest.mark.parametrize("canales", [1, 2])
+def test_decodifica_por_bloques(wav, canales):
+    lector = LectorBloques(wav(canales), capacidad=4096, bloque=1024)
+    try:
+        assert (lector.samplerate, lector.frames) == (8000, FRAMES)
+        todo = leer_todo(lector)
+        # Mono sale duplicado en los dos canales; la memoria es el anillo, no el archivo
+        esperado = rampa(FRAMES, 2) if canales == 2 else np.hstack([rampa(FRAMES, 1)] * 2)
+        assert np.array_equal(todo, esperado)
+        assert lector.anillo.shape == (4096, 2) and lector.posicion == FRAMES
+    finally:
+        lector.cerrar()
+
+def test_archivo_que_no_existe(tmp_path):
+    with pytest.raises(Exception): LectorBloques(str(tmp_path / "no.wav"))
+
+def test_anillo_da_la_vuelta(wav):
+    # Capacidad que no es múltiplo ni del bloque del lector ni del de la salida: lectura y escritura parten en dos
+    lector = LectorBloques(wav(), capacidad=1000, bloque=256)
+    try:
+        assert np.array_equal(leer_todo(lector, tam=300), rampa(FRAMES, 2))
+        assert lector.escrito == FRAMES and lector.escrito - lector.leido <= lector.capacidad
+    finally:
+        lector.cerrar()
+
+def test_seek(wav):
+    lector = LectorBloques(wav(), capacidad=2048, bloque=512)
+    try:
+        out = np.zeros((300, 2), dtype=np.float32)
+        while not lector.leer(out): time.sleep(0.001)
+        lector.buscar(6000)
+        # La posición pedida se ve al momento, aunque el lector aún no haya saltado
+        assert lector.posicion == 6000
+        resto = leer_todo(lector)
+        # Ni un frame de antes del salto: lo siguiente que suena es el 6000
+        assert np.array_equal(resto, rampa(FRAMES, 2)[6000:])
+        lector.buscar(FRAMES * 2)
+        assert leer_todo(lector).size == 0 and lector.posicion == FRAMES
+        lector.buscar(0)
+        assert lector.posicion == 0 and not lector.agotado()
+        assert np.array_equal(leer_todo(lector), rampa(FRAMES, 2))
+    finally:
+        lector.cerrar()
+
+def test_cue_worker_tira_del_lector(qapp, wav):
+    from cue import CueWorker
+    w = CueWorker(wav(), None)
+    assert w.load()
+    try:
+        w.is_playing = True
+        w.seek(0.5)
+        partes = []
+        while w.is_playing:
+            out = np.ones((400, 2), dtype=np.float32)
+            if w.cb(out) or not w.is_playing: partes.append(out)
+        todo = np.concatenate(partes)
+        # Lo que el lector aún no tenía sale en silencio; el resto es el archivo desde la mitad
+        assert np.array_equal(todo[np.any(todo != 0, axis=1)], rampa(FRAMES, 2)[FRAMES // 2:])
+        assert w.get_pos() == 1.0 and w.get_time_str() == "00:01 / 00:01"
+    finally:
+        w.unload()
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+import metricas
+from audio_libs import SalidaCompartida
+
+def test_histograma():
+    h = metricas.Histograma("prueba_segundos", "prueba")
+    for v in (0.0002, 0.0002, 0.003, 20.0): h.observar(v)
+    assert h.cuenta == 4 and h.maximo == 20.0
+    assert h.percentil(0.5) == 0.00025 and h.percentil(1.0) == 20.0
+    texto = "\n".join(h.texto())
+    assert 'prueba_segundos_bucket{le="0.00025"} 2' in texto and 'prueba_segundos_bucket{le="+Inf"} 4' in texto
+
+def test_un_solo_volcador(tmp_path):
+    v = metricas.volcar_cada(str(tmp_path / "a.prom"), 60)
+    # El hilo del motor y el gestor lo piden los dos: un único escritor
+    assert metricas.volcar_cada(str(tmp_path / "b.prom"), 60) is v and v.is_alive()
+    v.volcar()
+    with open(v.path) as f: assert "motor_tick_segundos_count" in f.read()
+
+def test_arranque_de_cualquier_fuente(stream_falso):
+    salida = SalidaCompartida(None, 44100)
+    antes = metricas.ARRANQUE.cuenta
+    fuente = lambda buf: True
+    salida.enganchar(fuente)
+    salida.stream.bloque()
+    salida.stream.bloque()
+    # Una muestra por play(): del enganche al primer bloque
+    assert metricas.ARRANQUE.cuenta == antes + 1
+    salida.soltar(fuente)
+    salida.enganchar(fuente)
+    salida.stream.bloque()
+    assert metricas.ARRANQUE.cuenta == antes + 2
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+import metricas
+from eventos3 import MotorEventos
+from reglas import POLITICA_TODOS
+
+T = datetime(2024, 1, 1, 10, 15, 0)
+DIA = 86400
+
+def s(n):
+    return T + timedelta(seconds=n)
+
+def evento(nombre, hora='10:15:00', **campos):
+    e = {'name': nombre, 'time': hora, 'periodicity': 'once', 'days': [True] * 7, 'type': 'file', 'value': nombre + '.mp3'}
+    e.update(campos)
+    return e
+
+def crear_motor(tmp_path, eventos, **opciones):
+    path = tmp_path / "eventos.json"
+    path.write_text(json.dumps(eventos))
+    return MotorEventos(vigilar=False, path=str(path), **opciones)
+
+@pytest.fixture
+def motor(tmp_path):
+    m = crear_motor(tmp_path, [evento('cuña')], max_retraso=5)
+    yield m
+    m.detener()
+
+def nombres(eventos):
+    return [e['name'] for e in eventos]
+
+def test_cola_saca_y_reprograma(motor):
+    motor.planificar(desde=s(-3600))
+    assert motor.segundos_hasta_proximo(now=s(-10)) == 10
+    assert [(t, e['name']) for t, e in motor.vencidos(now=s(0))] == [(s(0), 'cuña')]
+    assert motor.segundos_hasta_proximo(now=s(0)) == DIA
+
+def test_proximos_no_muestra_pasados(tmp_path):
+    m = crear_motor(tmp_path, [evento('cuña'), evento('otra', '10:20:00')])
+    m.planificar(desde=s(-3600))
+    # Nadie ha vaciado la cola en un día: lo ya pasado no se lista
+    assert [(t, e['name']) for t, e in m.next_events(2, now=s(DIA + 60))] == [(s(DIA + 300), 'otra'), (s(2 * DIA), 'cuña')]
+
+def test_sin_disparos_hasta_no_cuenta_saltados(motor):
+    perdidos = metricas.TICKS_PERDIDOS.valor
+    motor.comprobar_todos(now=s(-600))
+    # El hilo durmió hasta el próximo disparo: ese hueco no son ticks perdidos
+    motor.sin_disparos_hasta(s(0))
+    assert nombres(motor.comprobar_todos(now=s(0))) == ['cuña']
+    assert metricas.TICKS_PERDIDOS.valor == perdidos
+
+def test_tick_a_tick(motor):
+    assert motor.comprobar_todos(now=s(-1)) == []
+    assert nombres(motor.comprobar_todos(now=s(0))) == ['cuña']
+    assert motor.comprobar_todos(now=s(1)) == []
+
+def test_mismo_segundo_no_repite(motor):
+    assert nombres(motor.comprobar_todos(now=s(0))) == ['cuña']
+    assert motor.comprobar_todos(now=s(0)) == []
+
+def test_primer_tick_solo_evalua_el_segundo_actual(motor):
+    assert motor.comprobar_todos(now=s(2)) == []
+
+def test_recupera_segundos_saltados(motor):
+    recuperados, perdidos = metricas.TICKS_RECUPERADOS.valor, metricas.TICKS_PERDIDOS.valor
+    motor.comprobar_todos(now=s(-2))
+    assert nombres(motor.comprobar_todos(now=s(2))) == ['cuña']
+    assert metricas.TICKS_RECUPERADOS.valor - recuperados == 3
+    assert metricas.TICKS_PERDIDOS.valor == perdidos
+
+def test_fuera_de_la_ventana_se_pierde(motor):
+    recuperados, perdidos = metricas.TICKS_RECUPERADOS.valor, metricas.TICKS_PERDIDOS.valor
+    motor.comprobar_todos(now=s(-10))
+    assert motor.comprobar_todos(now=s(10)) == []
+    # 19 segundos saltados: los 5 últimos se evalúan, el resto (con el disparo) se pierde
+    assert metricas.TICKS_RECUPERADOS.valor - recuperados == 5
+    assert metricas.TICKS_PERDIDOS.valor - perdidos == 14
+
+def test_reloj_hacia_atras_no_barre_el_intervalo(motor):
+    motor.comprobar_todos(now=s(60))
+    # Vuelta atrás por encima del evento: solo se mira el segundo actual
+    assert motor.comprobar_todos(now=s(-60)) == []
+    assert motor.comprobar_todos(now=s(-59)) == []
+
+def test_reloj_hacia_atras_repite_segun_hora_de_pared(motor):
+    assert nombres(motor.comprobar_todos(now=s(0))) == ['cuña']
+    motor.comprobar_todos(now=s(30))
+    assert nombres(motor.comprobar_todos(now=s(0))) == ['cuña']
+
+def test_simultaneos_segun_politica(tmp_path):
+    m = crear_motor(tmp_path, [evento('musica'), evento('cuña', priority='high'), evento('pisador', overlay=True)])
+    assert nombres(m.comprobar_todos(now=s(0))) == ['cuña', 'pisador']
+    assert nombres(m.comprobar_todos(POLITICA_TODOS, now=s(DIA))) == ['cuña', 'pisador', 'musica']
+
+def test_comprobar_de_uno_en_uno_aplica_la_politica(tmp_path):
+    m = crear_motor(tmp_path, [evento('musica'), evento('cuña', priority='high')])
+    # La API antigua entrega de uno en uno, pero el segundo principal se descarta igual
+    assert m.comprobar(now=s(0))['name'] == 'cuña'
+    assert m.comprobar(now=s(0)) is None
+
+def carga_completa(tmp_path, eventos):
+    (tmp_path / "completa").mkdir()
+    return crear_motor(tmp_path / "completa", eventos)
+
+def test_edicion_conserva_el_orden_de_empate(tmp_path):
+    m = crear_motor(tmp_path, [evento('a'), evento('b')])
+    # Editar el primero no lo manda detrás del segundo
+    nuevos = [dict(m.events_cache[0], value='a2.mp3'), m.events_cache[1]]
+    m.aplicar_cambios(nuevos)
+    completa = carga_completa(tmp_path, nuevos)
+    assert [(r.pos, r.evento) for r in m.reglas] == [(r.pos, r.evento) for r in completa.reglas]
+    assert nombres(m.comprobar_todos(now=s(0))) == nombres(completa.comprobar_todos(now=s(0))) == ['a']
+
+def test_json_releido_y_reordenado(tmp_path):
+    eventos = [evento(f'e{i}') for i in range(10)]
+    m = crear_motor(tmp_path, eventos)
+    viejas = {id(r) for r in m.reglas}
+    eventos = eventos[5:] + eventos[:5]
+    eventos[0] = dict(eventos[0], value='otro.mp3')
+    (tmp_path / "eventos.json").write_text(json.dumps(eventos))
+    assert m.recargar_si_cambia()
+    completa = carga_completa(tmp_path, eventos)
+    assert [(r.pos, r.evento) for r in m.reglas] == [(r.pos, r.evento) for r in completa.reglas]
+    assert nombres(m.comprobar_todos(now=s(0))) == nombres(completa.comprobar_todos(now=s(0))) == ['e5']
+    # Solo se recompila el que cambió
+    assert sum(1 for r in m.reglas if id(r) not in viejas) == 1
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from eventos3 import MotorMultiEstacion
+
+T = datetime(2024, 1, 1, 10, 15, 0)
+
+def evento(nombre, hora='10:15:00', **campos):
+    e = {'name': nombre, 'time': hora, 'periodicity': 'once', 'days': [True] * 7, 'type': 'file', 'value': nombre + '.mp3'}
+    e.update(campos)
+    return e
+
+def escribir(path, eventos):
+    path.write_text(json.dumps(eventos))
+    return str(path)
+
+@pytest.fixture
+def multi(tmp_path):
+    m = MotorMultiEstacion({
+        'fm': escribir(tmp_path / "fm.json", [evento('musica'), evento('cuña', priority='high')]),
+        'web': escribir(tmp_path / "web.json", [evento('podcast'), evento('otro', '10:20:00')]),
+    }, vigilar=False)
+    yield m
+    m.detener()
+
+def test_mismo_instante_politica_por_estacion(multi):
+    # Cada estación tiene su evento principal; en 'fm' la música pierde contra la cuña
+    assert sorted((e['estacion'], e['name']) for e in multi.comprobar_todos(now=T)) == [('fm', 'cuña'), ('web', 'podcast')]
+
+def test_cola_comun(multi):
+    for m in multi.estaciones.values(): m.planificar(desde=T - timedelta(hours=1))
+    assert multi.segundos_hasta_proximo(now=T - timedelta(seconds=30)) == 30
+    assert [(e['estacion'], e['name']) for t, e in multi.next_events(4, now=T - timedelta(seconds=30))] == \
+        [('fm', 'musica'), ('fm', 'cuña'), ('web', 'podcast'), ('web', 'otro')]
+    # Sale cada uno en su segundo, con su estación, y se reprograma para el día siguiente
+    assert sorted((e['estacion'], e['name']) for t, e in multi.vencidos(now=T)) == [('fm', 'cuña'), ('fm', 'musica'), ('web', 'podcast')]
+    assert [(t, e['name']) for t, e in multi.vencidos(now=T + timedelta(minutes=5))] == [(T + timedelta(minutes=5), 'otro')]
+    assert multi.segundos_hasta_proximo(now=T + timedelta(minutes=5)) == 86400 - 300
+
+def test_despertar_compartido(multi, tmp_path):
+    assert all(m.despertar is multi.despertar for m in multi.estaciones.values())
+    multi.despertar.clear()
+    multi.añadir('am', escribir(tmp_path / "am.json", [evento('noticias')]))
+    assert multi.despertar.is_set() and multi.estaciones['am'].despertar is multi.despertar
+    multi.quitar('am')
+    assert sorted(multi.estaciones) == ['fm', 'web']
+
+def test_recarga_solo_la_que_cambia(multi, tmp_path):
+    web = multi.estaciones['web']
+    reglas = list(web.reglas)
+    escribir(tmp_path / "fm.json", [evento('musica'), evento('cuña', priority='high'), evento('nueva')])
+    os.utime(tmp_path / "fm.json", ns=(0, 10 ** 18))
+    assert multi.recargar_si_cambia()
+    assert web.reglas == reglas
+    assert [e['name'] for e in multi.estaciones['fm'].events_cache] == ['musica', 'cuña', 'nueva']
+    assert not multi.recargar_si_cambia()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+import soundfile as sf
+
+import onda
+
+def esperar(resumen, limite=5.0):
+    # El hilo termina después de guardar la caché
+    if resumen.hilo: resumen.hilo.join(limite)
+    assert resumen.completo
+
+@pytest.fixture
+def wav(tmp_path, monkeypatch):
+    monkeypatch.setattr(onda, 'CACHE_DIR', str(tmp_path / "cache"))
+    # Bloques pequeños: el cálculo da varias vueltas y publica columnas por partes
+    monkeypatch.setattr(onda, 'BLOQUE_ONDA', 1000)
+    rnd = np.random.default_rng(1)
+    datos = rnd.uniform(-1, 1, (10007, 2)).astype(np.float32)
+    path = str(tmp_path / "cuña.wav")
+    sf.write(path, datos, 8000, subtype='FLOAT')
+    return path, datos
+
+def test_reducir():
+    datos = np.array([[0.0, 1.0], [-2.0, 0.5], [3.0, 0.0]], dtype=np.float32)
+    mn, mx, rms = onda.reducir(datos, 2)
+    # El último tramo se rellena con su último frame
+    assert mn.tolist() == [-2.0, 0.0] and mx.tolist() == [1.0, 3.0]
+    assert np.allclose(rms, [np.sqrt(5.25 / 4), np.sqrt(9 / 2)])
+
+def test_resumen_y_cache(wav):
+    path, datos = wav
+    r = onda.Resumen(path, columnas=100)
+    esperar(r)
+    assert (r.paso, r.columnas, r.hechas) == (101, 100, 100)
+    mn, mx, rms = onda.reducir(datos, r.paso)
+    assert np.array_equal(r.minimo, mn) and np.array_equal(r.maximo, mx) and np.allclose(r.rms, rms)
+    # Segunda apertura: de la caché, sin hilo
+    otra = onda.Resumen(path, columnas=100)
+    assert otra.hilo is None and otra.completo and np.array_equal(otra.maximo, r.maximo)
+
+def test_cache_caduca(wav):
+    path, datos = wav
+    esperar(onda.Resumen(path, columnas=100))
+    sf.write(path, datos[:5000], 8000, subtype='FLOAT')
+    r = onda.Resumen(path, columnas=100)
+    assert r.hilo is not None
+    esperar(r)
+    assert np.array_equal(r.maximo, onda.reducir(datos[:5000], r.paso)[1])
+
+def test_slider_dibuja(qapp, wav):
+    r = onda.Resumen(wav[0], columnas=100)
+    esperar(r)
+    s = onda.SliderOnda()
+    s.resize(300, 60)
+    s.set_resumen(r)
+    assert not s.grab().isNull() and s.firma is not None
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import pytest
+
+from persistencia import DiarioCambios, GuardadoDiferido, firma_archivo, guardar_atomico, leer_diario
+
+A, B, C = {'name': 'a'}, {'name': 'b'}, {'name': 'c'}
+
+@pytest.fixture
+def snapshot(tmp_path):
+    path = tmp_path / "eventos.json"
+    path.write_text(json.dumps([A, B]))
+    return str(path)
+
+def leer(path):
+    with open(path, 'r') as f: return json.load(f)
+
+def auditoria(diario):
+    with open(diario.auditoria, 'r') as f: return [json.loads(l) for l in f]
+
+def test_guardar_atomico_sin_restos(tmp_path):
+    path = str(tmp_path / "x.json")
+    guardar_atomico(path, [A])
+    guardar_atomico(path, [A, B])
+    assert leer(path) == [A, B] and os.listdir(tmp_path) == ["x.json"]
+
+def test_guardado_diferido_agrupa_escrituras(tmp_path):
+    escritas = []
+    g = GuardadoDiferido(str(tmp_path / "x.json"), retraso=60, escribir=lambda p, d: escritas.append(d))
+    for i in range(50): g.programar([i])
+    g.detener()
+    assert escritas == [[49]]
+    assert not g.hilo.is_alive()
+
+def test_guardado_diferido_copia_la_lista(tmp_path):
+    path = str(tmp_path / "x.json")
+    g = GuardadoDiferido(path, retraso=60)
+    datos = [A]
+    g.programar(datos)
+    # La interfaz sigue tocando su lista después de programar
+    datos.append(B)
+    g.detener()
+    assert leer(path) == [A]
+
+def test_replay_tras_un_corte(snapshot):
+    d = DiarioCambios(snapshot, retraso=60)
+    assert d.cargar() == [A, B]
+    d.registrar('add', 2, C)
+    d.registrar('toggle', 0, dict(A, active=False))
+    d.registrar('delete', 1, B)
+    d.cola.join()
+    # Corte: el JSON sigue como estaba y las ediciones solo están en el diario
+    assert leer(snapshot) == [A, B]
+    assert len(leer_diario(d.path)[1]) == 3
+
+    esperado = [dict(A, active=False), C]
+    assert DiarioCambios(snapshot, retraso=60).cargar() == esperado
+    assert leer(snapshot) == esperado
+    base, entradas, _ = leer_diario(d.path)
+    assert base == firma_archivo(snapshot) and entradas == []
+    assert [e['op'] for e in auditoria(d)] == ['add', 'toggle', 'delete']
+
+def test_registra_el_estado_de_cada_momento(snapshot):
+    d = DiarioCambios(snapshot, retraso=60)
+    eventos = d.cargar()
+    # La interfaz cambia el mismo dict varias veces seguidas, antes de que escriba el hilo
+    with d.lock:
+        for activo in (False, True, False):
+            eventos[0]['active'] = activo
+            d.registrar('toggle', 0, eventos[0])
+    d.cola.join()
+    assert [e['evento']['active'] for e in leer_diario(d.path)[1]] == [False, True, False]
+    d.cerrar()
+    assert [e['evento']['active'] for e in auditoria(d)] == [False, True, False]
+
+def test_compactar(snapshot):
+    d = DiarioCambios(snapshot, retraso=60)
+    d.cargar()
+    d.registrar('add', 2, C)
+    d.registrar('delete', 0, A)
+    d.compactar()
+    assert leer(snapshot) == [B, C]
+    base, entradas, _ = leer_diario(d.path)
+    assert base == firma_archivo(snapshot) and entradas == []
+    # El borrado queda auditado con el evento que se quitó
+    assert auditoria(d)[-1]['op'] == 'delete' and auditoria(d)[-1]['evento'] == A
+    # Compactar sin entradas no toca nada
+    firma = firma_archivo(snapshot)
+    d.compactar()
+    assert firma_archivo(snapshot) == firma
+
+def test_diario_ajeno_se_aparta(snapshot, tmp_path):
+    d = DiarioCambios(snapshot, retraso=60)
+    d.cargar()
+    d.registrar('add', 2, C)
+    d.cola.join()
+    # Alguien reescribe el JSON por fuera: ni se pisa ni se aplican las ediciones
+    with open(snapshot, 'w') as f: json.dump([B], f)
+    d.compactar()
+    assert leer(snapshot) == [B]
+    apartados = list(tmp_path.glob("eventos.json.journal.*"))
+    assert len(apartados) == 1
+    assert [e['op'] for e in leer_diario(str(apartados[0]))[1]] == ['add']
+    base, entradas, _ = leer_diario(d.path)
+    assert base == firma_archivo(snapshot) and entradas == []
+
+def test_cerrar_compacta_y_termina_los_hilos(snapshot):
+    d = DiarioCambios(snapshot, retraso=60)
+    d.cargar()
+    d.registrar('add', 2, C)
+    d.cerrar()
+    assert leer(snapshot) == [A, B, C]
+    assert not d.escritor.is_alive() and not d.diferido.hilo.is_alive()
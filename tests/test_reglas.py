@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+import pytest
+
+from esquema import normalizar
+from reglas import POLITICA_TODOS, compilar, proximo_disparo, resolver_conflictos
+
+# 2024-01-01 fue lunes
+LUNES = datetime(2024, 1, 1, 10, 0, 0)
+
+def regla(pos=0, **campos):
+    e = {'name': 'x', 'time': '10:15:00', 'periodicity': 'once', 'days': [True] * 7, 'type': 'file', 'value': 'a.mp3'}
+    e.update(campos)
+    eventos, errores = normalizar([e])
+    assert not errores
+    return compilar(eventos[0], pos)
+
+def test_once_mismo_dia():
+    assert proximo_disparo(regla(), LUNES) == datetime(2024, 1, 1, 10, 15)
+
+def test_estrictamente_posterior():
+    r = regla()
+    assert proximo_disparo(r, datetime(2024, 1, 1, 10, 15)) == datetime(2024, 1, 2, 10, 15)
+
+def test_hourly_usa_minuto_y_segundo():
+    r = regla(time='07:59:54', periodicity='hourly')
+    assert proximo_disparo(r, LUNES) == datetime(2024, 1, 1, 10, 59, 54)
+    assert proximo_disparo(r, datetime(2024, 1, 1, 23, 59, 54)) == datetime(2024, 1, 2, 0, 59, 54)
+
+def test_other_respeta_horas():
+    r = regla(time='00:30:00', periodicity='other', other_hours=[8, 14])
+    assert proximo_disparo(r, LUNES) == datetime(2024, 1, 1, 14, 30)
+    assert proximo_disparo(r, datetime(2024, 1, 1, 14, 30)) == datetime(2024, 1, 2, 8, 30)
+
+def test_salta_dias_apagados():
+    # Solo domingo
+    r = regla(days=[False] * 6 + [True])
+    assert proximo_disparo(r, LUNES) == datetime(2024, 1, 7, 10, 15)
+    # Domingo después de la hora: el siguiente es el domingo de la semana que viene
+    assert proximo_disparo(r, datetime(2024, 1, 7, 11, 0)) == datetime(2024, 1, 14, 10, 15)
+
+def test_sin_dias_no_dispara():
+    assert proximo_disparo(regla(days=[False] * 7), LUNES) is None
+
+def test_caducidad():
+    r = regla(expire=True, expire_date='2024-01-02')
+    # El último día indicado todavía suena; después ya no
+    assert proximo_disparo(r, LUNES) == datetime(2024, 1, 1, 10, 15)
+    assert proximo_disparo(r, datetime(2024, 1, 1, 11, 0)) == datetime(2024, 1, 2, 10, 15)
+    assert proximo_disparo(r, datetime(2024, 1, 2, 11, 0)) is None
+
+def test_conflictos_un_principal_y_todos_los_overlay():
+    baja = regla(0)
+    alta = regla(1, priority='high')
+    overlay = regla(2, overlay=True)
+    assert resolver_conflictos([baja, alta, overlay]) == [alta, overlay]
+    assert resolver_conflictos([baja, alta, overlay], POLITICA_TODOS) == [alta, overlay, baja]
+
+def test_compila_a_enteros_y_mascaras():
+    r = regla(pos=3, time='09:05:30', periodicity='other', other_hours=[0, 9, 23], days=[1, 0, 1, 0, 0, 0, 1],
+              expire=True, expire_date='2024-01-02', priority='high', immediate=True)
+    assert (r.pos, r.segundo, r.dias, r.horas) == (3, 9 * 3600 + 330, 0b1000101, (1 << 0) | (1 << 9) | (1 << 23))
+    # Caduca al terminar el día indicado
+    assert r.expira == datetime(2024, 1, 3).timestamp()
+    assert r.vigente(datetime(2024, 1, 2, 23, 59, 59).timestamp()) and not r.vigente(r.expira)
+    assert r.rango == 0b001 and r.activo and not hasattr(r, '__dict__')
+    assert regla(periodicity='hourly').horas == (1 << 24) - 1 and regla().horas == 1 << 10
+    # Sin 'expire' la fecha no cuenta; en el rango pesa más la prioridad, luego inmediato, luego overlay
+    assert regla(expire_date='2024-01-02').expira == 0
+    assert (regla().rango, regla(overlay=True).rango, regla(immediate=True).rango, regla(priority='high').rango) == (0b111, 0b110, 0b101, 0b011)
+    assert not regla(active=False).activo
+
+def test_evento_mal_formado_lanza():
+    with pytest.raises(Exception): compilar({'time': '10:00'}, 0)
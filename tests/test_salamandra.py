@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+
+import salamandra
+from esquema import normalizar
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def comparable(eventos):
+    """Sin lo que solo existe en un lado: los datos propios de Salamandra y el 'wait' antiguo."""
+    out = []
+    for e in eventos:
+        e = dict(e, extra=dict(e['extra']))
+        e['extra'].pop('salamandra', None)
+        e['extra'].pop('wait', None)
+        out.append(e)
+    return out
+
+def test_ida_y_vuelta_desde_slsche(tmp_path):
+    eventos, errores = salamandra.importar(os.path.join(RAIZ, "eventos-ccp-salamandra.slsche"))
+    assert eventos and errores == []
+    destino = str(tmp_path / "copia.slsche")
+    assert salamandra.exportar(eventos, destino) == len(eventos)
+    assert salamandra.importar(destino) == (eventos, [])
+
+def test_ida_y_vuelta_desde_json(tmp_path):
+    with open(os.path.join(RAIZ, "events_db.json"), 'r', encoding='utf-8') as f: eventos, _ = normalizar(json.load(f))
+    eventos = [e for e in eventos if e['type'] in ('file', 'random')]
+    destino = str(tmp_path / "copia.slsche")
+    salamandra.exportar(eventos, destino)
+    vuelta, errores = salamandra.importar(destino)
+    # Salamandra no tiene overlay: vuelve como evento principal
+    assert errores == [] and comparable(vuelta) == comparable(dict(e, overlay=False) for e in eventos)
+
+def test_campos_que_salamandra_no_tiene(tmp_path):
+    base = {'time': '12:00:30', 'days': [True, False, False, False, False, False, True], 'type': 'random', 'value': 'D:/cuñas',
+            'name': 'Bloque', 'immediate': True, 'priority': 'high', 'extra': {'wait_enabled': True, 'wait_minutes': 90}}
+    eventos, _ = normalizar([
+        dict(base, periodicity='other', other_hours=[9, 12]),
+        dict(base, periodicity='once', expire=True, expire_date='2030-05-31'),
+        dict(base, type='time', value=''),
+    ])
+    destino = str(tmp_path / "copia.slsche")
+    # Los de hora/temperatura/satélite no existen en Salamandra
+    assert salamandra.exportar(eventos, destino) == 2
+    vuelta, errores = salamandra.importar(destino)
+    assert errores == [] and comparable(vuelta) == comparable(eventos[:2])
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from audio_libs import PoolSalidas, SalidaCompartida
+
+def constante(v, bloques=None):
+    """Fuente que llena con 'v'; con 'bloques' termina tras ese número de bloques."""
+    cuenta = [0]
+    def fuente(buf):
+        buf.fill(v)
+        cuenta[0] += 1
+        return bloques is None or cuenta[0] < bloques
+    return fuente
+
+def test_pool_comparte_y_reabre(stream_falso):
+    pool = PoolSalidas()
+    a = pool.obtener(3, 44100.0)
+    assert pool.obtener(3, 44100) is a and len(stream_falso.abiertos) == 1 and a.stream.active
+    b = pool.obtener(4, 44100)
+    assert b is not a and (b.stream.device, b.stream.channels) == (4, 2)
+    # Dispositivo desenchufado: el stream muere y se abre otro al pedirlo
+    a.stream.active = False
+    c = pool.obtener(3, 44100)
+    assert c is not a and a.stream.closed and c.viva
+    pool.cerrar()
+    assert b.stream.closed and c.stream.closed and pool.salidas == {}
+
+def test_mezcla(stream_falso):
+    salida = SalidaCompartida(None, 44100)
+    assert not salida.stream.bloque().any()
+    uno = constante(0.25)
+    salida.enganchar(uno)
+    salida.enganchar(uno)
+    assert salida.fuentes == (uno,) and np.all(salida.stream.bloque() == 0.25)
+    salida.enganchar(constante(0.5))
+    salida.enganchar(constante(0.5))
+    # Varias fuentes se suman y se recortan a [-1, 1]
+    assert np.all(salida.stream.bloque() == 1.0)
+    salida.soltar(uno)
+    assert len(salida.fuentes) == 2
+
+def test_fuente_terminada_se_suelta(stream_falso):
+    salida = SalidaCompartida(None, 44100)
+    corta, larga = constante(0.1, bloques=2), constante(0.2)
+    salida.enganchar(corta)
+    salida.enganchar(larga)
+    salida.stream.bloque()
+    assert salida.fuentes == (corta, larga)
+    salida.stream.bloque()
+    assert salida.fuentes == (larga,)
+
+def test_pausa_y_play_dentro_del_bloque(stream_falso):
+    salida = SalidaCompartida(None, 44100)
+    def fuente(buf):
+        buf.fill(0)
+        # La interfaz hace pausa y play mientras el callback aún tiene la tupla vieja
+        salida.soltar(fuente)
+        salida.enganchar(fuente)
+        return False
+    salida.enganchar(fuente)
+    salida.stream.bloque()
+    assert salida.fuentes == (fuente,)
+
+def test_xruns(stream_falso):
+    salida = SalidaCompartida(None, 44100)
+    salida.stream.bloque(underflow=True)
+    salida.stream.bloque()
+    assert salida.xruns == 1
+
+def test_cue_worker_engancha_y_suelta(qapp, stream_falso, monkeypatch, tmp_path):
+    import soundfile as sf
+    import cue
+    path = str(tmp_path / "tema.wav")
+    sf.write(path, np.zeros((1000, 2), dtype=np.float32), 8000)
+    monkeypatch.setattr(cue, 'POOL', PoolSalidas())
+    w = cue.CueWorker(path, 2)
+    assert w.load()
+    try:
+        w.play()
+        w.play()
+        assert w.salida.fuentes == (w.fuente,) and w.salida.stream.samplerate == 8000
+        w.pause()
+        assert w.salida.fuentes == ()
+        w.play()
+        assert w.salida is cue.POOL.obtener(2, 8000) and len(stream_falso.abiertos) == 1
+    finally:
+        w.unload()
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import simulacion
+from bench_motor import generar
+from reglas import proximo_disparo
+
+DESDE = datetime(2024, 1, 1, 6, 30)
+HASTA = DESDE + timedelta(days=9)
+
+def uno_a_uno(reglas, desde, hasta):
+    """Lo mismo que expandir(), pero saltando de disparo en disparo con proximo_disparo."""
+    out = []
+    for i, r in enumerate(reglas):
+        t = proximo_disparo(r, desde - timedelta(seconds=1))
+        while t is not None and t < hasta:
+            out.append((t, r.pos, i))
+            t = proximo_disparo(r, t)
+    return [(t, i) for t, pos, i in sorted(out)]
+
+def linea_a_lista(linea):
+    return [(t.astype(datetime), int(i)) for t, i in zip(linea['ts'], linea['regla'])]
+
+def test_coincide_con_proximo_disparo(monkeypatch):
+    eventos = generar(300)
+    eventos[0].update(expire=True, expire_date='2024-01-04')
+    reglas = simulacion.compilar_eventos(eventos)
+    # Bloques pequeños: también se prueba el troceado
+    monkeypatch.setattr(simulacion, 'BLOQUE_REGLAS', 64)
+    assert linea_a_lista(simulacion.expandir(reglas, DESDE, HASTA)) == uno_a_uno(reglas, DESDE, HASTA)
+
+def test_empates_en_orden_de_lista():
+    eventos = [{'name': n, 'time': '07:00:00', 'periodicity': 'once', 'days': [True] * 7, 'type': 'file', 'value': n}
+               for n in 'cab']
+    reglas = simulacion.compilar_eventos(eventos)
+    linea = simulacion.en_ventana(simulacion.expandir(reglas, DESDE, HASTA), datetime(2024, 1, 2, 7, 0))
+    assert [reglas[i].evento['name'] for i in linea['regla']] == ['c', 'a', 'b']
+    assert (linea['ts'] == np.datetime64('2024-01-02T07:00:00')).all()
+
+def test_inactivos_fuera():
+    eventos = [{'name': 'x', 'time': '07:00:00', 'periodicity': 'hourly', 'days': [True] * 7, 'type': 'file', 'value': 'x',
+                'active': False}]
+    assert simulacion.compilar_eventos(eventos) == []
+    assert len(simulacion.expandir([], DESDE, HASTA)) == 0
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import bench_motor
+
+@pytest.fixture
+def modelo(qapp):
+    from eventos3 import EventsTableModel
+    cambios = []
+    m = EventsTableModel(bench_motor.generar(20), lambda que, fila: cambios.append((que, fila)))
+    m.cambios = cambios
+    m.avisos = []
+    m.modelReset.connect(lambda: m.avisos.append('reset'))
+    m.rowsInserted.connect(lambda p, a, b: m.avisos.append(('alta', a, b)))
+    m.rowsRemoved.connect(lambda p, a, b: m.avisos.append(('baja', a, b)))
+    m.dataChanged.connect(lambda a, b, r=(): m.avisos.append(('cambio', a.row(), b.row())))
+    return m
+
+def test_cada_cambio_avisa_solo_de_su_fila(modelo):
+    nuevo = dict(modelo.events[0], name="Nuevo")
+    assert modelo.append_event(nuevo) == 20
+    modelo.replace_event(3, dict(modelo.events[3], name="Editado"))
+    modelo.remove_event(5)
+    modelo.toggle_active(0)
+    assert modelo.avisos == [('alta', 20, 20), ('cambio', 3, 3), ('baja', 5, 5), ('cambio', 0, 0)]
+    assert modelo.rowCount() == 20 and modelo.events[-1] is nuevo
+    assert modelo.index(3, 2).data() == "Editado"
+
+def test_toggle_guarda(modelo):
+    activo = modelo.events[2]['active']
+    modelo.toggle_active(2)
+    assert modelo.events[2]['active'] is not activo and modelo.cambios == [('toggle', 2)]
+    assert modelo.index(2, 4).data() == ("NO" if activo else "SI")
+
+def test_abrir_archivo_reinicia_el_mismo_modelo(modelo):
+    otros = bench_motor.generar(3, semilla=2)
+    modelo.reset_events(otros)
+    assert modelo.avisos == ['reset'] and modelo.events is otros and modelo.rowCount() == 3
+
+def proxy_sobre(eventos, columna=-1, orden=None, **filtro):
+    from PySide6.QtCore import Qt
+    from eventos3 import EventsTableModel, FiltroEventos
+    m = EventsTableModel(eventos)
+    p = FiltroEventos()
+    p.setSourceModel(m)
+    if filtro: p.set_filtro(**filtro)
+    if columna >= 0: p.sort(columna, orden or Qt.AscendingOrder)
+    return m, p
+
+def visibles(p):
+    return [p.index(r, 2).data() for r in range(p.rowCount())]
+
+@pytest.mark.parametrize("columna, descendente", [(-1, False), (0, False), (0, True), (1, False), (2, True), (3, False), (4, False)])
+@pytest.mark.parametrize("filtro", [{}, {'texto': 'evento 1'}, {'tipo': 'file', 'dia': 2, 'desde': 8 * 3600, 'hasta': 14 * 3600}])
+def test_cambios_fila_a_fila_como_recalcular(qapp, columna, descendente, filtro):
+    import random
+    from PySide6.QtCore import Qt
+    orden = Qt.DescendingOrder if descendente else Qt.AscendingOrder
+    m, p = proxy_sobre(bench_motor.generar(300), columna, orden, **filtro)
+    rnd = random.Random(columna)
+    extra = bench_motor.generar(40, semilla=9)
+    for paso in range(60):
+        op = rnd.randrange(4)
+        if op == 0: m.append_event(dict(extra[paso % 40], name=f"Evento 1{paso} nuevo"))
+        elif op == 1: m.remove_event(rnd.randrange(len(m.events)))
+        elif op == 2:
+            fila = rnd.randrange(len(m.events))
+            m.replace_event(fila, dict(m.events[fila], time=f"{rnd.randrange(24):02}:00:00", type=rnd.choice(['file', 'sat'])))
+        else: m.toggle_active(rnd.randrange(len(m.events)))
+    _, q = proxy_sobre(list(m.events), columna, orden, **filtro)
+    # Las claves y el orden mantenidos a mano dan lo mismo que calcularlo todo de nuevo
+    assert list(p.filas) == list(q.filas)
+    assert p.claves == q.claves
+    assert all(m.events[int(p.filas[r])] is m.events[p.mapToSource(p.index(r, 0)).row()] for r in range(p.rowCount()))
+
+def test_filtros(qapp):
+    from eventos3 import claves_evento, hora_a_segundos
+    eventos = bench_motor.generar(500)
+    _, p = proxy_sobre(eventos, tipo='random', dia=6, desde=3600, hasta=7200)
+    def suena_entre(e):
+        seg = hora_a_segundos(e['time'])
+        horas = claves_evento(e)[2]
+        return any(horas >> h & 1 and 3600 <= h * 3600 + seg % 3600 <= 7200 for h in range(24))
+    esperado = [i for i, e in enumerate(eventos) if e['type'] == 'random' and e['days'][6] and suena_entre(e)]
+    assert esperado and list(p.filas) == esperado
+
+def test_busqueda_incremental(qapp):
+    eventos = bench_motor.generar(500)
+    _, p = proxy_sobre(eventos)
+    for q in ("bloque1", "bloque1/", "bloque12", "evento 4"):
+        p.set_filtro(texto=q)
+        assert list(p.filas) == [i for i, e in enumerate(eventos) if q in (e['name'] + " " + str(e['value'])).lower()]
+
+def test_paginado(qapp):
+    from eventos3 import FiltroEventos
+    m, p = proxy_sobre(bench_motor.generar(1200), 2)
+    assert p.rowCount() == FiltroEventos.PAGINA and p.canFetchMore()
+    p.fetchMore()
+    p.fetchMore()
+    assert p.rowCount() == 1200 and not p.canFetchMore()
+    p.set_filtro(texto="evento")
+    assert p.rowCount() == FiltroEventos.PAGINA
+    # Mostrar una fila aún no paginada carga hasta ella
+    ultima = int(p.filas[-1])
+    i = p.mostrar(ultima)
+    assert i.isValid() and p.rowCount() == 1200 and p.mapToSource(i).row() == ultima
+
+def test_orden_conserva_la_seleccion(qapp):
+    from PySide6.QtCore import QPersistentModelIndex
+    m, p = proxy_sobre(bench_motor.generar(50))
+    marcada = QPersistentModelIndex(p.index(7, 0))
+    fila = p.mapToSource(p.index(7, 0)).row()
+    p.sort(0)
+    assert p.mapToSource(p.index(marcada.row(), 0)).row() == fila